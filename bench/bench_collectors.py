@@ -0,0 +1,395 @@
+#!/usr/bin/env python3
+"""
+TidyCPU collector benchmarks.
+
+Generates a synthetic /proc and /sys tree (configurable CPU count, PID
+count, threads per process and comm length), points tidycpu at it through
+set_fs_roots() and times each collector and renderer end to end.
+
+For every benchmark it reports wall time over --repeat calls, syscalls per
+call (read/write counts from /proc/self/io plus file opens seen by an
+audit hook; getdents from directory listing and work done inside
+--scan-pool process workers are not counted) and peak RSS.
+Each benchmark runs in a forked child so its peak RSS is its own. Results
+are written as JSON; pass --compare OLD.json to print ratios against a
+previous run.
+
+Usage:
+  python3 bench/bench_collectors.py
+  python3 bench/bench_collectors.py --cpus 256 --pids 5000 --threads 20 --out new.json
+  python3 bench/bench_collectors.py --cpus 64,1024 --pids 1000 --threads 1,100
+  python3 bench/bench_collectors.py --compare old.json --out new.json
+"""
+
+import os
+import sys
+import io
+import json
+import time
+import random
+import shutil
+import argparse
+import platform
+import resource
+import tempfile
+import statistics
+import subprocess
+import contextlib
+from itertools import product
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+import tidycpu as tc  # noqa: E402
+
+# ─────────────────────────────────────────────
+# Synthetic procfs / sysfs Tree
+# ─────────────────────────────────────────────
+_COMM_CHARS = "abcdefghijklmnopqrstuvwxyz0123456789-_"
+
+def _write(path: str, data: str):
+    with open(path, "w") as f:
+        f.write(data)
+
+def _task_stat(tid: int, comm: str, utime: int, stime: int, nthreads: int,
+               starttime: int, processor: int) -> str:
+    """One /proc/<pid>/stat line in the kernel's 52-field layout."""
+    fields = ["S", "1", str(tid), str(tid), "0", "-1", "4194560",   # state .. flags
+              "0", "0", "0", "0", str(utime), str(stime), "0", "0",  # minflt .. cstime
+              "20", "0", str(nthreads), "0", str(starttime),         # priority .. starttime
+              "0", "0"] + ["0"] * 14 + [str(processor)] + ["0"] * 13
+    return f"{tid} ({comm}) {' '.join(fields)}\n"
+
+def make_tree(root: str, cpus: int, pids: int, threads: int, comm_len: int,
+              smt: int = 2, seed: int = 0) -> tuple[str, str]:
+    """
+    Build <root>/proc and <root>/sys for a host with `cpus` logical CPUs
+    (`smt` siblings per core) running `pids` processes of `threads` threads.
+    Returns (proc_root, sys_root).
+    """
+    rnd = random.Random(seed)
+    proc_root = os.path.join(root, "proc")
+    sys_root  = os.path.join(root, "sys")
+    cpu_root  = os.path.join(sys_root, "devices", "system", "cpu")
+    os.makedirs(proc_root)
+    os.makedirs(cpu_root)
+
+    # /proc/stat and system files
+    lines = ["cpu  0 0 0 0 0 0 0 0 0 0"]
+    for c in range(cpus):
+        vals = [rnd.randrange(10**6, 10**8) for _ in range(8)] + [0, 0]
+        lines.append(f"cpu{c} " + " ".join(map(str, vals)))
+    lines += ["intr 0", "ctxt 0", "btime 0", f"processes {pids}"]
+    _write(f"{proc_root}/stat", "\n".join(lines) + "\n")
+    _write(f"{proc_root}/cpuinfo", "".join(
+        f"processor\t: {c}\nmodel name\t: Synthetic CPU @ 2.00GHz\ncpu MHz\t\t: 2000.000\n\n"
+        for c in range(cpus)))
+    _write(f"{proc_root}/meminfo", "MemTotal:       65536000 kB\nMemAvailable:   32768000 kB\n")
+    _write(f"{proc_root}/cmdline", "BOOT_IMAGE=/vmlinuz quiet\n")
+    _write(f"{proc_root}/uptime", "100000.00 50000.00\n")
+
+    # /sys/devices/system/cpu/cpuN/topology
+    smt = max(1, smt)
+    cores = max(1, cpus // smt)
+    for c in range(cpus):
+        core = c % cores
+        siblings = [core + k * cores for k in range(smt) if core + k * cores < cpus]
+        topo = os.path.join(cpu_root, f"cpu{c}", "topology")
+        os.makedirs(topo)
+        _write(f"{topo}/physical_package_id", "0\n")
+        _write(f"{topo}/core_id", f"{core}\n")
+        _write(f"{topo}/thread_siblings_list", tc.cores_to_cpulist(siblings) + "\n")
+    _write(f"{cpu_root}/online", f"0-{cpus - 1}\n")
+
+    # /proc/<pid> and /proc/<pid>/task/<tid>
+    all_cpus = f"0-{cpus - 1}"
+    tid = 1000
+    for _ in range(pids):
+        pid = tid
+        comm = "".join(rnd.choice(_COMM_CHARS) for _ in range(comm_len))[:15]
+        starttime = rnd.randrange(1, 10**6)
+        pdir = f"{proc_root}/{pid}"
+        os.makedirs(f"{pdir}/task")
+        total_u = total_s = 0
+        for t in range(threads):
+            utime, stime = rnd.randrange(0, 10**6), rnd.randrange(0, 10**5)
+            total_u += utime
+            total_s += stime
+            tcomm = comm if t == 0 else f"{comm[:11]}/{t}"[:15]
+            tdir = f"{pdir}/task/{tid}"
+            os.mkdir(tdir)
+            _write(f"{tdir}/comm", tcomm + "\n")
+            _write(f"{tdir}/stat", _task_stat(tid, tcomm, utime, stime, threads,
+                                               starttime, rnd.randrange(cpus)))
+            _write(f"{tdir}/status", f"Name:\t{tcomm}\nCpus_allowed_list:\t{all_cpus}\n")
+            tid += 1
+        _write(f"{pdir}/comm", comm + "\n")
+        _write(f"{pdir}/cmdline", f"/usr/bin/{comm}\0--worker\0")
+        _write(f"{pdir}/cgroup", f"0::/system.slice/{comm}.service\n")
+        _write(f"{pdir}/status", f"Name:\t{comm}\nThreads:\t{threads}\nCpus_allowed_list:\t{all_cpus}\n")
+        _write(f"{pdir}/stat", _task_stat(pid, comm, total_u, total_s, threads,
+                                          starttime, rnd.randrange(cpus)))
+    return proc_root, sys_root
+
+# ─────────────────────────────────────────────
+# Measurement
+# ─────────────────────────────────────────────
+_OPENS = 0
+_COUNTING = False
+
+def _audit(event: str, args):
+    global _OPENS
+    if _COUNTING and event == "open":
+        _OPENS += 1
+
+sys.addaudithook(_audit)
+
+def _self_io() -> tuple[int, int]:
+    """(syscr, syscw) of this process — always from the real /proc."""
+    with open("/proc/self/io") as f:
+        vals = dict(line.split(":", 1) for line in f)
+    return int(vals["syscr"]), int(vals["syscw"])
+
+def measure(fn, repeat: int) -> dict:
+    """Call fn() `repeat` times; wall-time stats and syscalls per call."""
+    global _OPENS, _COUNTING
+    fn()   # warm-up: opens persistent fds, imports lazily loaded modules
+    baseline = _self_io()
+    probe = _self_io()
+    probe_r, probe_w = probe[0] - baseline[0], probe[1] - baseline[1]
+
+    times = []
+    reads = writes = opens = 0
+    for _ in range(repeat):
+        _OPENS = 0
+        r0, w0 = _self_io()
+        _COUNTING = True
+        t0 = time.perf_counter()
+        fn()
+        t1 = time.perf_counter()
+        _COUNTING = False
+        r1, w1 = _self_io()
+        times.append(t1 - t0)
+        reads  += r1 - r0 - probe_r
+        writes += w1 - w0 - probe_w
+        opens  += _OPENS
+    return {
+        "wall_s_min":    min(times),
+        "wall_s_median": statistics.median(times),
+        "wall_s_mean":   statistics.fmean(times),
+        "read_calls":    reads / repeat,
+        "write_calls":   writes / repeat,
+        "opens":         opens / repeat,
+        "syscalls":      (reads + writes + opens) / repeat,
+    }
+
+def run_isolated(fn, repeat: int, cleanup=None) -> dict:
+    """
+    measure() in a forked child so ru_maxrss is this benchmark's peak.
+    cleanup() runs in the child before it exits (e.g. to shut down scan pools).
+    """
+    rfd, wfd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(rfd)
+        try:
+            res = measure(fn, repeat)
+            res["peak_rss_kb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        except Exception as e:
+            res = {"error": f"{type(e).__name__}: {e}"}
+        if cleanup is not None:
+            cleanup()
+        with os.fdopen(wfd, "w") as w:
+            json.dump(res, w)
+        os._exit(0)
+    os.close(wfd)
+    with os.fdopen(rfd) as r:
+        data = r.read()
+    os.waitpid(pid, 0)
+    return json.loads(data) if data else {"error": "benchmark child exited without a result"}
+
+# ─────────────────────────────────────────────
+# Benchmarks
+# ─────────────────────────────────────────────
+def build_benchmarks(args, outdir: str) -> tuple[list[tuple[str, object]], object]:
+    """
+    (name, zero-arg callable) pairs sharing inputs prepared here, plus a
+    cleanup callable that shuts down the shared task caches.
+    """
+    topology  = tc.get_cpu_topology()
+    sysinfo   = tc.get_system_info()
+    # Caches are warmed by measure()'s warm-up call inside the benchmark's
+    # own process, so a process pool is never carried across fork().
+    scan_cache    = tc.TaskCache(workers=args.scan_workers, pool=args.scan_pool)
+    refresh_cache = tc.TaskCache(workers=args.scan_workers, pool=args.scan_pool)
+    core_stats = tc.get_core_usage(sample_ms=0, topology=topology, stack_procs=True,
+                                   task_cache=tc.TaskCache())
+    processes  = tc.get_top_processes(n=args.top, with_threads=True, sample_ms=0)
+
+    def quiet(fn):
+        def call():
+            with contextlib.redirect_stdout(io.StringIO()):
+                fn()
+        return call
+
+    def cold_scan():
+        cache = tc.TaskCache(workers=args.scan_workers, pool=args.scan_pool)
+        try:
+            cache.scan()
+        finally:
+            cache.close()
+
+    def refresh():
+        # One live-mode refresh: stacked core usage through a warm cache, then render
+        stats = tc.get_core_usage(sample_ms=0, topology=topology, stack_procs=True,
+                                  task_cache=refresh_cache)
+        with contextlib.redirect_stdout(io.StringIO()):
+            tc.print_topology(topology, stats, stack_procs=True)
+
+    benches = [
+        ("read_proc_stat",         tc.read_proc_stat),
+        ("get_cpu_topology",       tc.get_cpu_topology),
+        ("scan_tasks_cold",        cold_scan),
+        ("scan_tasks_warm",        scan_cache.scan),
+        ("get_top_proc_per_core",  tc.get_top_proc_per_core),
+        ("get_all_procs_per_core", lambda: tc.get_all_procs_per_core(sample_ms=0)),
+        ("get_top_processes",      lambda: tc.get_top_processes(n=args.top, with_threads=True,
+                                                                sample_ms=0)),
+        ("print_topology",         quiet(lambda: tc.print_topology(topology, core_stats,
+                                                                   stack_procs=True))),
+        ("export_to_text",         lambda: tc.export_to_text(sysinfo, topology, core_stats, processes,
+                                                             os.path.join(outdir, "r.txt"))),
+        ("export_to_html",         lambda: tc.export_to_html(sysinfo, topology, core_stats, processes,
+                                                             os.path.join(outdir, "r.html"))),
+        ("live_refresh",           refresh),
+    ]
+    try:
+        import openpyxl  # noqa: F401
+        benches.append(("export_to_excel",
+                        lambda: tc.export_to_excel(sysinfo, topology, core_stats, processes,
+                                                   os.path.join(outdir, "r.xlsx"),
+                                                   stack_procs=True)))
+    except ImportError:
+        pass
+    if args.only:
+        wanted = set(args.only.split(","))
+        benches = [b for b in benches if b[0] in wanted]
+
+    def cleanup():
+        scan_cache.close()
+        refresh_cache.close()
+    return benches, cleanup
+
+def run_scenario(args, cpus: int, pids: int, threads: int, workdir: str) -> dict:
+    config = {"cpus": cpus, "pids": pids, "threads": threads, "comm_len": args.comm_len,
+              "smt": args.smt, "scan_workers": args.scan_workers, "scan_pool": args.scan_pool}
+    tree = tempfile.mkdtemp(prefix="tree-", dir=workdir)
+    print(f"  cpus={cpus} pids={pids} threads={threads}: generating …", end="", flush=True)
+    t0 = time.perf_counter()
+    proc_root, sys_root = make_tree(tree, cpus, pids, threads, args.comm_len, args.smt, args.seed)
+    gen_s = time.perf_counter() - t0
+    print(f" {gen_s:.1f}s")
+
+    tc.set_fs_roots(proc_root, sys_root)
+    results = {}
+    benches, cleanup = build_benchmarks(args, tree)
+    for name, fn in benches:
+        res = run_isolated(fn, args.repeat, cleanup)
+        results[name] = res
+        if "error" in res:
+            print(f"    {name:<24} {res['error']}")
+        else:
+            print(f"    {name:<24} {res['wall_s_median'] * 1000:10.2f} ms"
+                  f"  {res['syscalls']:10.0f} syscalls  {res['peak_rss_kb'] / 1024:8.1f} MiB")
+
+    if not args.keep_tree:
+        shutil.rmtree(tree, ignore_errors=True)
+    return {"config": config, "generate_s": gen_s, "results": results}
+
+def _git_rev() -> str:
+    try:
+        r = subprocess.run(["git", "-C", REPO_ROOT, "rev-parse", "--short", "HEAD"],
+                           capture_output=True, text=True, timeout=5)
+        return r.stdout.strip()
+    except (FileNotFoundError, subprocess.TimeoutExpired):
+        return ""
+
+def compare(old: dict, new: dict):
+    """Print median wall-time and syscall ratios (new / old) per matching scenario."""
+    old_by_cfg = {json.dumps(s["config"], sort_keys=True): s for s in old.get("scenarios", [])}
+    for scen in new["scenarios"]:
+        prev = old_by_cfg.get(json.dumps(scen["config"], sort_keys=True))
+        if prev is None:
+            continue
+        print(f"\n  vs {old.get('git_rev') or 'baseline'}: {scen['config']}")
+        for name, res in scen["results"].items():
+            was = prev["results"].get(name)
+            if not was or "error" in res or "error" in was:
+                continue
+            wall = res["wall_s_median"] / was["wall_s_median"] if was["wall_s_median"] else float("inf")
+            sysc = res["syscalls"] / was["syscalls"] if was["syscalls"] else float("inf")
+            print(f"    {name:<24} wall x{wall:5.2f}   syscalls x{sysc:5.2f}")
+
+def _int_list(s: str) -> list[int]:
+    return [int(x) for x in s.split(",") if x.strip()]
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark TidyCPU collectors on a synthetic /proc and /sys")
+    parser.add_argument("--cpus", type=_int_list, default=[64],
+        help="Logical CPU count(s), comma-separated (default: 64)")
+    parser.add_argument("--pids", type=_int_list, default=[500],
+        help="Process count(s), comma-separated (default: 500)")
+    parser.add_argument("--threads", type=_int_list, default=[8],
+        help="Threads per process, comma-separated (default: 8)")
+    parser.add_argument("--comm-len", type=int, default=15,
+        help="Length of generated comm names, capped at 15 like the kernel (default: 15)")
+    parser.add_argument("--smt", type=int, default=2,
+        help="Hardware threads per core in the generated topology (default: 2)")
+    parser.add_argument("--repeat", type=int, default=5,
+        help="Timed calls per benchmark after one warm-up call (default: 5)")
+    parser.add_argument("--top", type=int, default=5,
+        help="N for get_top_processes (default: 5)")
+    parser.add_argument("--scan-workers", type=int, default=1,
+        help="TaskCache workers for the scan benchmarks (default: 1)")
+    parser.add_argument("--scan-pool", choices=["thread", "process"], default="thread")
+    parser.add_argument("--only", metavar="NAMES",
+        help="Comma-separated benchmark names to run")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workdir", default=None,
+        help="Where to generate trees (default: system temp dir; tmpfs keeps generation fast)")
+    parser.add_argument("--keep-tree", action="store_true",
+        help="Don't delete generated trees (reuse them with tidycpu --proc-root/--sys-root)")
+    parser.add_argument("--out", default="bench_results.json",
+        help="JSON results file (default: bench_results.json)")
+    parser.add_argument("--compare", metavar="OLD_JSON",
+        help="Print ratios against a previous results file")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="tidycpu-bench-", dir=args.workdir)
+    report = {
+        "schema": 1,
+        "git_rev": _git_rev(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "numpy": tc.np is not None,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "repeat": args.repeat,
+        "scenarios": [],
+    }
+    print(f"\n  TidyCPU collector benchmarks ({report['git_rev'] or 'unknown rev'}), repeat={args.repeat}\n")
+    try:
+        for cpus, pids, threads in product(args.cpus, args.pids, args.threads):
+            report["scenarios"].append(run_scenario(args, cpus, pids, threads, workdir))
+    finally:
+        if not args.keep_tree:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    with open(args.out, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\n  Results written to {args.out}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), report)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+"""
+Regression tests for TidyCPU. Run from the repository root with
+    python -m unittest discover -s tests
+(pytest collects them too). Nothing here needs root or a live /proc.
+"""
+import os
+import sys
+import tempfile
+import time
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import tidycpu  # noqa: E402
+
+
+def _stat_text(n_cpus: int, base: int = 100) -> str:
+    """/proc/stat with n_cpus per-core lines and no trailer, like the fixture trees."""
+    lines = [f"cpu  {base * n_cpus} 0 0 {base * n_cpus} 0 0 0 0 0 0"]
+    lines += [f"cpu{i} {base} 0 0 {base} 0 0 0 0 0 0" for i in range(n_cpus)]
+    return "\n".join(lines) + "\n"
+
+
+class ProcStatReaderTest(unittest.TestCase):
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp(prefix="tidycpu-test-stat-")
+        os.close(fd)
+
+    def tearDown(self):
+        os.unlink(self.path)
+
+    def _write(self, text: str):
+        with open(self.path, "w") as f:
+            f.write(text)
+
+    def test_stat_shrinking_between_reads(self):
+        # CPU hot-unplug: the second read is shorter than the first, and the
+        # reader's buffer still holds the tail of the old contents past n.
+        self._write(_stat_text(8))
+        reader = tidycpu.ProcStatReader(self.path)
+        try:
+            self.assertEqual(reader.read().core_ids, list(range(8)))
+            # Same line widths, so the stale "cpu7" line starts exactly at n
+            self._write(_stat_text(7))
+            counters = reader.read()
+            self.assertEqual(counters.core_ids, list(range(7)))
+            self.assertEqual(len(counters.values), 7 * tidycpu.NUM_STAT_FIELDS)
+        finally:
+            reader.close()
+
+    def test_stat_growing_between_reads(self):
+        self._write(_stat_text(2))
+        reader = tidycpu.ProcStatReader(self.path)
+        try:
+            reader.read()
+            self._write(_stat_text(4))
+            self.assertEqual(reader.read().core_ids, list(range(4)))
+        finally:
+            reader.close()
+
+
+
+class StatSamplerTest(unittest.TestCase):
+    def setUp(self):
+        self.sampler = tidycpu.StatSampler(interval_ms=10, capacity=5).start()
+
+    def tearDown(self):
+        self.sampler.stop()
+
+    def test_window_beyond_ring_raises(self):
+        # 5 samples 10 ms apart reach back 40 ms; waiting for 100 ms would never end
+        with self.assertRaises(ValueError):
+            self.sampler.window(100)
+        with self.assertRaises(ValueError):
+            self.sampler.window(30, end_ago_ms=20)
+
+    def test_window_within_ring(self):
+        older, newer, elapsed = self.sampler.window(30)
+        self.assertGreaterEqual(elapsed, 0.03)
+        self.assertEqual(older.core_ids, newer.core_ids)
+
+    def test_window_beyond_ring_without_wait_uses_oldest(self):
+        time.sleep(0.1)
+        _, _, elapsed = self.sampler.window(100, wait=False)
+        self.assertLess(elapsed, 0.1)
+
+
+class PidIndexTest(unittest.TestCase):
+    def test_own_process_is_not_indexed(self):
+        index = tidycpu.PidIndex().refresh()
+        self.assertNotIn(os.getpid(), index.entries)
+        self.assertNotIn(os.getpid(), index.match("re:python"))   # our own comm
+
+    def test_resolve_dedups_in_order(self):
+        index = tidycpu.PidIndex().refresh()
+        pid = min(index.entries)
+        self.assertEqual(index.resolve(f"{pid}|{pid}|nosuchproc-xyz"), ([pid], ["nosuchproc-xyz"]))
+
+
+class PerCoreTablesTest(unittest.TestCase):
+    def test_tasks_without_prev_tasks_is_rejected(self):
+        tasks = {1: tidycpu.TaskInfo(tid=1, pid=1, name="a", parent_name="a", cpu_time=10,
+                                     last_cpu=0, starttime=1, is_kthread=False, cgroup="")}
+        with self.assertRaises(ValueError):
+            tidycpu.get_all_procs_per_core(tasks=tasks)
+        with self.assertRaises(ValueError):
+            tidycpu.get_all_procs_per_core(prev_tasks=tasks)
+
+
+def _snap(iteration: int, epoch: float, core_id: int = 0) -> "tidycpu.Snapshot":
+    cs = tidycpu.CoreStat(core_id=core_id, usage=12.5, label="COLD",
+                          top_proc="worker", top_parent="svc",
+                          all_procs=[("worker", "svc", 12.5)])
+    return tidycpu.Snapshot(timestamp="", iteration=iteration, core_stats=[cs],
+                            processes=[], epoch=epoch)
+
+
+class TcapCaptureTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory(prefix="tidycpu-test-")
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def _capture(self, name: str, snaps) -> str:
+        path = os.path.join(self.dir.name, name)
+        writer = tidycpu.open_capture_writer(path, None, {})
+        for snap in snaps:
+            writer.write(snap)
+        writer.close()
+        self.assertEqual(writer.error, "")
+        return path
+
+    def test_time_delta_overflow_rebases(self):
+        # Far older than int32 milliseconds can reach from the writer's base
+        epochs = [1_000_000.0, 1_000_001.5, 2_000_000_000.25]
+        path = self._capture("old.tcap", [_snap(i, e) for i, e in enumerate(epochs)])
+        with tidycpu.open_capture(path) as reader:
+            self.assertEqual([s.epoch for s in reader], epochs)
+
+    def test_unencodable_snapshot_falls_back_to_memory(self):
+        path = os.path.join(self.dir.name, "big.tcap")
+        writer = tidycpu.open_capture_writer(path, None, {})
+        writer.write(_snap(0, 1_700_000_000.0))
+        writer.write(_snap(1, 1_700_000_001.0, core_id=70000))
+        writer.write(_snap(2, 1_700_000_002.0))
+        writer.close()
+        self.assertIn("cannot encode", writer.error)
+        self.assertEqual([s.iteration for s in writer.snapshots()], [0, 1, 2])
+        with tidycpu.open_capture(path) as reader:
+            self.assertEqual(len(reader), 1)
+
+    def test_range_boundaries_match_jsonl(self):
+        base = float(int(time.time()))
+        epochs = [base + i * 0.3337 for i in range(10)]
+        snaps = [_snap(i, round(e, 3)) for i, e in enumerate(epochs)]
+        tcap = self._capture("r.tcap", snaps)
+        jsonl = self._capture("r.jsonl", snaps)
+        lo, hi = snaps[2].epoch, snaps[7].epoch
+        with tidycpu.open_capture(tcap) as a, tidycpu.open_capture(jsonl) as b:
+            self.assertEqual([s.iteration for s in a.iter_range(lo, hi)],
+                             [s.iteration for s in b.iter_range(lo, hi)])
+            self.assertEqual(a.count_range(lo, hi), 6)
+
+    def test_reader_closes(self):
+        path = self._capture("c.tcap", [_snap(0, 1_700_000_000.0)])
+        with tidycpu.open_capture(path) as reader:
+            pass
+        self.assertTrue(reader._f.closed)
+
+
+if __name__ == "__main__":
+    unittest.main()
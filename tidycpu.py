@@ -8,16 +8,39 @@ Requires: root privileges
 """
 
 import os
+import errno
 import sys
 import re
 import subprocess
 import time
 import argparse
-from dataclasses import dataclass, field
+import threading
+import tempfile
+import heapq
+import itertools
+import bisect
+import mmap
+import struct
+import json
+import csv
+import gzip
+import signal
+import stat
+import socket
+import socketserver
+import functools
+import contextlib
+from array import array
+from dataclasses import dataclass, field, asdict
 from typing import Optional
-from collections import defaultdict
+from collections import defaultdict, deque
 from datetime import datetime
 
+try:
+    import numpy as np   # optional: vectorizes per-core usage on many-core hosts
+except ImportError:
+    np = None
+
 # ─────────────────────────────────────────────
 # ANSI Color Palette
 # ─────────────────────────────────────────────
@@ -68,6 +91,25 @@ class CoreStat:
     top_proc: str     = ""  # name of the busiest process/thread on this core
     top_parent: str   = ""  # name of the parent process owning that thread
     all_procs: list   = field(default_factory=list)  # [(thread_name, parent_name, cpu_pct), ...]
+    # Time breakdown, percent of the sample window (see BREAKDOWN_FIELDS)
+    user:     float   = 0.0
+    system:   float   = 0.0
+    iowait:   float   = 0.0
+    irq:      float   = 0.0
+    softirq:  float   = 0.0
+    steal:    float   = 0.0
+
+@dataclass
+class CpuCounters:
+    """
+    Flat per-core /proc/stat counters. Row i of `values` (NUM_STAT_FIELDS
+    wide, in STAT_FIELDS order) belongs to logical core core_ids[i].
+    """
+    core_ids: list[int]
+    values:   array   # array('q'), len(core_ids) * NUM_STAT_FIELDS
+
+    def row(self, i: int) -> array:
+        return self.values[i * NUM_STAT_FIELDS:(i + 1) * NUM_STAT_FIELDS]
 
 @dataclass
 class ThreadInfo:
@@ -77,6 +119,23 @@ class ThreadInfo:
     name:         str
     cpu_percent:  float
     current_cores: list[int]
+    state:        str = ""   # R / S / D / Z ... from stat
+    priority:     int = 0
+    nice:         int = 0
+    last_cpu:     int = -1   # core the thread last ran on
+
+@dataclass
+class TaskInfo:
+    """One thread as read from /proc/<pid>/task/<tid> during a task scan."""
+    tid:          int
+    pid:          int  # owning process (thread group) id
+    name:         str
+    parent_name:  str
+    cpu_time:     int  # utime + stime, in clock ticks
+    last_cpu:     int
+    starttime:    int  = 0      # clock ticks after boot; with tid, identifies the task
+    is_kthread:   bool = False
+    cgroup:       str  = ""
 
 @dataclass
 class ProcessInfo:
@@ -104,10 +163,14 @@ class Snapshot:
     iteration:    int
     core_stats:   list[CoreStat]
     processes:    list[ProcessInfo]
+    epoch:        float = 0.0   # time.time() when taken, to the ms (.tcap resolution)
 
 # ─────────────────────────────────────────────
 # Helpers
 # ─────────────────────────────────────────────
+# Kernel clock ticks per second (utime/stime in /proc/*/stat are in ticks)
+CLK_TCK = os.sysconf("SC_CLK_TCK")
+
 def die(msg: str):
     print(f"\n{C.RED}{C.BOLD}[FATAL]{C.RESET} {msg}\n")
     sys.exit(1)
@@ -151,67 +214,323 @@ def cores_to_cpulist(cores: list[int]) -> str:
     parts.append(str(start) if start == end else f"{start}-{end}")
     return ",".join(parts)
 
-def mask_to_cores(hex_mask: str, num_cores: int) -> list[int]:
-    """Convert hex affinity mask to list of core IDs."""
+def cores_to_mask(cores: list[int]) -> str:
+    """[0, 1, 2, 3] → 'f' (hex affinity mask, as printed by taskset)."""
+    mask = 0
+    for c in cores:
+        mask |= 1 << c
+    return f"{mask:x}"
+
+# ─────────────────────────────────────────────
+# Self-Profiling (--profile)
+# ─────────────────────────────────────────────
+# Audit events that mean a new process was started
+_SPAWN_EVENTS = frozenset({"subprocess.Popen", "os.system", "os.posix_spawn",
+                           "os.fork", "os.forkpty", "os.spawn"})
+
+@dataclass
+class StageStat:
+    calls:  int   = 0
+    wall:   float = 0.0   # seconds
+    cpu:    float = 0.0   # seconds of process CPU time (all threads)
+    opens:  int   = 0
+    spawns: int   = 0
+
+    def add(self, other: "StageStat"):
+        self.calls  += other.calls
+        self.wall   += other.wall
+        self.cpu    += other.cpu
+        self.opens  += other.opens
+        self.spawns += other.spawns
+
+class Profiler:
+    """
+    Per-stage wall and CPU time, files opened and processes spawned.
+    Opens and spawns are counted by an audit hook (installed on the first
+    Profiler, since hooks cannot be removed); work inside --scan-pool
+    process workers is not seen. Stages are recorded into the current
+    iteration; end_iteration() folds them into the run totals.
+    """
+
+    _hook_installed = False
+
+    def __init__(self):
+        self.current: dict[str, StageStat] = {}
+        self.totals:  dict[str, StageStat] = {}
+        self.iterations = 0
+        self._opens  = 0
+        self._spawns = 0
+        if not Profiler._hook_installed:
+            sys.addaudithook(_profile_audit)
+            Profiler._hook_installed = True
+
+    def _on_audit(self, event: str):
+        if event == "open":
+            self._opens += 1
+        elif event in _SPAWN_EVENTS:
+            self._spawns += 1
+
+    @contextlib.contextmanager
+    def stage(self, name: str):
+        w0, c0 = time.perf_counter(), time.process_time()
+        o0, s0 = self._opens, self._spawns
+        try:
+            yield
+        finally:
+            st = self.current.setdefault(name, StageStat())
+            st.calls  += 1
+            st.wall   += time.perf_counter() - w0
+            st.cpu    += time.process_time() - c0
+            st.opens  += self._opens - o0
+            st.spawns += self._spawns - s0
+
+    def flush(self) -> dict[str, StageStat]:
+        """Fold the stages recorded since the last flush into the totals and return them."""
+        done, self.current = self.current, {}
+        for name, st in done.items():
+            self.totals.setdefault(name, StageStat()).add(st)
+        return done
+
+    def end_iteration(self) -> dict[str, StageStat]:
+        self.iterations += 1
+        return self.flush()
+
+_PROFILER: Optional[Profiler] = None
+
+def _profile_audit(event: str, args):
+    if _PROFILER is not None:
+        _PROFILER._on_audit(event)
+
+def enable_profiling() -> Profiler:
+    global _PROFILER
+    _PROFILER = Profiler()
+    return _PROFILER
+
+def profile_stage(name: str):
+    """Context manager timing a stage when --profile is on; a no-op otherwise."""
+    return _PROFILER.stage(name) if _PROFILER is not None else contextlib.nullcontext()
+
+def profiled(name: str):
+    """Decorator form of profile_stage for whole functions (renderers, exporters)."""
+    def deco(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with profile_stage(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return deco
+
+# ─────────────────────────────────────────────
+# Filesystem Roots (procfs / sysfs)
+# ─────────────────────────────────────────────
+# Every collector builds its paths from these, so TidyCPU can be pointed at
+# a synthetic tree (fixtures, benchmarks) instead of the running kernel.
+# Set via TIDYCPU_PROC_ROOT / TIDYCPU_SYS_ROOT or --proc-root / --sys-root.
+PROC_ROOT = os.environ.get("TIDYCPU_PROC_ROOT", "/proc")
+SYS_ROOT  = os.environ.get("TIDYCPU_SYS_ROOT", "/sys")
+
+def set_fs_roots(proc_root: Optional[str] = None, sys_root: Optional[str] = None):
+    """Repoint the collectors at another procfs and/or sysfs tree."""
+    global PROC_ROOT, SYS_ROOT, _STAT_READER
+    if proc_root is not None:
+        PROC_ROOT = proc_root.rstrip("/") or "/"
+        if _STAT_READER is not None:   # reopen stat under the new root
+            _STAT_READER.close()
+            _STAT_READER = None
+    if sys_root is not None:
+        SYS_ROOT = sys_root.rstrip("/") or "/"
+
+def is_live_proc() -> bool:
+    """True if PROC_ROOT is the kernel's own /proc (affinity calls are meaningful)."""
+    return os.path.realpath(PROC_ROOT) == "/proc"
+
+# ─────────────────────────────────────────────
+# Affinity (in-process, no taskset forks)
+# ─────────────────────────────────────────────
+def get_affinity(pid: int) -> Optional[list[int]]:
+    """
+    Return the sorted list of cores a PID or TID is allowed to run on.
+    Uses sched_getaffinity(2); falls back to Cpus_allowed_list in
+    /proc/<pid>/status, which is also the only source under a synthetic
+    PROC_ROOT. Returns None if the task is gone or unreadable.
+    """
+    if is_live_proc():
+        try:
+            return sorted(os.sched_getaffinity(pid))
+        except OSError:
+            pass
     try:
-        mask = int(hex_mask.replace(",", ""), 16)
-        return [i for i in range(num_cores) if mask & (1 << i)]
-    except ValueError:
-        return []
-
-def resolve_pid(pid_or_name: str) -> int:
-    """
-    Resolve a single process name or PID string to an integer PID.
-    If the value is numeric, return it directly.
-    Otherwise, use pgrep to find the PID by process name.
-    Returns the first matched PID, or exits with an error.
-    """
-    if pid_or_name.isdigit():
-        return int(pid_or_name)
-
-    # Name-based lookup via pgrep (exact match first)
-    rc, out, _ = run(["pgrep", "-x", pid_or_name])
-    if rc == 0 and out:
-        pids = out.splitlines()
-        if len(pids) > 1:
-            print(f"  {C.YELLOW}⚠  Multiple processes match '{pid_or_name}': {', '.join(pids)}{C.RESET}")
-            print(f"  {C.YELLOW}   Using PID {pids[0]}{C.RESET}")
-        return int(pids[0])
-
-    # Fallback: partial match
-    rc2, out2, _ = run(["pgrep", pid_or_name])
-    if rc2 == 0 and out2:
-        pids = out2.splitlines()
-        if len(pids) > 1:
-            print(f"  {C.YELLOW}⚠  Multiple processes match '{pid_or_name}': {', '.join(pids)}{C.RESET}")
-            print(f"  {C.YELLOW}   Using PID {pids[0]}{C.RESET}")
-        return int(pids[0])
-
-    die(f"No process found matching name '{pid_or_name}'.\n"
-        f"  Try: pgrep {pid_or_name}  to verify the process exists.")
-
-def resolve_pids(pid_spec: str) -> list[int]:
-    """
-    Resolve a pipe-separated list of PIDs/names to a deduplicated list of integer PIDs.
+        with open(f"{PROC_ROOT}/{pid}/status") as f:
+            for line in f:
+                if line.startswith("Cpus_allowed_list:"):
+                    return parse_cpulist(line.split(":", 1)[1])
+    except (FileNotFoundError, PermissionError, ProcessLookupError):
+        pass
+    return None
+
+def set_affinity(pid: int, cores: list[int]):
+    """Pin a PID or TID to the given cores via sched_setaffinity(2). Raises OSError on failure."""
+    if not is_live_proc():
+        raise OSError(errno.EPERM, f"PROC_ROOT is {PROC_ROOT}, not the live /proc")
+    os.sched_setaffinity(pid, cores)
+
+# ─────────────────────────────────────────────
+# PID Name Index (in-process replacement for pgrep)
+# ─────────────────────────────────────────────
+@dataclass
+class ProcEntry:
+    """Name metadata for one process, as indexed by PidIndex."""
+    pid:       int
+    starttime: int   # jiffies since boot; tells a reused PID apart
+    comm:      str
+    cmdline:   str   # argv joined with spaces; empty for kernel threads
+    cgroup:    str   # contents of /proc/<pid>/cgroup, one hierarchy per line
+
+class PidIndex:
+    """
+    In-process index of running processes used to resolve --pid specs.
+    refresh() re-lists /proc, reads comm/cmdline/cgroup only for processes
+    it has not seen before — keyed by (pid, starttime), so a reused PID is
+    re-read — and drops PIDs that have exited, so it is cheap to call every
+    live iteration. TidyCPU's own process is never indexed, as with pgrep.
+
+    Spec tokens (pipe-separated):
+      1234          PID
+      nginx         exact comm match, falling back to a regex search on comm
+      php*          comm prefix
+      re:PATTERN    regex search on comm
+      cmd:PATTERN   regex search on the full command line
+      cgroup:PATTERN  regex search on the cgroup path(s)
+    """
+
+    def __init__(self):
+        self.entries: dict[int, ProcEntry] = {}
+
+    @staticmethod
+    def _read(path: str) -> str:
+        try:
+            with open(path, "rb") as f:
+                return f.read().decode(errors="replace")
+        except (FileNotFoundError, PermissionError, ProcessLookupError):
+            return ""
+
+    @staticmethod
+    def _starttime(pid: int) -> Optional[int]:
+        try:
+            with open(f"{PROC_ROOT}/{pid}/stat", "rb") as f:
+                fields = _stat_fields(f.read())
+            return int(fields[19]) if fields else None
+        except (FileNotFoundError, PermissionError, ProcessLookupError, ValueError, IndexError):
+            return None
+
+    def refresh(self, pids: Optional[dict[int, int]] = None) -> "PidIndex":
+        """
+        Bring the index up to date. pids maps pid -> starttime for the
+        running processes, e.g. from a task table that was just scanned
+        (see process_starttimes); without it /proc is listed and each
+        process's stat read here.
+        """
+        if pids is None:
+            try:
+                listed = [int(p) for p in os.listdir(PROC_ROOT) if p.isdigit()]
+            except PermissionError:
+                listed = []
+            pids = {}
+            for pid in listed:
+                st = self._starttime(pid)
+                if st is not None:
+                    pids[pid] = st
+        for pid in [p for p, ent in self.entries.items() if pids.get(p) != ent.starttime]:
+            del self.entries[pid]
+        own = os.getpid() if is_live_proc() else None
+        for pid, starttime in pids.items():
+            if pid in self.entries or pid == own:
+                continue
+            comm = self._read(f"{PROC_ROOT}/{pid}/comm").strip()
+            if not comm:
+                continue   # exited between listdir and read
+            self.entries[pid] = ProcEntry(
+                pid=pid,
+                starttime=starttime,
+                comm=comm,
+                cmdline=self._read(f"{PROC_ROOT}/{pid}/cmdline").replace("\0", " ").strip(),
+                cgroup=self._read(f"{PROC_ROOT}/{pid}/cgroup").strip(),
+            )
+        return self
+
+    def match(self, token: str) -> list[int]:
+        """Return every PID matching a single spec token, sorted."""
+        if token.isdigit():
+            return [int(token)]
+
+        def _search(pattern: str, attr: str) -> list[int]:
+            try:
+                rx = re.compile(pattern)
+            except re.error as e:
+                die(f"Invalid pattern in --pid '{token}': {e}")
+            return [p for p, ent in self.entries.items() if rx.search(getattr(ent, attr))]
+
+        if token.startswith("re:"):
+            found = _search(token[3:], "comm")
+        elif token.startswith("cmd:"):
+            found = _search(token[4:], "cmdline")
+        elif token.startswith("cgroup:"):
+            found = _search(token[7:], "cgroup")
+        elif token.endswith("*"):
+            found = [p for p, ent in self.entries.items() if ent.comm.startswith(token[:-1])]
+        else:
+            found = [p for p, ent in self.entries.items() if ent.comm == token]
+            if not found:
+                found = _search(token, "comm")   # like plain pgrep
+        return sorted(found)
+
+    def resolve(self, pid_spec: str) -> tuple[list[int], list[str]]:
+        """
+        Resolve a pipe-separated spec to (deduplicated PIDs, tokens that matched nothing).
+        """
+        tokens = [t.strip() for t in pid_spec.split("|") if t.strip()]
+        seen: set[int] = set()
+        result: list[int] = []
+        unmatched: list[str] = []
+        for token in tokens:
+            pids = self.match(token)
+            if not pids:
+                unmatched.append(token)
+            for pid in pids:
+                if pid not in seen:
+                    seen.add(pid)
+                    result.append(pid)
+        return result, unmatched
+
+def resolve_pids(pid_spec: str, index: Optional[PidIndex] = None) -> list[int]:
+    """
+    Resolve a pipe-separated list of PIDs/names to a deduplicated list of integer PIDs
+    (see PidIndex for the token syntax), or exit with an error if a token matches nothing.
+    Every process matching a name or pattern is included.
     Examples:
-      "1234"           → [1234]
-      "nginx"          → [<pid of nginx>]
-      "nginx|php-fpm|1234" → [<nginx pid>, <php-fpm pid>, 1234]
-    """
-    tokens = [t.strip() for t in pid_spec.split("|") if t.strip()]
-    seen: set[int] = set()
-    result: list[int] = []
-    for token in tokens:
-        pid = resolve_pid(token)
-        if pid not in seen:
-            seen.add(pid)
-            result.append(pid)
-    return result
+      "1234"               → [1234]
+      "nginx"              → [<every nginx pid>]
+      "nginx|php-fpm|1234" → [<nginx pids>, <php-fpm pids>, 1234]
+      "cmd:java.*Kafka"    → [<pids whose command line matches>]
+    """
+    index = index or PidIndex().refresh()
+    pids, unmatched = index.resolve(pid_spec)
+    if unmatched:
+        die(f"No process found matching '{unmatched[0]}'.\n"
+            f"  Tokens are a PID, an exact comm name, a comm prefix ending in '*',\n"
+            f"  or re:PATTERN, cmd:PATTERN, cgroup:PATTERN (regex on comm, command line, cgroup).")
+    n_tokens = len([t for t in pid_spec.split("|") if t.strip()])
+    if len(pids) > n_tokens:
+        print(f"  {C.YELLOW}⚠  '{pid_spec}' matches {len(pids)} processes: "
+              f"{', '.join(map(str, pids))}{C.RESET}")
+    return pids
 
 # ─────────────────────────────────────────────
 # Step 0 – Privilege Check
 # ─────────────────────────────────────────────
 def check_root():
+    if not is_live_proc():
+        return   # synthetic tree: nothing privileged to read or change
     if os.geteuid() != 0:
         die(
             "TidyCPU requires root privileges.\n"
@@ -228,7 +547,7 @@ def get_system_info(show_cpu_freq: bool = False) -> SystemInfo:
     # CPU Model from /proc/cpuinfo
     cpu_model = "Unknown"
     try:
-        with open("/proc/cpuinfo") as f:
+        with open(f"{PROC_ROOT}/cpuinfo") as f:
             for line in f:
                 if line.startswith("model name"):
                     cpu_model = line.split(":", 1)[1].strip()
@@ -240,7 +559,7 @@ def get_system_info(show_cpu_freq: bool = False) -> SystemInfo:
     total_mem = "Unknown"
     avail_mem = "Unknown"
     try:
-        with open("/proc/meminfo") as f:
+        with open(f"{PROC_ROOT}/meminfo") as f:
             meminfo = {}
             for line in f:
                 parts = line.split(":", 1)
@@ -262,7 +581,7 @@ def get_system_info(show_cpu_freq: bool = False) -> SystemInfo:
     # Kernel command line
     cmdline = "Unknown"
     try:
-        with open("/proc/cmdline") as f:
+        with open(f"{PROC_ROOT}/cmdline") as f:
             cmdline = f.read().strip()
     except FileNotFoundError:
         pass
@@ -272,16 +591,17 @@ def get_system_info(show_cpu_freq: bool = False) -> SystemInfo:
     if show_cpu_freq:
         try:
             # Try cpufreq interface for CPU0
-            with open("/sys/devices/system/cpu/cpu0/cpufreq/cpuinfo_min_freq") as f:
+            cpufreq = f"{SYS_ROOT}/devices/system/cpu/cpu0/cpufreq"
+            with open(f"{cpufreq}/cpuinfo_min_freq") as f:
                 freq_min = int(f.read().strip()) / 1000  # Convert kHz to MHz
-            with open("/sys/devices/system/cpu/cpu0/cpufreq/cpuinfo_max_freq") as f:
+            with open(f"{cpufreq}/cpuinfo_max_freq") as f:
                 freq_max = int(f.read().strip()) / 1000
-            with open("/sys/devices/system/cpu/cpu0/cpufreq/scaling_cur_freq") as f:
+            with open(f"{cpufreq}/scaling_cur_freq") as f:
                 freq_cur = int(f.read().strip()) / 1000
         except (FileNotFoundError, ValueError, PermissionError):
             # Fallback: try to get from cpuinfo
             try:
-                with open("/proc/cpuinfo") as f:
+                with open(f"{PROC_ROOT}/cpuinfo") as f:
                     for line in f:
                         if line.startswith("cpu MHz"):
                             freq_cur = float(line.split(":", 1)[1].strip())
@@ -308,14 +628,15 @@ def get_cpu_topology() -> dict[int, CPUTopology]:
     to physical CPUs and physical cores.
     """
     topology = {}
+    cpu_root = f"{SYS_ROOT}/devices/system/cpu"
     cpu_dirs = sorted(
-        [d for d in os.listdir("/sys/devices/system/cpu") if d.startswith("cpu") and d[3:].isdigit()],
+        [d for d in os.listdir(cpu_root) if d.startswith("cpu") and d[3:].isdigit()],
         key=lambda x: int(x[3:])
     )
     
     for cpu_dir in cpu_dirs:
         logical_id = int(cpu_dir[3:])
-        base = f"/sys/devices/system/cpu/{cpu_dir}/topology"
+        base = f"{cpu_root}/{cpu_dir}/topology"
         
         try:
             with open(f"{base}/physical_package_id") as f:
@@ -348,169 +669,484 @@ def get_cpu_topology() -> dict[int, CPUTopology]:
 # ─────────────────────────────────────────────
 # Step 1 – Telemetry: Read /proc/stat (two snapshots)
 # ─────────────────────────────────────────────
+# /proc/stat per-core counter columns, in file order. guest and guest_nice
+# are already included in user and nice, so they are kept for reporting
+# but excluded from totals (only the first NUM_TOTAL_FIELDS are summed).
+STAT_FIELDS = ("user", "nice", "system", "idle", "iowait",
+               "irq", "softirq", "steal", "guest", "guest_nice")
+NUM_STAT_FIELDS  = len(STAT_FIELDS)
+NUM_TOTAL_FIELDS = 8
+
+class ProcStatReader:
+    """
+    Keeps /proc/stat open and re-reads it with pread into a reusable buffer,
+    parsing only the cpuN lines into flat integer arrays (see CpuCounters).
+    Not thread-safe: give each sampling thread its own reader.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self._fd  = os.open(path or f"{PROC_ROOT}/stat", os.O_RDONLY)
+        self._buf = bytearray(4096 + 256 * (os.cpu_count() or 1))
+
+    def close(self):
+        os.close(self._fd)
+
+    def read(self) -> CpuCounters:
+        while True:
+            n = os.preadv(self._fd, [self._buf], 0)
+            data = self._buf
+            # The cpuN lines come first; they are complete once a later line
+            # (intr, ctxt, ...) is in the buffer. Otherwise grow and re-read.
+            if n < len(data) or data.find(b"\nintr", 0, n) != -1:
+                break
+            self._buf = bytearray(len(data) * 2)
+
+        core_ids: list[int] = []
+        values = array("q")
+        pos = data.find(b"\n", 0, n) + 1   # skip the aggregate "cpu " line
+        # Bounded by n: past it the buffer still holds an older, longer read
+        while pos < n and data.startswith(b"cpu", pos, n):
+            end = data.find(b"\n", pos, n)
+            if end == -1:
+                end = n
+            parts = data[pos + 3:end].split()
+            core_ids.append(int(parts[0]))
+            vals = [int(v) for v in parts[1:NUM_STAT_FIELDS + 1]]
+            vals.extend([0] * (NUM_STAT_FIELDS - len(vals)))
+            values.extend(vals)
+            pos = end + 1
+        return CpuCounters(core_ids=core_ids, values=values)
+
+_STAT_READER: Optional[ProcStatReader] = None
+
+def read_proc_counters() -> CpuCounters:
+    """Read per-core counters through a shared, persistent /proc/stat reader."""
+    global _STAT_READER
+    if _STAT_READER is None:
+        try:
+            _STAT_READER = ProcStatReader()
+        except FileNotFoundError:
+            die(f"{PROC_ROOT}/stat not found. Are you on Linux?")
+    return _STAT_READER.read()
+
 def read_proc_stat() -> dict[int, dict]:
-    """Parse /proc/stat and return per-core raw counters."""
-    cores = {}
-    try:
-        with open("/proc/stat") as f:
-            for line in f:
-                m = re.match(r"^cpu(\d+)\s+(.+)$", line)
-                if m:
-                    cid = int(m.group(1))
-                    vals = list(map(int, m.group(2).split()))
-                    # user nice system idle iowait irq softirq steal guest guest_nice
-                    cores[cid] = {
-                        "user":    vals[0], "nice":    vals[1],
-                        "system":  vals[2], "idle":    vals[3],
-                        "iowait":  vals[4] if len(vals) > 4 else 0,
-                        "irq":     vals[5] if len(vals) > 5 else 0,
-                        "softirq": vals[6] if len(vals) > 6 else 0,
-                        "steal":   vals[7] if len(vals) > 7 else 0,
-                    }
-    except FileNotFoundError:
-        die("/proc/stat not found. Are you on Linux?")
-    return cores
+    """Parse /proc/stat and return per-core raw counters keyed by STAT_FIELDS."""
+    counters = read_proc_counters()
+    return {
+        cid: dict(zip(STAT_FIELDS, counters.row(i)))
+        for i, cid in enumerate(counters.core_ids)
+    }
 
-def get_top_proc_per_core() -> dict[int, tuple[str, str]]:
+class StatSampler:
     """
-    Read /proc/*/stat and /proc/*/task/*/stat to find the process or thread
-    with the highest recent CPU time on each logical core.
-    Returns a dict mapping core_id -> (thread_name, parent_process_name).
+    Optional background thread that reads /proc/stat on a fixed cadence into
+    a fixed-size ring buffer of per-core counters. Usage over the last N ms,
+    or over any older window still in the buffer, is then available without
+    blocking the caller for a fresh sample.
     """
-    # Maps core_id -> (max_cputime, thread_name, parent_name)
-    best: dict[int, tuple[int, str, str]] = {}
 
-    try:
-        pids = [p for p in os.listdir("/proc") if p.isdigit()]
-    except PermissionError:
-        return {}
+    def __init__(self, interval_ms: int = 100, capacity: int = 600):
+        self.interval_ms = interval_ms
+        self.capacity    = capacity
+        self._times: list[float] = [0.0] * capacity
+        self._snaps: list[Optional[CpuCounters]] = [None] * capacity
+        self._count  = 0   # total samples ever written; next slot is _count % capacity
+        self._lock   = threading.Lock()
+        self._stop   = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="tidycpu-sampler", daemon=True)
+
+    def start(self) -> "StatSampler":
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        reader = ProcStatReader()
+        next_t = time.monotonic()
+        while not self._stop.is_set():
+            snap = reader.read()
+            now = time.monotonic()
+            with self._lock:
+                slot = self._count % self.capacity
+                self._times[slot] = now
+                self._snaps[slot] = snap
+                self._count += 1
+            next_t += self.interval_ms / 1000
+            self._stop.wait(max(next_t - time.monotonic(), 0.0))
+        reader.close()
+
+    def _find(self, t: float) -> Optional[int]:
+        """Ring index of the newest sample taken at or before monotonic time t."""
+        n = min(self._count, self.capacity)
+        for k in range(n):
+            slot = (self._count - 1 - k) % self.capacity
+            if self._times[slot] <= t:
+                return slot
+        return None
 
-    for pid_str in pids:
-        pid = int(pid_str)
-        task_dir = f"/proc/{pid}/task"
+    def window(self, span_ms: int, end_ago_ms: int = 0,
+               wait: bool = True) -> tuple[CpuCounters, CpuCounters, float]:
+        """
+        Return (older_snap, newer_snap, elapsed_s) bracketing the window that
+        ends end_ago_ms before the newest sample and spans at least span_ms.
+        Counter deltas between the two give usage averaged over that window.
+        With wait=True, blocks only until the buffer holds enough history
+        (e.g. right after start()); otherwise uses the oldest sample available.
+        Waiting for a window that reaches further back than the ring can
+        ever hold ((capacity - 1) * interval_ms) raises ValueError.
+        """
+        reach_ms = (self.capacity - 1) * self.interval_ms
+        if wait and span_ms + end_ago_ms > reach_ms:
+            raise ValueError(f"window of {span_ms} ms ending {end_ago_ms} ms ago exceeds the "
+                             f"{reach_ms} ms the sampler retains")
+        while True:
+            with self._lock:
+                if self._count > 0:
+                    newest = (self._count - 1) % self.capacity
+                    t_end  = self._times[newest] - end_ago_ms / 1000
+                    end    = self._find(t_end)
+                    start  = self._find(t_end - span_ms / 1000) if end is not None else None
+                    if start is not None and start != end:
+                        return (self._snaps[start], self._snaps[end],
+                                self._times[end] - self._times[start])
+                    if not wait and self._count > 1:
+                        oldest = self._count % self.capacity if self._count > self.capacity else 0
+                        return (self._snaps[oldest], self._snaps[newest],
+                                self._times[newest] - self._times[oldest])
+            if not self._thread.is_alive():
+                raise RuntimeError("StatSampler is not running")
+            time.sleep(self.interval_ms / 1000)
+
+def _stat_fields(raw: bytes) -> Optional[list[bytes]]:
+    """
+    Split a /proc/.../stat line into the fields that follow the comm.
+    stat format: pid (comm) state ppid pgroup session tty_nr
+      tpgid flags minflt cminflt majflt cmajflt
+      utime stime cutime cstime priority nice ...
+      (38) last_cpu
+    comm may contain spaces so we parse past the closing ')'.
+    Returned fields[0] = state, fields[11]=utime, fields[12]=stime, fields[36]=processor.
+    Fields are bytes (int() takes them directly; decode state if needed).
+    """
+    rp = raw.rfind(b")")
+    if rp == -1:
+        return None
+    fields = raw[rp + 2:].split()
+    if len(fields) < 37:
+        return None
+    return fields
 
-        # Read parent process name once per PID
-        try:
-            with open(f"/proc/{pid}/comm") as f:
-                parent_name = f.read().strip()[:15]
-        except (FileNotFoundError, PermissionError):
-            parent_name = ""
+# ─────────────────────────────────────────────
+# procfs Access Layer (directory fds + reused read buffer)
+# ─────────────────────────────────────────────
+class ProcDir:
+    """
+    Open directory handle into procfs. Entries are listed with os.scandir on
+    the fd and small files are opened relative to it (dir_fd), so the kernel
+    resolves one or two path components instead of the whole
+    /proc/<pid>/task/<tid>/... path. Reads go into a buffer shared by a
+    handle and its sub-handles — use one root handle per thread.
+    """
+
+    def __init__(self, path: str = "/proc", dir_fd: Optional[int] = None,
+                 buf: Optional[bytearray] = None):
+        self.fd  = os.open(path, os.O_RDONLY | os.O_DIRECTORY, dir_fd=dir_fd)
+        self.buf = buf if buf is not None else bytearray(4096)
 
+    def __enter__(self) -> "ProcDir":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        os.close(self.fd)
+
+    def sub(self, name: str) -> "ProcDir":
+        """Open a subdirectory relative to this one."""
+        return ProcDir(name, dir_fd=self.fd, buf=self.buf)
+
+    def numeric_entries(self) -> list[str]:
+        """Names of the all-digit entries (PIDs / TIDs)."""
+        with os.scandir(self.fd) as it:
+            return [e.name for e in it if e.name.isdigit()]
+
+    def read(self, name: str) -> bytes:
+        """Read a small file relative to this directory."""
+        fd = os.open(name, os.O_RDONLY, dir_fd=self.fd)
         try:
-            tids = [t for t in os.listdir(task_dir) if t.isdigit()]
-        except (FileNotFoundError, PermissionError):
-            continue
+            n = os.readv(fd, [self.buf])
+            data = bytes(memoryview(self.buf)[:n])
+            while n == len(self.buf):   # larger than the buffer: read the rest
+                chunk = os.read(fd, 65536)
+                if not chunk:
+                    break
+                data += chunk
+                n = len(chunk)
+            return data
+        finally:
+            os.close(fd)
+
+    def read_text(self, name: str) -> str:
+        """read() decoded and stripped; "" if the task is gone or unreadable."""
+        try:
+            return self.read(name).decode(errors="replace").strip()
+        except (FileNotFoundError, PermissionError, ProcessLookupError):
+            return ""
+
+# task_struct flag marking kernel threads (stat field 9, "flags")
+PF_KTHREAD = 0x00200000
+
+def _scan_pid_shard(pids: list[str], known: dict[int, TaskInfo],
+                    proc_root: str = "/proc") -> list[TaskInfo]:
+    """
+    Scan /proc/<pid>/task/<tid> for one shard of PIDs. `known` is the
+    previous task table (or the part of it covering these PIDs): stable
+    metadata is reused for any task whose (id, starttime) is unchanged.
+    Top-level so it can run in a thread or process pool; proc_root is passed
+    explicitly because pool processes don't share PROC_ROOT.
+    """
+    out: list[TaskInfo] = []
+    try:
+        proc = ProcDir(proc_root)
+    except (FileNotFoundError, PermissionError):
+        return out
 
-        for tid_str in tids:
+    with proc:
+        for pid_str in pids:
+            pid = int(pid_str)
             try:
-                with open(f"{task_dir}/{tid_str}/stat") as f:
-                    raw = f.read()
-                # stat format: pid (comm) state ppid pgroup session tty_nr
-                #   tpgid flags minflt cminflt majflt cmajflt
-                #   utime stime cutime cstime priority nice ...
-                #   (38) last_cpu
-                # comm may contain spaces so we parse past the closing ')'
-                rp = raw.rfind(")")
-                if rp == -1:
-                    continue
-                fields = raw[rp + 2:].split()
-                # fields[0] = state, fields[11]=utime, fields[12]=stime, fields[36]=processor
-                if len(fields) < 37:
-                    continue
-                utime    = int(fields[11])
-                stime    = int(fields[12])
-                cpu_time = utime + stime
-                last_cpu = int(fields[36])
-
-                # Read thread comm for the name
-                comm_path = f"{task_dir}/{tid_str}/comm"
-                with open(comm_path) as f:
-                    name = f.read().strip()[:15]
-
-                cur_best = best.get(last_cpu)
-                if cur_best is None or cpu_time > cur_best[0]:
-                    best[last_cpu] = (cpu_time, name, parent_name)
-            except (FileNotFoundError, PermissionError, ValueError, IndexError):
+                task_dir = proc.sub(f"{pid_str}/task")
+            except (FileNotFoundError, PermissionError, NotADirectoryError):
                 continue
 
-    return {core: (name, parent) for core, (_, name, parent) in best.items()}
+            with task_dir:
+                stats: dict[int, list[bytes]] = {}
+                try:
+                    tids = task_dir.numeric_entries()
+                except (FileNotFoundError, PermissionError):
+                    continue
+                for tid_str in tids:
+                    try:
+                        fields = _stat_fields(task_dir.read(f"{tid_str}/stat"))
+                        if fields is not None:
+                            stats[int(tid_str)] = fields
+                    except (FileNotFoundError, PermissionError, ProcessLookupError):
+                        continue
+                if not stats:
+                    continue
 
+                # Process-level metadata, validated against the leader's starttime
+                leader = stats.get(pid)
+                try:
+                    p_start = int(leader[19]) if leader else -1
+                    p_kthread = bool(int(leader[6]) & PF_KTHREAD) if leader else False
+                except (ValueError, IndexError):
+                    continue
+                prev = known.get(pid)
+                if prev is not None and prev.pid == pid and prev.starttime == p_start != -1:
+                    parent_name, cgroup, is_kthread = prev.parent_name, prev.cgroup, prev.is_kthread
+                else:
+                    parent_name = proc.read_text(f"{pid_str}/comm")[:15]
+                    cgroup      = proc.read_text(f"{pid_str}/cgroup")
+                    is_kthread  = p_kthread
 
-def get_all_procs_per_core(
-    min_usage: float = 0.0,
-    ignore_procs: Optional[list[str]] = None,
-) -> dict[int, list[tuple]]:
+                for tid, fields in stats.items():
+                    try:
+                        starttime = int(fields[19])
+                        prev = known.get(tid)
+                        if prev is not None and prev.pid == pid and prev.starttime == starttime:
+                            name = prev.name
+                        else:
+                            name = task_dir.read(f"{tid}/comm").decode(errors="replace").strip()[:15]
+                        out.append(TaskInfo(
+                            tid=tid,
+                            pid=pid,
+                            name=name,
+                            parent_name=parent_name,
+                            cpu_time=int(fields[11]) + int(fields[12]),
+                            last_cpu=int(fields[36]),
+                            starttime=starttime,
+                            is_kthread=is_kthread,
+                            cgroup=cgroup,
+                        ))
+                    except (FileNotFoundError, PermissionError, ProcessLookupError, ValueError, IndexError):
+                        continue
+    return out
+
+class TaskCache:
     """
-    Scan all threads and group by the last CPU core they ran on.
-    Returns dict: core_id -> [(thread_name, parent_name, cpu_pct), ...] sorted desc by cpu_pct.
-    min_usage: skip threads with cpu_pct below this threshold.
-    ignore_procs: list of name prefixes to exclude (case-insensitive prefix match).
+    Task table that persists across scans (e.g. live-mode iterations).
+    Stable metadata — thread comm, parent name, kernel-thread flag and
+    cgroup — is read once per task and keyed by (id, starttime), so a
+    reused PID/TID is detected and re-read. Each scan() then only re-reads
+    the volatile stat fields; tasks that have exited drop out of the table.
+    Thread names changed after first sight (prctl) are not picked up.
+
+    With workers > 1, PIDs are sharded across a pool: threads by default
+    (procfs reads release the GIL), or processes with pool="process".
     """
-    ignore_prefixes = tuple(p.lower() for p in (ignore_procs or []))
 
-    # Collect per-thread CPU% from ps (thread-level via -L)
-    rc, out, _ = run(["ps", "-eLo", "tid,pcpu,comm", "--no-headers"])
-    ps_map: dict[int, float] = {}  # tid -> cpu_pct
-    if rc == 0:
-        for line in out.splitlines():
-            parts = line.split(None, 2)
-            if len(parts) >= 2:
-                try:
-                    ps_map[int(parts[0])] = float(parts[1])
-                except ValueError:
-                    pass
+    def __init__(self, workers: int = 1, pool: str = "thread"):
+        self.workers = max(1, workers)
+        self.pool    = pool
+        self._last: dict[int, TaskInfo] = {}
+        self._executor = None
+
+    def __len__(self) -> int:
+        return len(self._last)
+
+    @property
+    def table(self) -> dict[int, TaskInfo]:
+        """The task table from the most recent scan()."""
+        return self._last
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    def _map_shards(self, shards: list[list[str]]) -> list[list[TaskInfo]]:
+        if self._executor is None:
+            from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+            pool_cls = ProcessPoolExecutor if self.pool == "process" else ThreadPoolExecutor
+            self._executor = pool_cls(max_workers=self.workers)
+        if self.pool == "process":
+            # Only ship each worker the part of the cache it can use
+            by_pid: dict[int, dict[int, TaskInfo]] = defaultdict(dict)
+            for tid, t in self._last.items():
+                by_pid[t.pid][tid] = t
+            knowns = [{tid: t for p in shard for tid, t in by_pid.get(int(p), {}).items()}
+                      for shard in shards]
+        else:
+            knowns = [self._last] * len(shards)
+        return list(self._executor.map(_scan_pid_shard, shards, knowns,
+                                       [PROC_ROOT] * len(shards)))
 
-    result: dict[int, list] = {}
+    def scan(self) -> dict[int, TaskInfo]:
+        """Walk every /proc/<pid>/task/<tid> once; returns the task table tid -> TaskInfo."""
+        try:
+            with os.scandir(PROC_ROOT) as it:
+                pids = [e.name for e in it if e.name.isdigit()]
+        except PermissionError:
+            return {}
 
-    try:
-        pids = [p for p in os.listdir("/proc") if p.isdigit()]
-    except PermissionError:
-        return {}
+        if self.workers == 1:
+            results = [_scan_pid_shard(pids, self._last, PROC_ROOT)]
+        else:
+            # Several small shards per worker so one huge process doesn't stall a worker
+            n_shards = min(len(pids), self.workers * 4) or 1
+            results = self._map_shards([pids[i::n_shards] for i in range(n_shards)])
 
-    for pid_str in pids:
-        pid = int(pid_str)
-        task_dir = f"/proc/{pid}/task"
+        tasks = {t.tid: t for shard in results for t in shard}
+        self._last = tasks
+        return tasks
 
-        try:
-            with open(f"/proc/{pid}/comm") as f:
-                parent_name = f.read().strip()[:15]
-        except (FileNotFoundError, PermissionError):
-            parent_name = ""
+def scan_tasks(cache: Optional[TaskCache] = None) -> dict[int, TaskInfo]:
+    """
+    Walk every /proc/<pid>/task/<tid> exactly once and return the task
+    table: tid -> TaskInfo. All per-core collectors derive their views from
+    this table. Pass a TaskCache to reuse stable metadata between scans.
+    """
+    return (cache if cache is not None else TaskCache()).scan()
 
-        if ignore_prefixes and parent_name.lower().startswith(ignore_prefixes):
-            continue
+def process_starttimes(tasks: dict[int, TaskInfo]) -> dict[int, int]:
+    """pid -> starttime for every process in a task table (from its main thread)."""
+    return {t.pid: t.starttime for t in tasks.values() if t.tid == t.pid}
 
-        try:
-            tids = [t for t in os.listdir(task_dir) if t.isdigit()]
-        except (FileNotFoundError, PermissionError):
-            continue
+def get_top_proc_per_core(tasks: Optional[dict[int, TaskInfo]] = None) -> dict[int, tuple[str, str]]:
+    """
+    Find the process or thread with the highest cumulative CPU time on each
+    logical core, using the task table (scanned here if not supplied).
+    Returns a dict mapping core_id -> (thread_name, parent_process_name).
+    """
+    if tasks is None:
+        tasks = scan_tasks()
 
-        for tid_str in tids:
-            tid = int(tid_str)
-            try:
-                with open(f"{task_dir}/{tid_str}/stat") as f:
-                    raw = f.read()
-                rp = raw.rfind(")")
-                if rp == -1:
-                    continue
-                fields = raw[rp + 2:].split()
-                if len(fields) < 37:
-                    continue
-                last_cpu = int(fields[36])
+    # Maps core_id -> TaskInfo with the max cpu_time
+    best: dict[int, TaskInfo] = {}
+    for t in tasks.values():
+        cur_best = best.get(t.last_cpu)
+        if cur_best is None or t.cpu_time > cur_best.cpu_time:
+            best[t.last_cpu] = t
 
-                with open(f"{task_dir}/{tid_str}/comm") as f:
-                    thread_name = f.read().strip()[:15]
+    return {core: (t.name, t.parent_name) for core, t in best.items()}
 
-                if ignore_prefixes and thread_name.lower().startswith(ignore_prefixes):
-                    continue
 
-                cpu_pct = ps_map.get(tid, 0.0)
-                if cpu_pct < min_usage:
-                    continue
+def thread_cpu_percent(
+    prev_tasks: dict[int, TaskInfo],
+    tasks: dict[int, TaskInfo],
+    elapsed: float,
+) -> dict[int, float]:
+    """
+    Per-thread CPU% over the window between two task-table snapshots,
+    from utime+stime deltas. Threads born inside the window (or TIDs reused
+    by a new thread) count from 0.
+    Returns dict: tid -> cpu_pct (100.0 = one full core).
+    """
+    if elapsed <= 0:
+        return {}
+    scale = 100.0 / (CLK_TCK * elapsed)
+    result: dict[int, float] = {}
+    for tid, t in tasks.items():
+        prev = prev_tasks.get(tid)
+        same = prev is not None and prev.starttime == t.starttime
+        d_ticks = t.cpu_time - (prev.cpu_time if same else 0)
+        result[tid] = round(max(d_ticks, 0) * scale, 1)
+    return result
 
-                result.setdefault(last_cpu, []).append((thread_name, parent_name, cpu_pct))
-            except (FileNotFoundError, PermissionError, ValueError, IndexError):
-                continue
+
+def iter_thread_cpu(tasks: dict[int, TaskInfo], prev_tasks: dict[int, TaskInfo], elapsed: float,
+                    min_usage: float = 0.0, ignore_procs: Optional[list[str]] = None):
+    """
+    Yield (TaskInfo, interval CPU%) for each thread in `tasks`, skipping
+    threads below min_usage and those whose name or parent name starts with
+    one of ignore_procs (case-insensitive).
+    """
+    ignore_prefixes = tuple(p.lower() for p in (ignore_procs or []))
+    cpu_map = thread_cpu_percent(prev_tasks, tasks, elapsed)
+    for t in tasks.values():
+        if ignore_prefixes and (t.parent_name.lower().startswith(ignore_prefixes) or
+                                t.name.lower().startswith(ignore_prefixes)):
+            continue
+        cpu_pct = cpu_map.get(t.tid, 0.0)
+        if cpu_pct >= min_usage:
+            yield t, cpu_pct
+
+def get_all_procs_per_core(
+    min_usage: float = 0.0,
+    ignore_procs: Optional[list[str]] = None,
+    tasks: Optional[dict[int, TaskInfo]] = None,
+    prev_tasks: Optional[dict[int, TaskInfo]] = None,
+    elapsed: float = 0.0,
+    sample_ms: int = 500,
+) -> dict[int, list[tuple]]:
+    """
+    Group all threads in the task table by the last CPU core they ran on.
+    Returns dict: core_id -> [(thread_name, parent_name, cpu_pct), ...] sorted desc by cpu_pct.
+    min_usage: skip threads with cpu_pct below this threshold.
+    ignore_procs: list of name prefixes to exclude (case-insensitive prefix match).
+    tasks / prev_tasks / elapsed: two task tables taken `elapsed` seconds apart;
+    cpu_pct is the interval CPU% between them. If neither is given, both are
+    sampled here over a sample_ms window; passing only one raises ValueError
+    (a start sample cannot be taken after the fact).
+    """
+    if (tasks is None) != (prev_tasks is None):
+        raise ValueError("tasks and prev_tasks must be given together")
+    if tasks is None:
+        cache = TaskCache()
+        t0 = time.monotonic()
+        prev_tasks = cache.scan()
+        time.sleep(sample_ms / 1000)
+        tasks = cache.scan()
+        elapsed = time.monotonic() - t0
+
+    result: dict[int, list] = {}
+    for t, cpu_pct in iter_thread_cpu(tasks, prev_tasks, elapsed, min_usage, ignore_procs):
+        result.setdefault(t.last_cpu, []).append((t.name, t.parent_name, cpu_pct))
 
     for core_id in result:
         result[core_id].sort(key=lambda x: x[2], reverse=True)
@@ -518,32 +1154,121 @@ def get_all_procs_per_core(
     return result
 
 
+# Per-core time categories reported alongside overall usage, as
+# (name, STAT_FIELDS indices). Niced user time is counted as user.
+BREAKDOWN_FIELDS = (
+    ("user",    (0, 1)),
+    ("system",  (2,)),
+    ("iowait",  (4,)),
+    ("irq",     (5,)),
+    ("softirq", (6,)),
+    ("steal",   (7,)),
+)
+
+@dataclass
+class CoreUsage:
+    """Per-core usage computed from two CpuCounters, as parallel lists sorted by core id."""
+    core_ids:  list[int]
+    usage:     list[float]
+    labels:    list[str]
+    breakdown: dict[str, list[float]]   # category -> percent of the window, per core
+
+def _align_counters(snap1: CpuCounters, snap2: CpuCounters) -> tuple[list[int], array, array]:
+    """
+    Return (core_ids, values1, values2) with both arrays in the same,
+    sorted core order. Cores missing from either snapshot (hotplug) are dropped.
+    """
+    if snap1.core_ids == snap2.core_ids and snap1.core_ids == sorted(snap1.core_ids):
+        return snap1.core_ids, snap1.values, snap2.values
+    rows2 = {cid: i for i, cid in enumerate(snap2.core_ids)}
+    pairs = sorted((cid, i) for i, cid in enumerate(snap1.core_ids) if cid in rows2)
+    v1, v2 = array("q"), array("q")
+    for cid, i in pairs:
+        v1.extend(snap1.row(i))
+        v2.extend(snap2.row(rows2[cid]))
+    return [cid for cid, _ in pairs], v1, v2
+
+def compute_core_usage(snap1: CpuCounters, snap2: CpuCounters) -> CoreUsage:
+    """
+    Per-core usage %, HOT/WARM/COLD label and time breakdown between two
+    counter snapshots, computed for all cores in one vectorized step
+    (NumPy when available, otherwise a single pass over the flat arrays).
+    idle + iowait count as idle; guest/guest_nice are inside user/nice.
+    """
+    core_ids, v1, v2 = _align_counters(snap1, snap2)
+    n = len(core_ids)
+
+    if np is not None:
+        d = (np.frombuffer(v2, dtype=np.int64).reshape(n, NUM_STAT_FIELDS)
+             - np.frombuffer(v1, dtype=np.int64).reshape(n, NUM_STAT_FIELDS)).astype(np.float64)
+        total = d[:, :NUM_TOTAL_FIELDS].sum(axis=1)
+        scale = np.divide(100.0, total, out=np.zeros(n), where=total > 0)
+        raw = (total - d[:, 3] - d[:, 4]) * scale
+        labels = np.where(raw >= 80, "HOT", np.where(raw >= 40, "WARM", "COLD"))   # before rounding
+        usage = np.round(raw, 1)
+        breakdown = {
+            name: np.round(d[:, list(idx)].sum(axis=1) * scale, 1).tolist()
+            for name, idx in BREAKDOWN_FIELDS
+        }
+        return CoreUsage(core_ids=list(core_ids), usage=usage.tolist(),
+                         labels=labels.tolist(), breakdown=breakdown)
+
+    d = [b - a for a, b in zip(v1, v2)]
+    usage: list[float] = []
+    labels: list[str] = []
+    breakdown: dict[str, list[float]] = {name: [] for name, _ in BREAKDOWN_FIELDS}
+    for base in range(0, n * NUM_STAT_FIELDS, NUM_STAT_FIELDS):
+        total = sum(d[base:base + NUM_TOTAL_FIELDS])
+        scale = 100.0 / total if total > 0 else 0.0
+        pct = (total - d[base + 3] - d[base + 4]) * scale
+        usage.append(round(pct, 1))
+        labels.append("HOT" if pct >= 80 else ("WARM" if pct >= 40 else "COLD"))
+        for name, idx in BREAKDOWN_FIELDS:
+            breakdown[name].append(round(sum(d[base + k] for k in idx) * scale, 1))
+    return CoreUsage(core_ids=list(core_ids), usage=usage, labels=labels, breakdown=breakdown)
+
 def get_core_usage(sample_ms: int = 500, topology: Optional[dict] = None,
                    stack_procs: bool = False, min_usage: float = 0.0,
-                   ignore_procs: Optional[list[str]] = None) -> list[CoreStat]:
-    """Two-snapshot delta to calculate real per-core CPU %."""
-    snap1 = read_proc_stat()
-    time.sleep(sample_ms / 1000)
-    snap2 = read_proc_stat()
+                   ignore_procs: Optional[list[str]] = None,
+                   sampler: Optional[StatSampler] = None,
+                   task_cache: Optional[TaskCache] = None,
+                   thread_samples: Optional[list] = None,
+                   task_window: Optional[dict] = None) -> list[CoreStat]:
+    """
+    Two-snapshot delta to calculate real per-core CPU %.
+    If a running StatSampler is given, the snapshots come from its ring
+    buffer (the last sample_ms) instead of blocking for a fresh window.
+    A TaskCache carried across calls (live mode) makes the /proc task scans
+    re-read only volatile stat fields. If a thread_samples
+    list is given it is extended with (TaskInfo, CPU%) for every thread in
+    the window that passes min_usage / ignore_procs (--export-threads).
+    A task_window dict is filled with the window's prev_tasks, tasks and
+    elapsed, ready to pass on to get_top_processes(**task_window).
+    """
+    cache = task_cache if task_cache is not None else TaskCache()
+    # With stack_procs the task table is also snapshotted around the same
+    # window so per-thread CPU% reflects this interval, not a lifetime average.
+    per_thread = stack_procs or thread_samples is not None or task_window is not None
+    prev_tasks = None
+    if per_thread:
+        with profile_stage("usage.scan_prev"):
+            prev_tasks = cache.scan()
+    t0 = time.monotonic()
+    with profile_stage("usage.window"):
+        if sampler is None:
+            snap1 = read_proc_counters()
+            time.sleep(sample_ms / 1000)
+            snap2 = read_proc_counters()
+        else:
+            if per_thread:
+                time.sleep(sample_ms / 1000)  # thread deltas still need a live window
+            snap1, snap2, _ = sampler.window(sample_ms)
 
+    with profile_stage("usage.compute"):
+        usage_data = compute_core_usage(snap1, snap2)
     stats = []
-    for cid in sorted(snap1.keys()):
-        s1, s2 = snap1[cid], snap2[cid]
-
-        idle1  = s1["idle"] + s1["iowait"]
-        idle2  = s2["idle"] + s2["iowait"]
-        total1 = sum(s1.values())
-        total2 = sum(s2.values())
-
-        d_idle  = idle2  - idle1
-        d_total = total2 - total1
-
-        usage = 0.0 if d_total == 0 else (1.0 - d_idle / d_total) * 100.0
-
-        if   usage >= 80: label = "HOT"
-        elif usage >= 40: label = "WARM"
-        else:             label = "COLD"
-
+    for row, (cid, usage, label) in enumerate(
+            zip(usage_data.core_ids, usage_data.usage, usage_data.labels)):
         phys_id = None
         core_in_phys = None
         if topology and cid in topology:
@@ -552,124 +1277,175 @@ def get_core_usage(sample_ms: int = 500, topology: Optional[dict] = None,
 
         stats.append(CoreStat(
             core_id=cid,
-            usage=round(usage, 1),
+            usage=usage,
             label=label,
             physical_id=phys_id,
-            core_within_physical=core_in_phys
+            core_within_physical=core_in_phys,
+            **{name: vals[row] for name, vals in usage_data.breakdown.items()},
         ))
 
-    # Populate top_proc and top_parent from /proc after both snapshots are done
-    top_procs = get_top_proc_per_core()
-    for cs in stats:
-        cs.top_proc, cs.top_parent = top_procs.get(cs.core_id, ("", ""))
+    # Scan /proc once after both snapshots are done; every per-core view
+    # below is derived from this single task table.
+    with profile_stage("usage.scan"):
+        tasks = cache.scan()
+    elapsed = time.monotonic() - t0
+    if task_window is not None:
+        task_window.update(prev_tasks=prev_tasks, tasks=tasks, elapsed=elapsed)
 
-    # Optionally populate all_procs for stacked display
-    if stack_procs:
-        all_procs_map = get_all_procs_per_core(min_usage=min_usage, ignore_procs=ignore_procs)
+    with profile_stage("usage.per_core"):
+        top_procs = get_top_proc_per_core(tasks)
         for cs in stats:
-            cs.all_procs = all_procs_map.get(cs.core_id, [])
+            cs.top_proc, cs.top_parent = top_procs.get(cs.core_id, ("", ""))
+
+        # Optionally populate all_procs for stacked display
+        if stack_procs:
+            all_procs_map = get_all_procs_per_core(min_usage=min_usage, ignore_procs=ignore_procs,
+                                                   tasks=tasks, prev_tasks=prev_tasks,
+                                                   elapsed=elapsed)
+            for cs in stats:
+                cs.all_procs = all_procs_map.get(cs.core_id, [])
+
+        if thread_samples is not None:
+            thread_samples.extend(iter_thread_cpu(tasks, prev_tasks, elapsed,
+                                                  min_usage, ignore_procs))
 
     return stats
 
 # ─────────────────────────────────────────────
 # Step 2 – Analysis: Top CPU Processes + Affinity
 # ─────────────────────────────────────────────
-def get_threads_for_pid(pid: int, num_cores: int = 1) -> list[ThreadInfo]:
-    """Get all threads for a specific PID with their CPU usage."""
+def read_uptime() -> float:
+    """System uptime in seconds from /proc/uptime (0.0 if unavailable)."""
+    try:
+        with open(f"{PROC_ROOT}/uptime") as f:
+            return float(f.read().split()[0])
+    except (FileNotFoundError, ValueError, IndexError):
+        return 0.0
+
+def read_process_cpu(pid: int) -> Optional[tuple[str, float]]:
+    """
+    (comm, CPU%) for a process from /proc/<pid>/stat, where CPU% is
+    utime+stime over the process lifetime — the pcpu figure ps reports.
+    Returns None if the process is gone or unreadable.
+    """
+    try:
+        with open(f"{PROC_ROOT}/{pid}/stat", "rb") as f:
+            raw = f.read()
+        fields = _stat_fields(raw)
+        if fields is None:
+            return None
+        name = raw[raw.find(b"(") + 1:raw.rfind(b")")].decode(errors="replace")
+        cpu_ticks = int(fields[11]) + int(fields[12])
+        age = read_uptime() - int(fields[19]) / CLK_TCK
+    except (FileNotFoundError, PermissionError, ProcessLookupError, ValueError, IndexError):
+        return None
+    return name, round(cpu_ticks / CLK_TCK / age * 100.0, 1) if age > 0 else 0.0
+
+def get_threads_for_pid(pid: int) -> list[ThreadInfo]:
+    """
+    Get all threads for a specific PID in one batched pass over
+    /proc/<pid>/task: each thread's comm and stat are read once and its
+    affinity queried in-process, with no per-thread subprocesses.
+    CPU% is utime+stime over the thread's lifetime, the same figure ps reports.
+    """
     threads = []
+    task_dir = f"{PROC_ROOT}/{pid}/task"
     try:
-        # Read thread list from /proc/<pid>/task/
-        task_dir = f"/proc/{pid}/task"
-        if not os.path.exists(task_dir):
-            return threads
-        
-        for tid_str in os.listdir(task_dir):
-            if not tid_str.isdigit():
-                continue
-            tid = int(tid_str)
-            
-            try:
-                # Get thread name
-                with open(f"{task_dir}/{tid}/comm") as f:
-                    name = f.read().strip()[:24]
-                
-                # Get thread CPU usage from /proc/<pid>/task/<tid>/stat
-                with open(f"{task_dir}/{tid}/stat") as f:
-                    stat = f.read().strip()
-                    pass
-                
-                # Use ps to get thread-level CPU
-                rc, out, _ = run(["ps", "-p", str(tid), "-o", "pcpu", "--no-headers"])
-                cpu = 0.0
-                if rc == 0 and out:
-                    try:
-                        cpu = float(out.strip())
-                    except ValueError:
-                        pass
-                
-                # Get thread affinity
-                rc2, out2, _ = run(["taskset", "-p", str(tid)])
-                cur_cores = []
-                if rc2 == 0:
-                    m = re.search(r"current affinity mask:\s*([0-9a-fA-F,]+)", out2)
-                    if m:
-                        cur_cores = mask_to_cores(m.group(1), num_cores)
-                
-                threads.append(ThreadInfo(
-                    tid=tid,
-                    tgid=pid,
-                    name=name,
-                    cpu_percent=cpu,
-                    current_cores=cur_cores
-                ))
-            except (FileNotFoundError, PermissionError):
-                continue
+        tids = [int(t) for t in os.listdir(task_dir) if t.isdigit()]
     except (FileNotFoundError, PermissionError):
-        pass
-    
-    return threads
+        return threads
 
-def get_top_processes(n: int = 5, num_cores: int = 1, with_threads: bool = False) -> list[ProcessInfo]:
-    """Get top-N CPU-consuming processes with their core affinity."""
-    rc, out, err = run([
-        "ps", "ax", "-o", "pid,pcpu,comm", "--sort=-pcpu", "--no-headers"
-    ])
-    if rc != 0:
-        die(f"ps failed: {err}")
+    uptime = read_uptime()
 
-    procs = []
-    for line in out.splitlines()[:20]:
-        parts = line.split(None, 2)
-        if len(parts) < 3:
-            continue
+    for tid in tids:
         try:
-            pid  = int(parts[0])
-            cpu  = float(parts[1])
-            name = parts[2].strip()[:24]
-        except ValueError:
+            with open(f"{task_dir}/{tid}/comm") as f:
+                name = f.read().strip()[:24]
+            with open(f"{task_dir}/{tid}/stat", "rb") as f:
+                fields = _stat_fields(f.read())
+            if fields is None:
+                continue
+
+            cpu_ticks = int(fields[11]) + int(fields[12])
+            age = uptime - int(fields[19]) / CLK_TCK
+            cpu = round(cpu_ticks / CLK_TCK / age * 100.0, 1) if age > 0 else 0.0
+
+            threads.append(ThreadInfo(
+                tid=tid,
+                tgid=pid,
+                name=name,
+                cpu_percent=cpu,
+                current_cores=get_affinity(tid) or [],
+                state=fields[0].decode(),
+                priority=int(fields[15]),
+                nice=int(fields[16]),
+                last_cpu=int(fields[36]),
+            ))
+        except (FileNotFoundError, PermissionError, ProcessLookupError, ValueError, IndexError):
             continue
 
-        # Get affinity mask via taskset
-        rc2, out2, err2 = run(["taskset", "-p", str(pid)])
-        if rc2 != 0:
+    return threads
+
+def top_pids_by_cpu(
+    prev_tasks: dict[int, TaskInfo],
+    tasks: dict[int, TaskInfo],
+    elapsed: float,
+    n: int,
+) -> list[tuple[int, float]]:
+    """
+    Rank processes by interval CPU% (sum of their threads' utime+stime deltas
+    between two task tables) and return the top n as [(pid, cpu_pct), ...].
+    """
+    per_pid: dict[int, float] = defaultdict(float)
+    for tid, pct in thread_cpu_percent(prev_tasks, tasks, elapsed).items():
+        per_pid[tasks[tid].pid] += pct
+    return heapq.nlargest(n, per_pid.items(), key=lambda kv: kv[1])
+
+def get_top_processes(n: int = 5, with_threads: bool = False,
+                      tasks: Optional[dict[int, TaskInfo]] = None,
+                      prev_tasks: Optional[dict[int, TaskInfo]] = None,
+                      elapsed: float = 0.0,
+                      sample_ms: int = 500,
+                      task_cache: Optional[TaskCache] = None) -> list[ProcessInfo]:
+    """
+    Get top-N CPU-consuming processes with their core affinity, ranked by
+    CPU used during the interval between two task tables. If neither is
+    given, both are sampled here over a sample_ms window (through
+    task_cache, if given, so only volatile stat fields are re-read); passing
+    only one raises ValueError.
+    """
+    if (tasks is None) != (prev_tasks is None):
+        raise ValueError("tasks and prev_tasks must be given together")
+    if tasks is None:
+        cache = task_cache if task_cache is not None else TaskCache()
+        t0 = time.monotonic()
+        prev_tasks = cache.scan()
+        time.sleep(sample_ms / 1000)
+        tasks = cache.scan()
+        elapsed = time.monotonic() - t0
+
+    names = {t.pid: t.parent_name for t in tasks.values()}
+
+    procs = []
+    for pid, cpu in top_pids_by_cpu(prev_tasks, tasks, elapsed, n):
+        # Get affinity mask
+        allowed = get_affinity(pid)
+        if allowed is None:
             affinity_mask = "N/A"
             cur_cores     = []
         else:
-            m = re.search(r"current affinity mask:\s*([0-9a-fA-F,]+)", out2)
-            affinity_mask = m.group(1) if m else "N/A"
-            cur_cores     = mask_to_cores(affinity_mask, num_cores) if m else []
+            affinity_mask = cores_to_mask(allowed)
+            cur_cores     = allowed
 
         threads = []
         if with_threads:
-            threads = get_threads_for_pid(pid, num_cores)
+            threads = get_threads_for_pid(pid)
 
         procs.append(ProcessInfo(
-            pid=pid, name=name, cpu_percent=cpu,
+            pid=pid, name=names.get(pid, "")[:24], cpu_percent=round(cpu, 1),
             current_cores=cur_cores, affinity_mask=affinity_mask,
             threads=threads
         ))
-        if len(procs) == n:
-            break
 
     return procs
 
@@ -725,12 +1501,12 @@ def build_rebalance_plan(
 # Step 4 – Execution
 # ─────────────────────────────────────────────
 def apply_action(action: RebalanceAction) -> RebalanceAction:
-    """Apply taskset; mark as manual_only on failure."""
-    cpu_list = cores_to_cpulist(action.to_cores)
-    rc, out, err = run(["taskset", "-pc", cpu_list, str(action.pid)])
-    if rc != 0:
+    """Apply sched_setaffinity; mark as manual_only on failure."""
+    try:
+        set_affinity(action.pid, action.to_cores)
+    except OSError as e:
         action.manual_only = True
-        action.error_msg   = err or out or "Permission denied / kernel thread"
+        action.error_msg   = e.strerror or "Permission denied / kernel thread"
     return action
 
 # ─────────────────────────────────────────────
@@ -801,6 +1577,12 @@ def print_system_info(sysinfo: SystemInfo):
 _COL_WIDTHS: dict[str, int] = {
     "Bar":     22,
     "Usage":   6,
+    "User":    6,
+    "Sys":     6,
+    "IOw":     6,
+    "IRQ":     6,
+    "SIRQ":    6,
+    "Steal":   6,
     "Process": 15,
     "Parent":  15,
     "Core":    5,
@@ -810,10 +1592,34 @@ _COL_WIDTHS: dict[str, int] = {
 _LEFT_ORDER  = ["Bar", "Usage", "Process", "Parent", "Core"]
 _RIGHT_ORDER = ["Core", "Parent", "Process", "Usage", "Bar"]
 
+# Optional per-category time columns (--breakdown), placed after Usage;
+# maps column name → CoreStat attribute
+_BREAKDOWN_COLS: dict[str, str] = {
+    "User":  "user",
+    "Sys":   "system",
+    "IOw":   "iowait",
+    "IRQ":   "irq",
+    "SIRQ":  "softirq",
+    "Steal": "steal",
+}
+
+def _visible_cols(ignore_cols: Optional[list[str]] = None,
+                  breakdown: bool = False) -> tuple[list[str], list[str]]:
+    """Return (left, right) column orders after --breakdown and --ignore-col."""
+    ignored = {c.lower() for c in (ignore_cols or [])}
+    left = list(_LEFT_ORDER)
+    if breakdown:
+        at = left.index("Usage") + 1
+        left[at:at] = list(_BREAKDOWN_COLS)
+    left = [c for c in left if c.lower() not in ignored]
+    return left, left[::-1]
+
 # Dark-mode border color (dark gray)
 _BD = "\033[90m"
 
 def _hdr_color(col: str) -> str:
+    if col in _BREAKDOWN_COLS:
+        return C.YELLOW
     return {"Bar": C.DIM, "Usage": C.RED, "Process": C.BLUE,
             "Parent": C.MAGENTA, "Core": C.CYAN}.get(col, "")
 
@@ -847,6 +1653,10 @@ def _render_cell(col: str, cs: Optional[CoreStat],
     if col == "Usage":
         clr = C.RED if cs.usage >= 80 else (C.YELLOW if cs.usage >= 40 else C.GREEN)
         return f" {bold}{clr}{cs.usage:>5.1f}%{C.RESET} "
+    if col in _BREAKDOWN_COLS:
+        val = getattr(cs, _BREAKDOWN_COLS[col])
+        clr = C.RED if val >= 80 else (C.YELLOW if val >= 40 else C.DIM)
+        return f" {bold}{clr}{val:>5.1f}%{C.RESET} "
     if col == "Process":
         txt = (cs.top_proc or "—")[:w]
         clr = C.WHITE if hl else C.BLUE
@@ -887,17 +1697,20 @@ def _render_stacked_cell(col: str, proc_entry: Optional[tuple],
     if col == "Usage":
         clr = C.RED if cpu_pct >= 80 else (C.YELLOW if cpu_pct >= 40 else C.GREEN)
         return f" {C.DIM}{clr}{cpu_pct:>5.1f}%{C.RESET} "
-    # Bar and Core: empty for stacked rows
+    # Bar, Core and breakdown columns: empty for stacked rows
     return " " * pad
 
+@profiled("render")
 def print_topology(topology: dict[int, CPUTopology], core_stats: list[CoreStat],
                    ignore_cols: Optional[list[str]] = None,
                    specify_parents: Optional[list[str]] = None,
-                   stack_procs: bool = False):
-    """Print CPU topology table — two-column for HT servers, single-column otherwise."""
-    ignored = {c.lower() for c in (ignore_cols or [])}
-    vis_left  = [c for c in _LEFT_ORDER  if c.lower() not in ignored]
-    vis_right = [c for c in _RIGHT_ORDER if c.lower() not in ignored]
+                   stack_procs: bool = False,
+                   breakdown: bool = False):
+    """
+    Print CPU topology table — two-column for HT servers, single-column otherwise.
+    breakdown adds per-core user/system/iowait/irq/softirq/steal columns.
+    """
+    vis_left, vis_right = _visible_cols(ignore_cols, breakdown)
     spec_set  = set(specify_parents or [])
 
     stats_map = {cs.core_id: cs for cs in core_stats}
@@ -982,139 +1795,795 @@ def print_topology(topology: dict[int, CPUTopology], core_stats: list[CoreStat],
     ht_status = f"{C.GREEN}Enabled{C.RESET}" if ht_enabled else f"{C.DIM}Disabled{C.RESET}"
     print(f"  Hyperthreading: {ht_status}")
 
+@profiled("render")
 def clear_screen():
-    """Clear terminal screen."""
-    os.system('clear' if os.name != 'nt' else 'cls')
+    """Clear the terminal with ANSI escapes (no `clear` process per refresh)."""
+    sys.stdout.write("\x1b[H\x1b[2J")
+    sys.stdout.flush()
 
-def _fetch_process_info(pid: int, num_cores: int) -> Optional[ProcessInfo]:
+def _fetch_process_info(pid: int) -> Optional[ProcessInfo]:
     """Fetch a single ProcessInfo for the given PID. Returns None if unavailable."""
-    rc, out, _ = run(["ps", "-p", str(pid), "-o", "pid,pcpu,comm", "--no-headers"])
-    if rc != 0 or not out:
-        return None
-    parts = out.strip().split(None, 2)
-    if len(parts) < 3:
-        return None
-    try:
-        pid_val = int(parts[0])
-        cpu     = float(parts[1])
-        name    = parts[2].strip()[:24]
-    except ValueError:
+    info = read_process_cpu(pid)
+    if info is None:
         return None
+    name, cpu = info[0][:24], info[1]
 
-    rc2, out2, _ = run(["taskset", "-p", str(pid_val)])
     affinity_mask = "N/A"
     cur_cores: list[int] = []
-    if rc2 == 0:
-        m = re.search(r"current affinity mask:\s*([0-9a-fA-F,]+)", out2)
-        if m:
-            affinity_mask = m.group(1)
-            cur_cores = mask_to_cores(affinity_mask, num_cores)
+    allowed = get_affinity(pid)
+    if allowed is not None:
+        affinity_mask = cores_to_mask(allowed)
+        cur_cores = allowed
 
-    threads = get_threads_for_pid(pid_val, num_cores)
+    threads = get_threads_for_pid(pid)
     return ProcessInfo(
-        pid=pid_val, name=name, cpu_percent=cpu,
+        pid=pid, name=name, cpu_percent=cpu,
         current_cores=cur_cores, affinity_mask=affinity_mask,
         threads=threads
     )
 
-def live_monitor(duration_sec: int = 5, interval_ms: int = 3000, filter_pids: Optional[list[int]] = None, show_cpu_freq: bool = False, export_html: Optional[str] = None, export_text: Optional[str] = None, export_excel: Optional[str] = None, sysinfo: Optional[SystemInfo] = None, topology_data: Optional[dict] = None, ignore_cols: Optional[list[str]] = None, specify_parents: Optional[list[str]] = None, stack_procs: bool = False, min_usage: float = 0.0, ignore_procs: Optional[list[str]] = None):
+# ─────────────────────────────────────────────
+# Capture Files (--capture)
+# ─────────────────────────────────────────────
+CAPTURE_FORMAT  = "tidycpu-capture"
+CAPTURE_VERSION = 1
+
+def snapshot_to_dict(snap: Snapshot) -> dict:
+    return {"type": "snapshot", **asdict(snap)}
+
+def snapshot_from_dict(d: dict) -> Snapshot:
+    core_stats = []
+    for cs in d["core_stats"]:
+        cs["all_procs"] = [tuple(p) for p in cs["all_procs"]]
+        core_stats.append(CoreStat(**cs))
+    return Snapshot(timestamp=d["timestamp"], iteration=d["iteration"],
+                    core_stats=core_stats, processes=_processes_from_dicts(d["processes"]),
+                    epoch=d.get("epoch", 0.0))
+
+def _processes_from_dicts(items: list[dict]) -> list[ProcessInfo]:
+    processes = []
+    for p in items:
+        p["threads"] = [ThreadInfo(**t) for t in p["threads"]]
+        processes.append(ProcessInfo(**p))
+    return processes
+
+def _capture_header(sysinfo: Optional[SystemInfo], topology: dict[int, CPUTopology]) -> dict:
+    return {
+        "format": CAPTURE_FORMAT, "version": CAPTURE_VERSION,
+        "created": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "sysinfo": asdict(sysinfo) if sysinfo else None,
+        "topology": [asdict(t) for _, t in sorted(topology.items())],
+    }
+
+class CaptureWriter:
+    """
+    Append-only JSON Lines capture: a header record (sysinfo and topology,
+    so the capture can be rendered on another host) followed by one record
+    per snapshot, flushed as it is written so an interrupted run keeps
+    everything taken so far. Only the last `window` snapshots stay in
+    memory. If the file cannot be written, capture continues in memory
+    with just that window and `error` is set.
+    """
+
+    def __init__(self, path: str, sysinfo: Optional[SystemInfo],
+                 topology: dict[int, CPUTopology], window: int = 32):
+        self.path   = path
+        self.recent: deque[Snapshot] = deque(maxlen=window)
+        self.count  = 0
+        self.error  = ""
+        self._f = open(path, "wb")
+        self._put(self._encode_header(_capture_header(sysinfo, topology)))
+
+    def _encode_header(self, header: dict) -> bytes:
+        return json.dumps({"type": "header", **header}, separators=(",", ":")).encode() + b"\n"
+
+    def _encode(self, snap: Snapshot) -> bytes:
+        return json.dumps(snapshot_to_dict(snap), separators=(",", ":")).encode() + b"\n"
+
+    def _put(self, data: bytes):
+        if self._f is None:
+            return
+        try:
+            self._f.write(data)
+            self._f.flush()
+        except OSError as e:
+            self.error = e.strerror or str(e)
+            self._f.close()
+            self._f = None
+
+    def write(self, snap: Snapshot):
+        self.recent.append(snap)
+        self.count += 1
+        if self._f is None:
+            return
+        try:
+            data = self._encode(snap)
+        except (struct.error, ValueError) as e:
+            # Not representable in the file format: keep going in memory, as on a write error
+            self.error = f"cannot encode snapshot {snap.iteration}: {e}"
+            self._f.close()
+            self._f = None
+            return
+        self._put(data)
+
+    def close(self):
+        if self._f is not None:
+            self._f.close()
+            self._f = None
+
+    def snapshots(self):
+        """
+        Everything captured: a reader over the file (close it when done), or
+        the in-memory window after a write error.
+        """
+        return list(self.recent) if self.error else open_capture(self.path)
+
+class CaptureSlice:
+    """Re-iterable view of a capture's snapshots with start <= epoch <= end."""
+
+    def __init__(self, reader, start: Optional[float] = None, end: Optional[float] = None):
+        self.reader, self.start, self.end = reader, start, end
+
+    def __iter__(self):
+        return self.reader.iter_range(self.start, self.end)
+
+    def __len__(self) -> int:
+        return self.reader.count_range(self.start, self.end)
+
+    def last(self) -> Optional[Snapshot]:
+        """The final snapshot in the range, or None if it is empty."""
+        snap = self.reader.last(self.end)
+        return snap if snap is not None and (self.start is None or snap.epoch >= self.start) else None
+
+_JSONL_SNAP  = b'{"type":"snapshot"'
+_JSONL_EPOCH = b',"epoch":'
+
+def _line_epoch(line: bytes) -> float:
+    """Epoch of a JSONL snapshot record without decoding it (epoch is its last key)."""
+    i = line.rfind(_JSONL_EPOCH)
+    try:
+        return float(line[i + len(_JSONL_EPOCH):].rstrip().rstrip(b"}")) if i >= 0 else 0.0
+    except ValueError:
+        return 0.0
+
+class CaptureReader:
+    """
+    Read side of a JSONL capture. Iterating streams snapshots from disk (it
+    can be iterated any number of times, as the exporters do); len(), time
+    ranges and span() look only at the raw records, so snapshots are
+    decoded only when yielded. A truncated last line from an interrupted
+    writer is skipped.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._len: Optional[int] = None
+        with open(path) as f:
+            try:
+                header = json.loads(f.readline())
+            except ValueError:
+                header = {}
+        _check_capture_header(path, header)
+        self.sysinfo  = SystemInfo(**header["sysinfo"]) if header.get("sysinfo") else None
+        self.topology = {t["logical_id"]: CPUTopology(**t) for t in header["topology"]}
+
+    def _records(self):
+        """Raw snapshot lines, header and torn last line excluded."""
+        with open(self.path, "rb") as f:
+            f.readline()   # header
+            for line in f:
+                if line.startswith(_JSONL_SNAP) and line.endswith(b"\n"):
+                    yield line
+
+    @staticmethod
+    def _decode(line: bytes) -> Optional[Snapshot]:
+        try:
+            return snapshot_from_dict(json.loads(line))
+        except ValueError:
+            return None
+
+    def __iter__(self):
+        return self.iter_range()
+
+    def __len__(self) -> int:
+        if self._len is None:
+            self._len = sum(1 for _ in self._records())
+        return self._len
+
+    def _lines_in(self, start: Optional[float], end: Optional[float]):
+        for line in self._records():
+            if start is None and end is None:
+                yield line
+                continue
+            epoch = _line_epoch(line)
+            if start is not None and epoch < start:
+                continue
+            if end is not None and epoch > end:
+                break
+            yield line
+
+    def iter_range(self, start: Optional[float] = None, end: Optional[float] = None):
+        for line in self._lines_in(start, end):
+            snap = self._decode(line)
+            if snap is not None:
+                yield snap
+
+    def count_range(self, start: Optional[float] = None, end: Optional[float] = None) -> int:
+        if start is None and end is None:
+            return len(self)
+        return sum(1 for _ in self._lines_in(start, end))
+
+    def between(self, start: Optional[float] = None, end: Optional[float] = None) -> CaptureSlice:
+        return CaptureSlice(self, start, end)
+
+    def close(self):
+        pass   # every pass opens and closes the file itself
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _reversed_records(self, block: int = 1 << 16):
+        """Complete snapshot lines from the end of the file backwards."""
+        with open(self.path, "rb") as f:
+            pos = f.seek(0, os.SEEK_END)
+            tail, at_end = b"", True
+            while pos > 0:
+                step = min(block, pos)
+                pos -= step
+                f.seek(pos)
+                data = f.read(step) + tail
+                if at_end:
+                    # Whatever follows the last newline is empty or a torn write
+                    nl = data.rfind(b"\n")
+                    if nl < 0:
+                        continue
+                    data, at_end = data[:nl], False
+                lines = data.split(b"\n")
+                # lines[0] may continue in the block before this one
+                tail = lines.pop(0) if pos else b""
+                for line in reversed(lines):
+                    if line.startswith(_JSONL_SNAP):
+                        yield line
+
+    def span(self) -> Optional[tuple[float, float]]:
+        """Epochs of the first and last snapshot, or None if there are none."""
+        first = next(self._records(), None)
+        if first is None:
+            return None
+        return _line_epoch(first), _line_epoch(next(self._reversed_records()))
+
+    def last(self, end: Optional[float] = None) -> Optional[Snapshot]:
+        """The final snapshot (with epoch <= end, if given), read from the end of the file."""
+        for line in self._reversed_records():
+            if end is None or _line_epoch(line) <= end:
+                snap = self._decode(line)
+                if snap is not None:
+                    return snap
+        return None
+
+def _check_capture_header(path: str, header: dict):
+    if header.get("format") != CAPTURE_FORMAT:
+        raise ValueError(f"{path} is not a TidyCPU capture")
+    if header.get("version", 0) > CAPTURE_VERSION:
+        raise ValueError(f"{path} uses capture version {header['version']}; "
+                         f"this TidyCPU reads up to {CAPTURE_VERSION}")
+
+# ── Binary capture (.tcap) ───────────────────────────────────────────────────
+# File:   TCAP_HEAD (magic, version, header length) + JSON header, then records.
+# Record: TCAP_REC (tag, body length) + body, where tag is
+#   b"S"  string-table entry: UTF-8 body, ids assigned in order of appearance
+#   b"N"  snapshot: TCAP_SNAP, then per core TCAP_CORE + n_procs * TCAP_PROC,
+#         then the processes list as JSON (usually empty)
+#   b"B"  time base: TCAP_BASE, absolute ms the next snapshot's delta is from
+#         (written only when a delta would not fit in TCAP_SNAP's int32)
+# Timestamps are milliseconds, delta-encoded from the header's base_ms.
+# Snapshots hold per-interval percentages rather than cumulative counters,
+# so there is nothing further to delta-encode.
+# Percentages are fixed point in hundredths; names are string-table ids.
+TCAP_MAGIC = b"TCAP"
+TCAP_HEAD  = struct.Struct("<4sHI")       # magic, version, header JSON length
+TCAP_REC   = struct.Struct("<cI")         # tag, body length
+TCAP_SNAP  = struct.Struct("<iIHI")       # Δms, iteration, n_cores, processes JSON length
+TCAP_CORE  = struct.Struct("<HhhB7HIIH")  # core_id, physical_id, core_within_physical, label,
+                                          # usage + breakdown, top_proc, top_parent, n_procs
+TCAP_PROC  = struct.Struct("<IIH")        # name id, parent id, cpu %
+TCAP_BASE  = struct.Struct("<q")          # absolute ms
+_INT32_MIN, _INT32_MAX = -(1 << 31), (1 << 31) - 1
+_TCAP_LABELS = ("HOT", "WARM", "COLD")
+_TCAP_PCT_FIELDS = ("usage",) + tuple(name for name, _ in BREAKDOWN_FIELDS)
+
+def _pct(v: float) -> int:
+    return min(max(int(round(v * 100)), 0), 0xFFFF)
+
+class TcapWriter(CaptureWriter):
+    """
+    CaptureWriter for the compact binary format: fixed-width per-core
+    records, thread/parent names interned into an inline string table, and
+    delta-encoded timestamps. Several times smaller than JSONL for
+    stacked captures.
+    """
+
+    def __init__(self, path: str, sysinfo: Optional[SystemInfo],
+                 topology: dict[int, CPUTopology], window: int = 32):
+        self._ids: dict[str, int] = {}
+        self._last_ms = round(time.time() * 1000)
+        super().__init__(path, sysinfo, topology, window)
+
+    def _encode_header(self, header: dict) -> bytes:
+        body = json.dumps({**header, "base_ms": self._last_ms}, separators=(",", ":")).encode()
+        return TCAP_HEAD.pack(TCAP_MAGIC, CAPTURE_VERSION, len(body)) + body
+
+    def _intern(self, s: str, out: list[bytes]) -> int:
+        sid = self._ids.get(s)
+        if sid is None:
+            sid = self._ids[s] = len(self._ids)
+            data = s.encode()
+            out.append(TCAP_REC.pack(b"S", len(data)) + data)
+        return sid
+
+    def _encode(self, snap: Snapshot) -> bytes:
+        out: list[bytes] = []   # string records first, then the snapshot
+        parts: list[bytes] = []
+        for cs in snap.core_stats:
+            label = _TCAP_LABELS.index(cs.label) if cs.label in _TCAP_LABELS else 2
+            parts.append(TCAP_CORE.pack(
+                cs.core_id,
+                -1 if cs.physical_id is None else cs.physical_id,
+                -1 if cs.core_within_physical is None else cs.core_within_physical,
+                label,
+                *(_pct(getattr(cs, f)) for f in _TCAP_PCT_FIELDS),
+                self._intern(cs.top_proc, out), self._intern(cs.top_parent, out),
+                len(cs.all_procs)))
+            for name, parent, cpu in cs.all_procs:
+                parts.append(TCAP_PROC.pack(self._intern(name, out),
+                                            self._intern(parent, out), _pct(cpu)))
+        procs = json.dumps([asdict(p) for p in snap.processes],
+                           separators=(",", ":")).encode() if snap.processes else b""
+
+        ms = round((snap.epoch or time.time()) * 1000)
+        if not _INT32_MIN <= ms - self._last_ms <= _INT32_MAX:
+            out.append(TCAP_REC.pack(b"B", TCAP_BASE.size) + TCAP_BASE.pack(ms))
+            self._last_ms = ms
+        head = TCAP_SNAP.pack(ms - self._last_ms, snap.iteration, len(snap.core_stats), len(procs))
+        self._last_ms = ms
+        body = b"".join([head, *parts, procs])
+        out.append(TCAP_REC.pack(b"N", len(body)) + body)
+        return b"".join(out)
+
+class TcapReader:
+    """
+    mmap-backed reader for .tcap captures. Opening walks the record headers
+    once to build the string table and a timestamp index (snapshot bodies
+    are not decoded), so len() and time-range lookups are cheap and a
+    snapshot is only unpacked when iterated. A truncated final record from
+    an interrupted writer is ignored.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._f  = open(path, "rb")
+        try:
+            self._mm = mmap.mmap(self._f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:   # empty file
+            self._f.close()
+            raise ValueError(f"{path} is not a TidyCPU capture")
+        mm = self._mm
+        if len(mm) < TCAP_HEAD.size:
+            raise ValueError(f"{path} is not a TidyCPU capture")
+        magic, version, hlen = TCAP_HEAD.unpack_from(mm, 0)
+        if magic != TCAP_MAGIC:
+            raise ValueError(f"{path} is not a TidyCPU capture")
+        header = json.loads(mm[TCAP_HEAD.size:TCAP_HEAD.size + hlen])
+        _check_capture_header(path, {**header, "version": version})
+        self.sysinfo  = SystemInfo(**header["sysinfo"]) if header.get("sysinfo") else None
+        self.topology = {t["logical_id"]: CPUTopology(**t) for t in header["topology"]}
+
+        self._strings: list[str] = []
+        self._times:   list[float] = []   # epoch seconds, ascending
+        self._offsets: list[int] = []     # snapshot body offsets
+        t_ms = header["base_ms"]
+        pos, size = TCAP_HEAD.size + hlen, len(mm)
+        while pos + TCAP_REC.size <= size:
+            tag, blen = TCAP_REC.unpack_from(mm, pos)
+            body = pos + TCAP_REC.size
+            if body + blen > size:
+                break   # torn write at the end
+            if tag == b"S":
+                self._strings.append(mm[body:body + blen].decode(errors="replace"))
+            elif tag == b"B":
+                t_ms = TCAP_BASE.unpack_from(mm, body)[0]
+            elif tag == b"N":
+                t_ms += struct.unpack_from("<i", mm, body)[0]
+                self._times.append(t_ms / 1000)
+                self._offsets.append(body)
+            pos = body + blen
+
+    def close(self):
+        self._mm.close()
+        self._f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self) -> int:
+        return len(self._offsets)
+
+    def __iter__(self):
+        return self.iter_range()
+
+    def _span(self, start: Optional[float], end: Optional[float]) -> tuple[int, int]:
+        lo = 0 if start is None else bisect.bisect_left(self._times, start)
+        hi = len(self._times) if end is None else bisect.bisect_right(self._times, end)
+        return lo, hi
+
+    def iter_range(self, start: Optional[float] = None, end: Optional[float] = None):
+        lo, hi = self._span(start, end)
+        for i in range(lo, hi):
+            yield self._decode(i)
+
+    def count_range(self, start: Optional[float] = None, end: Optional[float] = None) -> int:
+        lo, hi = self._span(start, end)
+        return hi - lo
+
+    def between(self, start: Optional[float] = None, end: Optional[float] = None) -> CaptureSlice:
+        return CaptureSlice(self, start, end)
+
+    def span(self) -> Optional[tuple[float, float]]:
+        return (self._times[0], self._times[-1]) if self._times else None
+
+    def last(self, end: Optional[float] = None) -> Optional[Snapshot]:
+        _, hi = self._span(None, end)
+        return self._decode(hi - 1) if hi else None
+
+    def _decode(self, i: int) -> Snapshot:
+        mm, strings, epoch = self._mm, self._strings, self._times[i]
+        pos = self._offsets[i]
+        _, iteration, n_cores, plen = TCAP_SNAP.unpack_from(mm, pos)
+        pos += TCAP_SNAP.size
+        core_stats = []
+        for _ in range(n_cores):
+            (cid, phys, cwp, label, *pcts, top, parent, n_procs) = TCAP_CORE.unpack_from(mm, pos)
+            pos += TCAP_CORE.size
+            procs = []
+            for _ in range(n_procs):
+                name_id, parent_id, cpu = TCAP_PROC.unpack_from(mm, pos)
+                procs.append((strings[name_id], strings[parent_id], cpu / 100))
+                pos += TCAP_PROC.size
+            core_stats.append(CoreStat(
+                core_id=cid, label=_TCAP_LABELS[label],
+                physical_id=None if phys < 0 else phys,
+                core_within_physical=None if cwp < 0 else cwp,
+                top_proc=strings[top], top_parent=strings[parent], all_procs=procs,
+                **{f: v / 100 for f, v in zip(_TCAP_PCT_FIELDS, pcts)}))
+        processes = _processes_from_dicts(json.loads(mm[pos:pos + plen])) if plen else []
+        return Snapshot(timestamp=datetime.fromtimestamp(epoch).strftime("%Y-%m-%d %H:%M:%S"),
+                        iteration=iteration, core_stats=core_stats, processes=processes,
+                        epoch=epoch)
+
+def open_capture(path: str):
+    """Reader for a capture file, JSONL or .tcap (detected from its first bytes)."""
+    with open(path, "rb") as f:
+        magic = f.read(len(TCAP_MAGIC))
+    return TcapReader(path) if magic == TCAP_MAGIC else CaptureReader(path)
+
+def open_capture_writer(path: str, sysinfo: Optional[SystemInfo],
+                        topology: dict[int, CPUTopology]) -> CaptureWriter:
+    """TcapWriter for *.tcap paths, JSONL CaptureWriter otherwise."""
+    cls = TcapWriter if path.endswith(".tcap") else CaptureWriter
+    return cls(path, sysinfo, topology)
+
+# ─────────────────────────────────────────────
+# Self-Overhead Budget (--overhead-budget)
+# ─────────────────────────────────────────────
+def read_self_cpu() -> float:
+    """CPU seconds (utime+stime, all threads) used by this process so far."""
+    # Always the live /proc: PROC_ROOT may point at a synthetic tree
+    with open("/proc/self/stat", "rb") as f:
+        fields = _stat_fields(f.read())
+    return (int(fields[11]) + int(fields[12])) / CLK_TCK
+
+class OverheadBudget:
+    """
+    Keeps TidyCPU's own CPU use in live mode under budget_pct of one core.
+    After each iteration update() measures usage since the previous call
+    from /proc/self/stat and moves one step along a degradation ladder when
+    over budget, or one step back after a few iterations under half of it:
+
+      level 1  stacked process scans only every 2nd iteration
+      level 2  ... and the refresh interval doubled
+      level 3  stacked scans every 4th iteration, interval x4
+
+    Work done inside --scan-pool process workers is not counted.
+    """
+
+    MAX_LEVEL = 3
+    RELAX_AFTER = 3   # iterations under half the budget before stepping back
+
+    def __init__(self, budget_pct: float):
+        self.budget_pct = budget_pct
+        self.level      = 0
+        self.last_pct   = 0.0
+        self.degraded_iterations = 0
+        self._under = 0
+        self._cpu0  = read_self_cpu()
+        self._wall0 = time.monotonic()
+        self._start_cpu, self._start_wall = self._cpu0, self._wall0
+
+    @property
+    def stack_every(self) -> int:
+        return 1 if self.level == 0 else 4 if self.level >= 3 else 2
+
+    @property
+    def interval_factor(self) -> int:
+        return 4 if self.level >= 3 else 2 if self.level == 2 else 1
+
+    def stack_now(self, iteration: int) -> bool:
+        """Whether this iteration should run the stacked (two-scan) collection."""
+        return iteration % self.stack_every == 0
+
+    def update(self) -> float:
+        """Measure CPU% of one core since the last update and adapt. Returns it."""
+        cpu, wall = read_self_cpu(), time.monotonic()
+        if wall > self._wall0:
+            self.last_pct = (cpu - self._cpu0) / (wall - self._wall0) * 100.0
+        self._cpu0, self._wall0 = cpu, wall
+
+        if self.last_pct > self.budget_pct:
+            self.level = min(self.level + 1, self.MAX_LEVEL)
+            self._under = 0
+        elif self.last_pct < self.budget_pct / 2 and self.level > 0:
+            self._under += 1
+            if self._under >= self.RELAX_AFTER:
+                self.level -= 1
+                self._under = 0
+        if self.level:
+            self.degraded_iterations += 1
+        return self.last_pct
+
+    def average_pct(self) -> float:
+        wall = time.monotonic() - self._start_wall
+        return (read_self_cpu() - self._start_cpu) / wall * 100.0 if wall > 0 else 0.0
+
+    def describe(self) -> str:
+        """Human-readable list of the active degradations ("" at level 0)."""
+        parts = []
+        if self.stack_every > 1:
+            parts.append(f"stacked processes refreshed every {self.stack_every} iterations")
+        if self.interval_factor > 1:
+            parts.append(f"interval x{self.interval_factor}")
+        return ", ".join(parts)
+
+def print_overhead(budget: OverheadBudget, stale: bool):
+    """One-line self-overhead status for the live screen."""
+    color = C.RED if budget.last_pct > budget.budget_pct else C.GREEN
+    line = (f"\n  {C.DIM}Overhead:{C.RESET} {color}{budget.last_pct:.1f}%{C.RESET} of one core "
+            f"{C.DIM}(budget {budget.budget_pct:g}%){C.RESET}")
+    if budget.level:
+        line += f"  {C.YELLOW}degraded: {budget.describe()}{C.RESET}"
+        if stale:
+            line += f" {C.YELLOW}— stacked rows are from an earlier iteration{C.RESET}"
+    print(line)
+
+def live_monitor(duration_sec: int = 5, interval_ms: int = 3000, filter_pids: Optional[list[int]] = None, show_cpu_freq: bool = False, export_html: Optional[str] = None, export_text: Optional[str] = None, export_excel: Optional[str] = None, sysinfo: Optional[SystemInfo] = None, topology_data: Optional[dict] = None, ignore_cols: Optional[list[str]] = None, specify_parents: Optional[list[str]] = None, stack_procs: bool = False, min_usage: float = 0.0, ignore_procs: Optional[list[str]] = None, sampler: Optional[StatSampler] = None, breakdown: bool = False, pid_spec: Optional[str] = None, pid_index: Optional[PidIndex] = None, scan_workers: int = 1, scan_pool: str = "thread", overhead_budget: Optional[float] = None, capture: Optional[str] = None, html_mode: str = "tables", excel_mode: str = "auto", export_cores: Optional[str] = None, export_threads: Optional[str] = None):
     """
     Live monitoring mode - refresh stats every interval_ms for duration_sec iterations.
     CPU is sampled for SAMPLE_MS (fast), then the screen is shown for the remaining
     display time so the user can actually read it before the next refresh.
-    If filter_pids is set, show threads for each of those PIDs.
-    Collects snapshots for export if export options are provided.
+    With a background sampler the last SAMPLE_MS is read from its ring buffer,
+    so the screen stays up for the whole interval.
+    scan_workers > 1 shards the /proc task scan across a scan_pool
+    ("thread" or "process") of that many workers.
+    If filter_pids is set, show threads for each of those PIDs. With pid_spec
+    and pid_index, the spec is re-resolved every iteration against the
+    incrementally refreshed index so restarted services stay tracked.
+    overhead_budget (% of one core) enables OverheadBudget, which thins out
+    stacked scans and stretches the interval while TidyCPU is over it; the
+    export_threads stream is thinned with the stacked scans.
+    Snapshots are streamed to a capture file (`capture`, or a temporary one
+    when only exports are requested) and the exports read them back from
+    it, so memory stays bounded. Ctrl+C ends the run early but still
+    exports what was captured.
     """
     SAMPLE_MS = 500   # CPU sampling window — short, accurate
     display_ms = max(interval_ms - SAMPLE_MS, 1000)  # how long screen stays visible
 
     topology = topology_data if topology_data else get_cpu_topology()
-    num_cores = len(topology)
+    # stable task metadata survives across iterations
+    task_cache = TaskCache(workers=scan_workers, pool=scan_pool)
 
     iterations = duration_sec
-    snapshots = [] if (export_html or export_text or export_excel) else None
-
-    for i in range(iterations):
-        # ── 1. Sample CPU (happens invisibly, screen still showing previous frame) ──
-        core_stats = get_core_usage(sample_ms=SAMPLE_MS, topology=topology,
-                                    stack_procs=stack_procs, min_usage=min_usage,
-                                    ignore_procs=ignore_procs)
-
-        # ── 2. Collect process info ───────────────────────────────────────────────
-        processes: list[ProcessInfo] = []
-        if filter_pids:
-            for pid in filter_pids:
-                info = _fetch_process_info(pid, num_cores)
-                if info is not None:
-                    processes.append(info)
-
-        # ── 3. Render (clear → print → user reads) ────────────────────────────────
-        clear_screen()
-        print(BANNER)
-
-        if i == 0 and sysinfo:
-            print_system_info(sysinfo)
-
-        refresh_label = f"{interval_ms // 1000}s"
-        print(f"\n  {C.CYAN}Live Monitor Mode{C.RESET} — {C.DIM}Refresh: {refresh_label}  "
-              f"Iteration: {i+1}/{iterations}{C.RESET}")
-
-        print_topology(topology, core_stats,
-                       ignore_cols=ignore_cols,
-                       specify_parents=specify_parents,
-                       stack_procs=stack_procs)
-
-        if filter_pids:
-            label = " | ".join(str(p) for p in filter_pids)
-            print(f"\n  {C.YELLOW}Filtering: {label}{C.RESET}")
-            for info in processes:
-                print_process_details_live(info)
-            not_found = [p for p in filter_pids if not any(pr.pid == p for pr in processes)]
-            for pid in not_found:
-                print(f"  {C.RED}✘ PID {pid} not found or inaccessible{C.RESET}")
-
-        if snapshots is not None:
-            snapshot = Snapshot(
-                timestamp=datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                iteration=i + 1,
-                core_stats=core_stats,
-                processes=processes,
-            )
-            snapshots.append(snapshot)
-
-        print(f"\n  {C.DIM}Press Ctrl+C to exit{C.RESET}")
+    exporting = bool(export_html or export_text or export_excel)
+    writer: Optional[CaptureWriter] = None
+    spool = None
+    snapshots = None
+    try:
+        if capture or exporting:
+            if not capture:
+                fd, spool = tempfile.mkstemp(prefix="tidycpu-", suffix=".jsonl")
+                os.close(fd)
+            writer = open_capture_writer(capture or spool, sysinfo, topology)
+        core_series, thread_series = open_series(export_cores, export_threads)
+        budget = OverheadBudget(overhead_budget) if overhead_budget is not None else None
+        last_stacked: dict[int, list[tuple]] = {}
+
+        interrupted = False
+        try:
+            for i in range(iterations):
+                # ── 1. Sample CPU (happens invisibly, screen still showing previous frame) ──
+                per_thread_now = budget is None or budget.stack_now(i)
+                stack_now = stack_procs and per_thread_now
+                samples = [] if thread_series is not None and per_thread_now else None
+                core_stats = get_core_usage(sample_ms=SAMPLE_MS, topology=topology,
+                                            stack_procs=stack_now, min_usage=min_usage,
+                                            ignore_procs=ignore_procs, sampler=sampler,
+                                            task_cache=task_cache,
+                                            thread_samples=samples)
+                stale = stack_procs and not stack_now
+                if stack_now:
+                    last_stacked = {cs.core_id: cs.all_procs for cs in core_stats}
+                elif stale:
+                    # Over budget: show the last stacked lists rather than none
+                    for cs in core_stats:
+                        cs.all_procs = last_stacked.get(cs.core_id, [])
+
+                # ── 2. Collect process info ───────────────────────────────────────────────
+                unmatched: list[str] = []
+                processes: list[ProcessInfo] = []
+                with profile_stage("processes"):
+                    if pid_spec and pid_index is not None:
+                        filter_pids, unmatched = pid_index.refresh(
+                            process_starttimes(task_cache.table)).resolve(pid_spec)
+
+                    if filter_pids:
+                        for pid in filter_pids:
+                            info = _fetch_process_info(pid)
+                            if info is not None:
+                                processes.append(info)
+
+                # ── 3. Render (clear → print → user reads) ────────────────────────────────
+                clear_screen()
+                print(BANNER)
+
+                if i == 0 and sysinfo:
+                    print_system_info(sysinfo)
+
+                factor = budget.interval_factor if budget else 1
+                refresh_label = f"{interval_ms * factor // 1000}s"
+                print(f"\n  {C.CYAN}Live Monitor Mode{C.RESET} — {C.DIM}Refresh: {refresh_label}  "
+                      f"Iteration: {i+1}/{iterations}{C.RESET}")
+
+                print_topology(topology, core_stats,
+                               ignore_cols=ignore_cols,
+                               specify_parents=specify_parents,
+                               stack_procs=stack_procs,
+                               breakdown=breakdown)
+
+                if filter_pids or unmatched:
+                    label = " | ".join(str(p) for p in filter_pids)
+                    print(f"\n  {C.YELLOW}Filtering: {label}{C.RESET}")
+                    for info in processes:
+                        print_process_details_live(info)
+                    not_found = [p for p in filter_pids if not any(pr.pid == p for pr in processes)]
+                    for pid in not_found:
+                        print(f"  {C.RED}✘ PID {pid} not found or inaccessible{C.RESET}")
+                    for token in unmatched:
+                        print(f"  {C.RED}✘ No process matching '{token}'{C.RESET}")
+
+                now = round(time.time(), 3)
+                snap = Snapshot(
+                    timestamp=datetime.fromtimestamp(now).strftime("%Y-%m-%d %H:%M:%S"),
+                    iteration=i + 1,
+                    core_stats=core_stats,
+                    processes=processes,
+                    epoch=now,
+                )
+                if writer is not None:
+                    writer.write(snap)
+                with profile_stage("export.series"):
+                    if core_series is not None:
+                        core_series.write(core_series_rows(snap))
+                    if samples is not None:
+                        thread_series.write(thread_series_rows(snap, samples))
+
+                if _PROFILER is not None:
+                    print_profile(_PROFILER.end_iteration(), f"iteration {i + 1}")
+
+                if budget is not None:
+                    budget.update()
+                    print_overhead(budget, stale)
+
+                print(f"\n  {C.DIM}Press Ctrl+C to exit{C.RESET}")
+
+                # ── 4. Sleep the display window so the user can read the screen ───────────
+                if i < iterations - 1:
+                    # Per-thread sampling waits out a live window even with a sampler
+                    blocking = sampler is None or stack_now or samples is not None
+                    time.sleep((display_ms if blocking else interval_ms) * factor / 1000)
+        except KeyboardInterrupt:
+            interrupted = True
 
-        # ── 4. Sleep the display window so the user can read the screen ───────────
-        if i < iterations - 1:
-            time.sleep(display_ms / 1000)
-    
-    print(f"\n  {C.GREEN}Live monitoring complete.{C.RESET}\n")
-    
-    if snapshots and sysinfo:
-        if export_html:
+        task_cache.close()
+        if interrupted:
+            print(f"\n\n  {C.YELLOW}Monitoring interrupted.{C.RESET}\n")
+        else:
+            print(f"\n  {C.GREEN}Live monitoring complete.{C.RESET}\n")
+
+        if writer is not None:
+            writer.close()
+            if writer.error:
+                print(f"  {C.RED}✘{C.RESET}  Capture write failed ({writer.error}); "
+                      f"only the last {len(writer.recent)} snapshots are kept.\n")
+            elif capture:
+                print(f"  {C.GREEN}✔{C.RESET}  Captured {writer.count} snapshots to: {C.CYAN}{capture}{C.RESET}\n")
+            snapshots = writer.snapshots()
+        close_series(core_series, thread_series)
+        if budget is not None:
+            msg = (f"  {C.DIM}Self-overhead:{C.RESET} {budget.average_pct():.1f}% of one core on average "
+                   f"{C.DIM}(budget {budget.budget_pct:g}%){C.RESET}")
+            if budget.degraded_iterations:
+                msg += (f"  {C.YELLOW}results degraded in {budget.degraded_iterations} of "
+                        f"{iterations} iterations{C.RESET}")
+            print(msg + "\n")
+
+        if snapshots and sysinfo:
+            export_snapshots(sysinfo, topology, core_stats, snapshots,
+                             export_html=export_html, export_text=export_text,
+                             export_excel=export_excel, ignore_cols=ignore_cols,
+                             stack_procs=stack_procs, breakdown=breakdown, html_mode=html_mode,
+                             excel_mode=excel_mode)
+    finally:
+        if isinstance(snapshots, (CaptureReader, TcapReader)):
+            snapshots.close()
+        # Also on die() or an error part-way through: never leave the spool behind
+        if spool is not None:
             try:
-                filename = export_to_html(sysinfo, topology, core_stats, [], export_html,
-                                          snapshots=snapshots, ignore_cols=ignore_cols)
-                print(f"  {C.GREEN}✔{C.RESET}  HTML report with {len(snapshots)} snapshots exported to: {C.CYAN}{filename}{C.RESET}\n")
-            except Exception as e:
-                print(f"  {C.RED}✘{C.RESET}  HTML export failed: {e}\n")
+                os.unlink(spool)
+            except FileNotFoundError:
+                pass
 
-        if export_text:
-            try:
-                filename = export_to_text(sysinfo, topology, core_stats, [], export_text,
-                                          snapshots=snapshots, ignore_cols=ignore_cols)
-                print(f"  {C.GREEN}✔{C.RESET}  Text report with {len(snapshots)} snapshots exported to: {C.CYAN}{filename}{C.RESET}\n")
-            except Exception as e:
-                print(f"  {C.RED}✘{C.RESET}  Text export failed: {e}\n")
+    if _PROFILER is not None:
+        print_profile_summary(_PROFILER)
+
+def export_snapshots(sysinfo: SystemInfo, topology: dict[int, CPUTopology],
+                     core_stats: list[CoreStat], snapshots,
+                     export_html: Optional[str] = None, export_text: Optional[str] = None,
+                     export_excel: Optional[str] = None, ignore_cols: Optional[list[str]] = None,
+                     stack_procs: bool = False, breakdown: bool = False,
+                     html_mode: str = "tables", excel_mode: str = "auto"):
+    """Write the requested reports for a snapshot series (live mode and --replay)."""
+    if export_html:
+        try:
+            filename = export_to_html(sysinfo, topology, core_stats, [], export_html,
+                                      snapshots=snapshots, ignore_cols=ignore_cols,
+                                      breakdown=breakdown, html_mode=html_mode)
+            print(f"  {C.GREEN}✔{C.RESET}  HTML report with {len(snapshots)} snapshots exported to: {C.CYAN}{filename}{C.RESET}\n")
+        except Exception as e:
+            print(f"  {C.RED}✘{C.RESET}  HTML export failed: {e}\n")
 
-        if export_excel:
-            try:
-                filename = export_to_excel(sysinfo, topology, core_stats, [], export_excel,
-                                           snapshots=snapshots, ignore_cols=ignore_cols,
-                                           stack_procs=stack_procs)
-                print(f"  {C.GREEN}✔{C.RESET}  Excel report with {len(snapshots)} snapshots exported to: {C.CYAN}{filename}{C.RESET}\n")
-            except Exception as e:
-                print(f"  {C.RED}✘{C.RESET}  Excel export failed: {e}\n")
+    if export_text:
+        try:
+            filename = export_to_text(sysinfo, topology, core_stats, [], export_text,
+                                      snapshots=snapshots, ignore_cols=ignore_cols,
+                                      breakdown=breakdown)
+            print(f"  {C.GREEN}✔{C.RESET}  Text report with {len(snapshots)} snapshots exported to: {C.CYAN}{filename}{C.RESET}\n")
+        except Exception as e:
+            print(f"  {C.RED}✘{C.RESET}  Text export failed: {e}\n")
+
+    if export_excel:
+        try:
+            filename = export_to_excel(sysinfo, topology, core_stats, [], export_excel,
+                                       snapshots=snapshots, ignore_cols=ignore_cols,
+                                       stack_procs=stack_procs, breakdown=breakdown,
+                                       excel_mode=excel_mode)
+            print(f"  {C.GREEN}✔{C.RESET}  Excel report with {len(snapshots)} snapshots exported to: {C.CYAN}{filename}{C.RESET}\n")
+        except Exception as e:
+            print(f"  {C.RED}✘{C.RESET}  Excel export failed: {e}\n")
 
 def print_process_details_live(proc: ProcessInfo):
     """Print a single process's thread details during live monitoring (no affinity mask)."""
@@ -1123,13 +2592,13 @@ def print_process_details_live(proc: ProcessInfo):
     print(f"{C.BOLD}{'─'*62}{C.RESET}")
 
     if proc.threads:
-        print(f"  {'TID':>7}  {'Name':<24}  {'CPU%':>6}  Cores")
-        print(f"  {'───':>7}  {'────────────────────────':<24}  {'─────':>6}  ─────")
+        print(f"  {'TID':>7}  {'Name':<24}  {'CPU%':>6}  {'S':>1}  {'Last':>4}  Cores")
+        print(f"  {'───':>7}  {'────────────────────────':<24}  {'─────':>6}  {'─':>1}  {'────':>4}  ─────")
         for t in proc.threads[:15]:
             t_cores_str = ",".join(map(str, t.current_cores)) if t.current_cores else "all"
             print(
                 f"  {t.tid:>7}  {t.name:<24}  "
-                f"{C.YELLOW}{t.cpu_percent:>5.1f}%{C.RESET}  {t_cores_str}"
+                f"{C.YELLOW}{t.cpu_percent:>5.1f}%{C.RESET}  {t.state:>1}  {t.last_cpu:>4}  {t_cores_str}"
             )
         if len(proc.threads) > 15:
             print(f"  {C.DIM}... {len(proc.threads) - 15} more threads{C.RESET}")
@@ -1160,6 +2629,39 @@ def print_rebalance_plan(actions: list[RebalanceAction]):
         )
     print(f"\n  {len(actions)} change(s) proposed.")
 
+def _profile_rows(stages: dict[str, StageStat], per_call: bool = False):
+    print(f"    {'Stage':<18} {'Calls':>5}  {'Wall ms':>9}  {'CPU ms':>9}  {'Opens':>7}  {'Spawns':>6}")
+    print(f"    {'─'*18} {'─'*5}  {'─'*9}  {'─'*9}  {'─'*7}  {'─'*6}")
+    total = StageStat()
+    for name, st in stages.items():
+        total.add(st)
+        n = st.calls if per_call and st.calls else 1
+        print(f"    {name:<18} {st.calls:>5}  {st.wall / n * 1000:>9.1f}  {st.cpu / n * 1000:>9.1f}"
+              f"  {st.opens / n:>7.{1 if per_call else 0}f}  {st.spawns / n:>6.{1 if per_call else 0}f}")
+    if not per_call:
+        print(f"    {C.BOLD}{'total':<18} {total.calls:>5}  {total.wall * 1000:>9.1f}  "
+              f"{total.cpu * 1000:>9.1f}  {total.opens:>7}  {total.spawns:>6}{C.RESET}")
+
+def print_profile(stages: dict[str, StageStat], title: str):
+    """Per-stage breakdown for one iteration (--profile)."""
+    print(f"\n  {C.CYAN}Profile — {title}{C.RESET}")
+    _profile_rows(stages)
+
+def print_profile_summary(profiler: Profiler):
+    """Run totals and per-call means for every stage (--profile)."""
+    profiler.flush()   # stages after the last iteration, e.g. exports
+    if not profiler.totals:
+        return
+    runs = f"  {C.DIM}({profiler.iterations} iterations){C.RESET}" if profiler.iterations else ""
+    print(f"\n{C.BOLD}{'─'*62}{C.RESET}")
+    print(f"{C.BOLD}  PROFILE SUMMARY{C.RESET}{runs}")
+    print(f"{C.BOLD}{'─'*62}{C.RESET}")
+    print(f"\n  {C.DIM}Totals{C.RESET}")
+    _profile_rows(profiler.totals)
+    if profiler.iterations > 1:
+        print(f"\n  {C.DIM}Mean per call{C.RESET}")
+        _profile_rows(profiler.totals, per_call=True)
+
 def print_results(actions: list[RebalanceAction]):
     print(f"\n{C.BOLD}{'─'*62}{C.RESET}")
     print(f"{C.BOLD}  EXECUTION RESULTS{C.RESET}")
@@ -1185,6 +2687,164 @@ def print_results(actions: list[RebalanceAction]):
 # ─────────────────────────────────────────────
 # Export Functions
 # ─────────────────────────────────────────────
+# Client-side renderer for --html-mode data (see _write_html_data_report).
+_HTML_DATA_SCRIPT = r"""
+(function () {
+  const D = JSON.parse(document.getElementById('tidy-data').textContent);
+  const NS = D.it.length, NC = D.cores.length;
+  const BD = {User: 'user', Sys: 'system', IOw: 'iowait', IRQ: 'irq', SIRQ: 'softirq', Steal: 'steal'};
+  const CLS = {H: 'hot', W: 'warm', C: 'cold'};
+  const t = [D.t0];
+  for (const d of D.dt) t.push(t[t.length - 1] + d);
+  const hhmmss = s => new Date(s * 1000).toISOString().slice(11, 19);
+  const pct = (f, s, c) => D[f][s * NC + c];
+  const root = document.getElementById('tidy-report');
+  let cur = 0, heatDrawn = false;
+
+  function el(tag, attrs, text) {
+    const e = document.createElement(tag);
+    for (const k in attrs || {}) e.setAttribute(k, attrs[k]);
+    if (text !== undefined) e.textContent = text;
+    return e;
+  }
+
+  // Usage (tenths of a percent) → colour: idle, COLD, WARM, HOT.
+  const STOPS = [[0, [37, 37, 38]], [400, [76, 175, 80]], [800, [255, 152, 0]], [1000, [244, 67, 54]]];
+  function heatColor(v) {
+    if (v < 0) return [30, 30, 30];
+    v = Math.min(v, 1000);
+    let i = 1;
+    while (STOPS[i][0] < v) i++;
+    const [v0, a] = STOPS[i - 1], [v1, b] = STOPS[i], f = (v - v0) / (v1 - v0);
+    return a.map((x, k) => Math.round(x + (b[k] - x) * f));
+  }
+
+  // Peak usage of core c over time bin x of `bins` (-1 if the core is missing throughout).
+  function binMax(c, x, bins) {
+    const s0 = Math.floor(x * NS / bins), s1 = Math.max(Math.floor((x + 1) * NS / bins), s0 + 1);
+    let m = -1;
+    for (let s = s0; s < s1; s++) {
+      const v = pct('usage', s, c);
+      if (v !== 65535 && v > m) m = v;
+    }
+    return m;
+  }
+
+  function spark(c) {
+    const cv = el('canvas', {class: 'spark', width: 120, height: 20}), g = cv.getContext('2d');
+    const bins = Math.min(NS, 120);
+    g.strokeStyle = '#4fc3f7';
+    g.beginPath();
+    for (let x = 0; x < bins; x++) {
+      const m = Math.max(binMax(c, x, bins), 0);
+      const y = 19 - m / 1000 * 18, px = bins > 1 ? x * 119 / (bins - 1) : 60;
+      x ? g.lineTo(px, y) : g.moveTo(px, y);
+    }
+    g.stroke();
+    g.fillStyle = '#ffb74d';
+    g.fillRect(NS > 1 ? cur * 119 / (NS - 1) - 1 : 59, 0, 2, 20);
+    return cv;
+  }
+
+  function cell(col, s, c) {
+    const i = s * NC + c, lab = D.labels[i], td = el('td');
+    if (lab === '-') { td.textContent = '—'; return td; }
+    if (col === 'Trend') td.appendChild(spark(c));
+    else if (col === 'Bar') {
+      const bar = el('div', {class: 'bar'});
+      bar.appendChild(el('div', {class: 'bar-fill ' + CLS[lab], style: 'width:' + D.usage[i] / 10 + '%'}));
+      td.appendChild(bar);
+    } else if (col === 'Usage') td.textContent = (D.usage[i] / 10).toFixed(1) + '%';
+    else if (BD[col]) { td.className = 'breakdown'; td.textContent = (D[BD[col]][i] / 10).toFixed(1) + '%'; }
+    else if (col === 'Process') td.appendChild(el('span', {class: 'process-name'}, D.names[D.proc[i]] || '—'));
+    else if (col === 'Parent') td.appendChild(el('span', {class: 'parent-name'}, D.names[D.parent[i]] || '—'));
+    else if (col === 'Core') td.appendChild(el('code', {}, 'CPU' + D.cores[c]));
+    return td;
+  }
+
+  function table(cols, from, to) {
+    const tb = el('table'), hr = el('tr'), body = el('tbody');
+    cols.forEach(c => hr.appendChild(el('th', {}, c === 'Trend' ? '' : c)));
+    tb.appendChild(el('thead')).appendChild(hr);
+    for (let c = from; c < to; c++) {
+      const tr = el('tr');
+      cols.forEach(col => tr.appendChild(cell(col, cur, c)));
+      body.appendChild(tr);
+    }
+    tb.appendChild(body);
+    return tb;
+  }
+
+  function render() {
+    const counts = {H: 0, W: 0, C: 0};
+    for (let c = 0; c < NC; c++) counts[D.labels[cur * NC + c]]++;
+    label.textContent = '#' + D.it[cur] + '  ' + hhmmss(t[cur]);
+    slider.value = cur;
+    summary.textContent = '';
+    [['hot', counts.H + ' Hot'], ['warm', counts.W + ' Warm'], ['cold', counts.C + ' Cold']].forEach(([k, txt]) => {
+      const d = el('div', {class: 'summary-item'});
+      d.appendChild(el('span', {class: 'dot ' + k}));
+      d.appendChild(document.createTextNode(txt));
+      summary.appendChild(d);
+    });
+    [D.physical + ' Physical CPU(s)', D.physicalCores + ' Physical Cores', NC + ' Logical Cores',
+     'HT: ' + (D.ht ? 'Enabled' : 'Disabled')].forEach(txt => summary.appendChild(el('div', {class: 'summary-item'}, txt)));
+    tables.textContent = '';
+    if (D.ht) {
+      const half = Math.ceil(NC / 2);
+      tables.className = 'two-column';
+      tables.appendChild(table(D.cols, 0, half));
+      tables.appendChild(table(D.cols.slice().reverse(), half, NC));
+    } else tables.appendChild(table(D.cols, 0, NC));
+  }
+
+  function drawHeat() {
+    const W = Math.min(NS, 2000), cv = heat, g = cv.getContext('2d');
+    cv.width = W; cv.height = NC;
+    cv.style.height = Math.max(NC * 4, 60) + 'px';
+    const img = g.createImageData(W, NC);
+    for (let x = 0; x < W; x++) {
+      for (let c = 0; c < NC; c++) {
+        const [r, gr, b] = heatColor(binMax(c, x, W)), o = (c * W + x) * 4;
+        img.data[o] = r; img.data[o + 1] = gr; img.data[o + 2] = b; img.data[o + 3] = 255;
+      }
+    }
+    g.putImageData(img, 0, 0);
+    heatDrawn = true;
+  }
+
+  const ctl = el('div', {class: 'controls'});
+  const prev = el('button', {class: 'tab-btn'}, '◀'), next = el('button', {class: 'tab-btn'}, '▶');
+  const slider = el('input', {type: 'range', min: 0, max: NS - 1, value: 0});
+  const label = el('span', {class: 'timestamp'});
+  [prev, slider, next, label].forEach(e => ctl.appendChild(e));
+  const details = el('details'), heat = el('canvas', {class: 'heatmap', title: 'cores (rows) × time (columns); click to select'});
+  details.appendChild(el('summary', {}, 'Core × time heatmap'));
+  details.appendChild(heat);
+  const summary = el('div', {class: 'summary'}), tables = el('div');
+  if (NS > 1) {
+    root.appendChild(el('h2', {}, 'Live Monitoring Results ')).appendChild(
+      el('span', {class: 'iteration-badge'}, NS + ' Snapshots'));
+    root.appendChild(ctl);
+    root.appendChild(details);
+  }
+  [el('h3', {}, 'CPU Topology'), summary, tables].forEach(e => root.appendChild(e));
+
+  const go = s => { cur = Math.max(0, Math.min(NS - 1, s)); render(); };
+  prev.onclick = () => go(cur - 1);
+  next.onclick = () => go(cur + 1);
+  slider.oninput = () => go(+slider.value);
+  document.addEventListener('keydown', e => {
+    if (e.key === 'ArrowLeft') go(cur - 1);
+    if (e.key === 'ArrowRight') go(cur + 1);
+  });
+  details.ontoggle = () => { if (details.open && !heatDrawn) drawHeat(); };
+  heat.onclick = e => go(Math.floor(e.offsetX / heat.clientWidth * NS));
+  render();
+})();
+"""
+
+@profiled("export.html")
 def export_to_html(
     sysinfo: SystemInfo,
     topology: dict[int, CPUTopology],
@@ -1193,11 +2853,98 @@ def export_to_html(
     filename: str = "tidycpu_report.html",
     snapshots: Optional[list[Snapshot]] = None,
     ignore_cols: Optional[list[str]] = None,
+    breakdown: bool = False,
+    html_mode: str = "tables",
 ):
-    """Export current state to HTML file with styling."""
+    """
+    Export current state to HTML file with styling. Sections are written to
+    the file as they are rendered, so memory stays flat however many
+    snapshots the report holds (snapshots may be a capture reader).
+
+    html_mode "tables" writes one topology table per snapshot; "data" embeds
+    the snapshots once as columnar JSON and renders them in the browser.
+    """
+    write = _write_html_data_report if html_mode == "data" else _write_html_report
+    with open(filename, 'w') as f:
+        write(f.write, sysinfo, topology, core_stats, snapshots, ignore_cols, breakdown)
+    return filename
+
+def _naive_seconds(timestamp: str) -> int:
+    """Snapshot wall-clock time as seconds, shown in the browser via UTC getters (no TZ shift)."""
+    dt = datetime.strptime(timestamp, "%Y-%m-%d %H:%M:%S")
+    return int((dt - datetime(1970, 1, 1)).total_seconds())
+
+def _write_html_data_report(w, sysinfo, topology, core_stats, snapshots, ignore_cols, breakdown):
+    """
+    --html-mode data: the snapshot series as compact columnar JSON (one flat
+    array per field, snapshot-major, percentages in tenths, names interned),
+    rendered by an inline script into the selected snapshot's table, a
+    core × time heatmap and per-core sparklines. No external resources.
+    """
+    _write_html_head(w, sysinfo)
+    vis_left, _ = _visible_cols(ignore_cols, breakdown)
+    if "trend" not in {c.lower() for c in (ignore_cols or [])}:
+        vis_left = ["Trend"] + vis_left
+
+    by_physical = {}
+    for topo in topology.values():
+        by_physical.setdefault(topo.physical_id, []).append(topo)
+    physical_cores = sum(len(set(t.core_id for t in v)) for v in by_physical.values())
+
+    if not snapshots:
+        snapshots = [Snapshot(timestamp=datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                              iteration=1, core_stats=core_stats, processes=[])]
+
+    fields = ["usage"] + [_BREAKDOWN_COLS[c] for c in vis_left if c in _BREAKDOWN_COLS]
+    want_names = [f for f, col in (("proc", "Process"), ("parent", "Parent")) if col in vis_left]
+    cores: Optional[list[int]] = None
+    iters, secs = array("I"), array("q")
+    values = {f: array("H") for f in fields}
+    labels = bytearray()
+    name_ids = {f: array("I") for f in want_names}
+    names: dict[str, int] = {}
+    for snap in snapshots:
+        stats = {cs.core_id: cs for cs in snap.core_stats}
+        if cores is None:
+            cores = sorted(stats)
+        iters.append(snap.iteration)
+        secs.append(_naive_seconds(snap.timestamp))
+        for cid in cores:
+            cs = stats.get(cid)
+            for f in fields:
+                values[f].append(0xFFFF if cs is None else min(int(round(getattr(cs, f) * 10)), 0xFFFE))
+            labels += b"-" if cs is None else cs.label[:1].encode()
+            for f in want_names:
+                name = "" if cs is None else (cs.top_proc if f == "proc" else cs.top_parent)
+                name_ids[f].append(names.setdefault(name, len(names)))
+
+    def arr(a) -> str:
+        return "[" + ",".join(map(str, a)) + "]"
+
+    w('        <div class="section" id="tidy-report"></div>\n')
+    w('<script type="application/json" id="tidy-data">{')
+    w(f'"cols":{json.dumps(vis_left)},"cores":{arr(cores)},"ht":{json.dumps(len(cores) > physical_cores)},')
+    w(f'"physical":{len(by_physical)},"physicalCores":{physical_cores},')
+    w(f'"it":{arr(iters)},"t0":{secs[0]},')
+    w('"dt":' + arr(b - a for a, b in zip(secs, secs[1:])) + ",")
+    w(f'"labels":"{labels.decode()}",')
+    for f in fields:
+        w(f'"{f}":{arr(values[f])},')
+    for f in want_names:
+        w(f'"{f}":{arr(name_ids[f])},')
+    w('"names":' + json.dumps(list(names), separators=(",", ":")).replace("</", "<\\/"))
+    w("}</script>\n<script>" + _HTML_DATA_SCRIPT + "</script>\n")
+    w("""
+    </div>
+</body>
+</html>
+""")
+
+def _write_html_head(w, sysinfo: SystemInfo):
+    """Document head, styles and the System Information section shared by both HTML modes."""
     timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    
-    html = f"""<!DOCTYPE html>
+
+    w(f"""<!DOCTYPE html>
 <html>
 <head>
     <meta charset="UTF-8">
@@ -1251,6 +2998,7 @@ def export_to_html(
         }}
         .process-name {{ color: #ce9178; font-style: italic; }}
         .parent-name  {{ color: #c586c0; font-style: italic; }}
+        .breakdown    {{ color: #dcdcaa; }}
         .tabs {{ display: flex; flex-wrap: wrap; gap: 6px; margin-bottom: 16px; }}
         .tab-btn {{
             background: #2d2d30; color: #9cdcfe; border: 1px solid #3e3e42;
@@ -1261,16 +3009,21 @@ def export_to_html(
         .tab-btn.active {{ background: #ffb74d; color: #1e1e1e; border-color: #ffb74d; font-weight: bold; }}
         .tab-panel {{ display: none; }}
         .tab-panel.active {{ display: block; }}
+        .controls {{ display: flex; align-items: center; gap: 10px; margin: 10px 0; }}
+        .controls input[type=range] {{ flex: 1; }}
+        .heatmap {{ width: 100%; image-rendering: pixelated; cursor: crosshair; background: #1e1e1e; }}
+        .spark {{ width: 120px; height: 20px; vertical-align: middle; }}
+        summary {{ cursor: pointer; color: #ffb74d; margin: 10px 0; }}
     </style>
 </head>
 <body>
     <div class="container">
         <h1>TidyCPU — CPU Affinity Optimization Report</h1>
         <p class="timestamp">Generated: {timestamp}</p>
-"""
-    
+""")
+
     # System Information
-    html += """
+    w("""
         <div class="section">
             <h2>System Information</h2>
             <div class="info-grid">
@@ -1280,26 +3033,32 @@ def export_to_html(
                 <div>{}</div>
                 <div class="label">Available Memory:</div>
                 <div>{}</div>
-""".format(sysinfo.cpu_model, sysinfo.total_memory, sysinfo.available_memory)
-    
+""".format(sysinfo.cpu_model, sysinfo.total_memory, sysinfo.available_memory))
+
     if sysinfo.cpu_freq_cur:
-        html += f"""
+        w(f"""
                 <div class="label">CPU Frequency:</div>
                 <div>{sysinfo.cpu_freq_min:.0f} MHz - {sysinfo.cpu_freq_max:.0f} MHz (Current: {sysinfo.cpu_freq_cur:.0f} MHz)</div>
-"""
-    
-    html += f"""
+""")
+
+    w(f"""
                 <div class="label">Kernel Cmdline:</div>
                 <div style="word-break: break-all;">{sysinfo.kernel_cmdline}</div>
             </div>
         </div>
-"""
-    
-    def render_topology_section(core_stats_data, title_suffix=""):
-        ignored = {c.lower() for c in (ignore_cols or [])}
-        vis_left  = [c for c in _LEFT_ORDER  if c.lower() not in ignored]
-        vis_right = [c for c in _RIGHT_ORDER if c.lower() not in ignored]
+""")
+
+def _write_html_report(w, sysinfo, topology, core_stats, snapshots, ignore_cols, breakdown):
+    _write_html_head(w, sysinfo)
+    vis_left, vis_right = _visible_cols(ignore_cols, breakdown)
+
+    by_physical = {}
+    for _lid, topo in topology.items():
+        by_physical.setdefault(topo.physical_id, []).append(topo)
+    total_physical = len(by_physical)
+    total_physical_cores = sum(len(set(t.core_id for t in v)) for v in by_physical.values())
 
+    def write_topology_section(core_stats_data, title_suffix=""):
         stats_map = {cs.core_id: cs for cs in core_stats_data}
         total_cores = len(stats_map)
         left_count = (total_cores + 1) // 2
@@ -1307,16 +3066,9 @@ def export_to_html(
         hot_count  = sum(1 for c in core_stats_data if c.label == "HOT")
         warm_count = sum(1 for c in core_stats_data if c.label == "WARM")
         cold_count = sum(1 for c in core_stats_data if c.label == "COLD")
-
-        by_physical = {}
-        for _lid, topo in topology.items():
-            by_physical.setdefault(topo.physical_id, []).append(topo)
-
-        total_physical = len(by_physical)
-        total_physical_cores = sum(len(set(t.core_id for t in v)) for v in by_physical.values())
         ht_enabled = total_cores > total_physical_cores
 
-        s = f"""
+        w(f"""
             <h3>CPU Topology{title_suffix}</h3>
             <div class="summary">
                 <div class="summary-item"><span class="dot hot"></span>{hot_count} Hot</div>
@@ -1327,7 +3079,7 @@ def export_to_html(
                 <div class="summary-item">{total_cores} Logical Cores</div>
                 <div class="summary-item">HT: {'Enabled' if ht_enabled else 'Disabled'}</div>
             </div>
-"""
+""")
         def _cell(col, cs):
             lc = cs.label.lower()
             if col == "Bar":
@@ -1335,6 +3087,8 @@ def export_to_html(
                         f" style=\"width:{cs.usage:.1f}%\"></div></div></td>")
             if col == "Usage":
                 return f"<td>{cs.usage:.1f}%</td>"
+            if col in _BREAKDOWN_COLS:
+                return f"<td class=\"breakdown\">{getattr(cs, _BREAKDOWN_COLS[col]):.1f}%</td>"
             if col == "Process":
                 return f"<td><span class=\"process-name\">{cs.top_proc or '&#8212;'}</span></td>"
             if col == "Parent":
@@ -1352,46 +3106,49 @@ def export_to_html(
                     + "</tr></thead>")
 
         if ht_enabled:
-            s += '            <div class="two-column">\n'
-            s += f"                <table>{_hdr(vis_left)}<tbody>\n"
+            w('            <div class="two-column">\n')
+            w(f"                <table>{_hdr(vis_left)}<tbody>\n")
             for i in range(left_count):
                 if i in stats_map:
-                    s += "                    " + _row(stats_map[i], vis_left)
-            s += "                </tbody></table>\n"
-            s += f"                <table>{_hdr(vis_right)}<tbody>\n"
+                    w("                    " + _row(stats_map[i], vis_left))
+            w("                </tbody></table>\n")
+            w(f"                <table>{_hdr(vis_right)}<tbody>\n")
             for i in range(left_count, total_cores):
                 if i in stats_map:
-                    s += "                    " + _row(stats_map[i], vis_right)
-            s += "                </tbody></table>\n"
-            s += "            </div>\n"
+                    w("                    " + _row(stats_map[i], vis_right))
+            w("                </tbody></table>\n")
+            w("            </div>\n")
         else:
-            s += f"            <table>{_hdr(vis_left)}<tbody>\n"
+            w(f"            <table>{_hdr(vis_left)}<tbody>\n")
             for i in range(total_cores):
                 if i in stats_map:
-                    s += "                " + _row(stats_map[i], vis_left)
-            s += "            </tbody></table>\n"
+                    w("                " + _row(stats_map[i], vis_left))
+            w("            </tbody></table>\n")
 
-        return s
-    
     if snapshots:
-        html += f"""
+        w(f"""
         <div class="section">
             <h2>Live Monitoring Results <span class="iteration-badge">{len(snapshots)} Snapshots</span></h2>
             <div class="tabs">
-"""
-        for snap in snapshots:
-            active = 'active' if snap.iteration == 1 else ''
+""")
+        first = None
+        for snap in snapshots:   # two passes: buttons, then panels
+            if first is None:
+                first = snap.iteration
+            active = 'active' if snap.iteration == first else ''
             ts = snap.timestamp.split()[1]
-            html += f'                <button class="tab-btn {active}" onclick="showTab({snap.iteration})" id="btn-{snap.iteration}">#{snap.iteration} &nbsp;<span style="color:#858585;font-size:11px">{ts}</span></button>\n'
-        html += "            </div>\n"
+            w(f'                <button class="tab-btn {active}" onclick="showTab({snap.iteration})" id="btn-{snap.iteration}">#{snap.iteration} &nbsp;<span style="color:#858585;font-size:11px">{ts}</span></button>\n')
+        w("            </div>\n")
         for snap in snapshots:
-            active = 'active' if snap.iteration == 1 else ''
-            html += f"""
+            active = 'active' if snap.iteration == first else ''
+            w(f"""
             <div class="tab-panel {active}" id="panel-{snap.iteration}">
-                {render_topology_section(snap.core_stats)}
+                """)
+            write_topology_section(snap.core_stats)
+            w("""
             </div>
-"""
-        html += """
+""")
+        w("""
 <script>
             function showTab(n) {{
                 document.querySelectorAll('.tab-panel').forEach(p => p.classList.remove('active'));
@@ -1401,25 +3158,23 @@ def export_to_html(
             }}
             </script>
         </div>
-"""
+""")
     else:
-        html += f"""
+        w("""
         <div class="section">
-            {render_topology_section(core_stats)}
+            """)
+        write_topology_section(core_stats)
+        w("""
         </div>
-"""
-    
-    html += """
+""")
+
+    w("""
     </div>
 </body>
 </html>
-"""
-    
-    with open(filename, 'w') as f:
-        f.write(html)
-    
-    return filename
+""")
 
+@profiled("export.text")
 def export_to_text(
     sysinfo: SystemInfo,
     topology: dict[int, CPUTopology],
@@ -1428,6 +3183,7 @@ def export_to_text(
     filename: str = "tidycpu_report.txt",
     snapshots: Optional[list[Snapshot]] = None,
     ignore_cols: Optional[list[str]] = None,
+    breakdown: bool = False,
 ):
     """Export current state to text file."""
     timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
@@ -1453,9 +3209,7 @@ def export_to_text(
     output.append("")
     
     def render_topology(core_stats_data, title_suffix=""):
-        ignored = {c.lower() for c in (ignore_cols or [])}
-        vis_left  = [c for c in _LEFT_ORDER  if c.lower() not in ignored]
-        vis_right = [c for c in _RIGHT_ORDER if c.lower() not in ignored]
+        vis_left, vis_right = _visible_cols(ignore_cols, breakdown)
 
         stats_map = {cs.core_id: cs for cs in core_stats_data}
         total_cores = len(stats_map)
@@ -1487,6 +3241,8 @@ def export_to_text(
                 return _bar(cs.usage)
             if col == "Usage":
                 return f"{cs.usage:>{w-1}.1f}%"
+            if col in _BREAKDOWN_COLS:
+                return f"{getattr(cs, _BREAKDOWN_COLS[col]):>{w-1}.1f}%"
             if col == "Process":
                 t = (cs.top_proc or "—")[:w]
                 return f"{t:>{w}}" if is_right else f"{t:<{w}}"
@@ -1503,7 +3259,7 @@ def export_to_text(
 
         def _hdr(cols, is_right=False):
             return "  ".join(
-                f"{c:>{W[c]}}" if (is_right and c not in ("Bar", "Usage")) else f"{c:<{W[c]}}"
+                f"{c:>{W[c]}}" if (is_right and c not in ("Bar", "Usage", *_BREAKDOWN_COLS)) else f"{c:<{W[c]}}"
                 for c in cols
             )
 
@@ -1555,6 +3311,187 @@ def export_to_text(
     
     return filename
 
+# Row limit of an .xlsx sheet; the streamed Snapshots sheet continues on a new one.
+EXCEL_MAX_ROWS = 1_048_576
+# --excel-mode auto switches to the streamed layout above this many snapshots.
+EXCEL_SHEETS_MAX = 50
+
+def _export_excel_stream(openpyxl, sysinfo: SystemInfo, topology: dict[int, CPUTopology],
+                         core_stats: list[CoreStat], processes: list[ProcessInfo], filename: str,
+                         snapshots, ignore_cols: Optional[list[str]], stack_procs: bool,
+                         breakdown: bool, max_rows: int = EXCEL_MAX_ROWS):
+    """
+    Write-only fast path of export_to_excel() for long runs. All snapshots go
+    into one long-format "Snapshots" sheet (a row per snapshot and core, or
+    per stacked process with stack_procs) that is streamed to disk as rows
+    are produced and continued on a new sheet every max_rows rows. Cells use
+    a handful of named styles instead of per-cell style objects, and column
+    widths come from running maxima of the values written so far.
+    """
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Font, PatternFill, Alignment, Border, Side, NamedStyle
+    from openpyxl.utils import get_column_letter
+    from openpyxl.formatting.rule import DataBarRule
+
+    wb = openpyxl.Workbook(write_only=True)
+    side = Side(style="thin", color="CCCCCC")
+    border = Border(left=side, right=side, top=side, bottom=side)
+
+    def _style(name, fill=None, font=None, center=False, number_format=None):
+        st = NamedStyle(name=name)
+        st.border = border
+        if fill:
+            st.fill = PatternFill("solid", fgColor=fill)
+        if font:
+            st.font = font
+        if center:
+            st.alignment = Alignment(horizontal="center", vertical="center")
+        if number_format:
+            st.number_format = number_format
+        wb.add_named_style(st)
+        return name
+
+    S_HEADER = _style("tidy_header", "1E3A5F", Font(color="FFFFFF", bold=True), center=True)
+    S_TITLE  = _style("tidy_title", font=Font(color="1E3A5F", bold=True, size=14))
+    S_PROP   = _style("tidy_prop", font=Font(bold=True))
+    S_LABEL  = {lab: _style(f"tidy_{lab.lower()}", fill, Font(color="FFFFFF", bold=True), center=True)
+                for lab, fill in (("HOT", "F44336"), ("WARM", "FF9800"), ("COLD", "4CAF50"))}
+    S_TIME   = _style("tidy_time", number_format="yyyy-mm-dd hh:mm:ss")
+
+    def _cell(ws, value, style):
+        c = WriteOnlyCell(ws, value=value)
+        c.style = style
+        return c
+
+    # ── System Info ───────────────────────────────────────────────────────────
+    by_physical: dict = {}
+    for topo in topology.values():
+        by_physical.setdefault(topo.physical_id, []).append(topo)
+    physical_cores = sum(len(set(t.core_id for t in v)) for v in by_physical.values())
+
+    ws_info = wb.create_sheet("System Info")
+    ws_info.column_dimensions["A"].width = 24
+    ws_info.column_dimensions["B"].width = 62
+    ws_info.append([_cell(ws_info, "TidyCPU — CPU Affinity Optimization Report", S_TITLE)])
+    ws_info.append([f"Generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}"])
+    ws_info.append([])
+    ws_info.append([_cell(ws_info, "Property", S_HEADER), _cell(ws_info, "Value", S_HEADER)])
+    info_rows = [
+        ("CPU Model",         sysinfo.cpu_model),
+        ("Total Memory",      sysinfo.total_memory),
+        ("Available Memory",  sysinfo.available_memory),
+        ("Kernel Cmdline",    sysinfo.kernel_cmdline),
+        ("Physical CPU(s)",   len(by_physical)),
+        ("Physical Core(s)",  physical_cores),
+        ("Logical Core(s)",   len(topology)),
+        ("Hyperthreading",    "Enabled" if len(topology) > physical_cores else "Disabled"),
+    ]
+    if sysinfo.cpu_freq_cur is not None:
+        info_rows.append(("CPU Freq Current", f"{sysinfo.cpu_freq_cur:.0f} MHz"))
+    for prop, val in info_rows:
+        ws_info.append([_cell(ws_info, prop, S_PROP), str(val)])
+
+    # ── Snapshots (streamed) ──────────────────────────────────────────────────
+    ignored = {c.lower() for c in (ignore_cols or [])}
+    bd_cols = list(_BREAKDOWN_COLS) if breakdown else []
+    cols = [c for c in ["Core", "Usage", *bd_cols, "Process", "Parent"] if c.lower() not in ignored]
+    headers = ["Snapshot", "Time", "Label"] + [f"{c} (%)" if c == "Usage" or c in _BREAKDOWN_COLS
+                                               else c for c in cols]
+    if stack_procs:
+        headers.append("Process CPU (%)")
+    usage_col = headers.index("Usage (%)") + 1 if "Usage" in cols and "bar" not in ignored else None
+    widths = [len(h) for h in headers]
+
+    if not snapshots:
+        snapshots = [Snapshot(timestamp=datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                              iteration=1, core_stats=core_stats, processes=[])]
+
+    def _rows():
+        """(values, label) per output row, in snapshot → core → process order."""
+        for snap in snapshots:
+            when = datetime.strptime(snap.timestamp, "%Y-%m-%d %H:%M:%S")
+            for cs in sorted(snap.core_stats, key=lambda x: x.core_id):
+                core = []
+                for c in cols:
+                    if c == "Core":
+                        core.append(f"CPU{cs.core_id}")
+                    elif c == "Usage":
+                        core.append(round(cs.usage, 1))
+                    elif c in _BREAKDOWN_COLS:
+                        core.append(round(getattr(cs, _BREAKDOWN_COLS[c]), 1))
+                    elif c == "Process":
+                        core.append(cs.top_proc or "—")
+                    else:
+                        core.append(cs.top_parent or "—")
+                if not stack_procs:
+                    yield [snap.iteration, when, cs.label] + core, cs.label
+                    continue
+                for name, parent, pct in cs.all_procs or [(cs.top_proc, cs.top_parent, cs.usage)]:
+                    row = [snap.iteration, when, cs.label] + core + [round(pct, 1)]
+                    if "Process" in cols:
+                        row[3 + cols.index("Process")] = name or "—"
+                    if "Parent" in cols:
+                        row[3 + cols.index("Parent")] = parent or "—"
+                    yield row, cs.label
+
+    def _track(values):
+        for i, v in enumerate(values):
+            if i != 1 and v is not None:   # Time is fixed-width
+                n = len(str(v))
+                if n > widths[i]:
+                    widths[i] = n
+
+    def _finish(ws, last_row: int):
+        if usage_col and last_row > 1:
+            letter = get_column_letter(usage_col)
+            ws.conditional_formatting.add(
+                f"{letter}2:{letter}{last_row}",
+                DataBarRule(start_type="num", start_value=0, end_type="num", end_value=100,
+                            color="4472C4"))
+
+    # Write-only sheets emit column widths before their first row, so the
+    # first sheet is sized from a short lookahead and later ones from the
+    # maxima seen up to the split.
+    rows = _rows()
+    lookahead = list(itertools.islice(rows, 1000))
+    for values, _ in lookahead:
+        _track(values)
+
+    ws, ws_rows, n_sheets = None, 0, 0
+    for values, label in itertools.chain(lookahead, rows):
+        if ws is None or ws_rows >= max_rows:
+            if ws is not None:
+                _finish(ws, ws_rows)
+            n_sheets += 1
+            ws = wb.create_sheet("Snapshots" if n_sheets == 1 else f"Snapshots ({n_sheets})")
+            ws.freeze_panes = "A2"
+            for i, w in enumerate(widths, 1):
+                ws.column_dimensions[get_column_letter(i)].width = min(max(w + 4, 10), 55)
+            ws.append([_cell(ws, h, S_HEADER) for h in headers])
+            ws_rows = 1
+        _track(values)
+        ws.append([values[0], _cell(ws, values[1], S_TIME),
+                   _cell(ws, label, S_LABEL.get(label, S_PROP))] + values[3:])
+        ws_rows += 1
+    if ws is not None:
+        _finish(ws, ws_rows)
+
+    # ── Processes ─────────────────────────────────────────────────────────────
+    if processes:
+        ws_proc = wb.create_sheet("Processes")
+        for letter, w in zip("ABCDE", (10, 24, 10, 24, 20)):
+            ws_proc.column_dimensions[letter].width = w
+        ws_proc.append([_cell(ws_proc, h, S_HEADER)
+                        for h in ["PID", "Name", "CPU (%)", "Cores", "Affinity Mask"]])
+        for proc in processes:
+            ws_proc.append([proc.pid, proc.name, round(proc.cpu_percent, 1),
+                            ", ".join(map(str, proc.current_cores)) if proc.current_cores else "all",
+                            proc.affinity_mask])
+
+    wb.save(filename)
+    return filename
+
+@profiled("export.excel")
 def export_to_excel(
     sysinfo: SystemInfo,
     topology: dict[int, CPUTopology],
@@ -1564,8 +3501,16 @@ def export_to_excel(
     snapshots: Optional[list[Snapshot]] = None,
     ignore_cols: Optional[list[str]] = None,
     stack_procs: bool = False,
+    breakdown: bool = False,
+    excel_mode: str = "auto",
 ):
-    """Export report to an Excel (.xlsx) file using openpyxl."""
+    """
+    Export report to an Excel (.xlsx) file using openpyxl.
+
+    excel_mode "sheets" writes a formatted topology sheet per snapshot;
+    "stream" uses the write-only fast path (_export_excel_stream); "auto"
+    streams when there are more than EXCEL_SHEETS_MAX snapshots.
+    """
     try:
         import openpyxl
         from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
@@ -1577,6 +3522,11 @@ def export_to_excel(
             "Install it with:  pip install openpyxl"
         )
 
+    if excel_mode == "stream" or (excel_mode == "auto" and snapshots
+                                  and len(snapshots) > EXCEL_SHEETS_MAX):
+        return _export_excel_stream(openpyxl, sysinfo, topology, core_stats, processes, filename,
+                                    snapshots, ignore_cols, stack_procs, breakdown)
+
     timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
 
     # ── Colour helpers ───────────────────────────────────────────────────────
@@ -1697,6 +3647,9 @@ def export_to_excel(
             "Process": ("Process",   lambda cs: cs.top_proc or "—", "process"),
             "Parent":  ("Parent",    lambda cs: cs.top_parent or "—", "parent"),
         }
+        for bd_name, attr in _BREAKDOWN_COLS.items():
+            COL_META[bd_name] = (f"{bd_name} (%)", lambda cs, a=attr: getattr(cs, a), "usage")
+        bd_cols = list(_BREAKDOWN_COLS) if breakdown else []
 
         def _apply_cell_style(cell, kind: str, cs: CoreStat, row_idx: int):
             cell.border = _border()
@@ -1755,6 +3708,22 @@ def export_to_excel(
             cell = ws.cell(row=row_start, column=col, value=f"CPU{cs.core_id}")
             _apply_cell_style(cell, "core", cs, row_start)
 
+        def _write_breakdown_cells(row_start: int, row_end: int, first_col: int,
+                                   col_names: list[str], cs: Optional[CoreStat], fill_alt: bool):
+            """Write (and vertically merge) the per-core breakdown cells of one side."""
+            for col, name in enumerate(col_names, first_col):
+                if name not in _BREAKDOWN_COLS:
+                    continue
+                if row_end > row_start:
+                    ws.merge_cells(start_row=row_start, start_column=col,
+                                   end_row=row_end, end_column=col)
+                val = getattr(cs, _BREAKDOWN_COLS[name]) if cs is not None else ""
+                cell = ws.cell(row=row_start, column=col, value=val)
+                cell.border = _border()
+                cell.alignment = _center()
+                if fill_alt:
+                    cell.fill = FILL_ALT_ROW
+
         if ht_enabled:
             # Dual-column HT layout with Core columns meeting in the centre.
             # Left:  Usage(%) | Process | Parent | Core
@@ -1762,8 +3731,8 @@ def export_to_excel(
             # When a core has multiple processes (all_procs populated via --stack-procs),
             # the Core cell is merged vertically across all its process rows so both
             # halves of each HT pair remain visually aligned.
-            LEFT_ORDER  = ["Usage", "Process", "Parent", "Core"]
-            RIGHT_ORDER = ["Core", "Parent", "Process", "Usage"]
+            LEFT_ORDER  = ["Usage", *bd_cols, "Process", "Parent", "Core"]
+            RIGHT_ORDER = LEFT_ORDER[::-1]
             left_cols  = [c for c in LEFT_ORDER  if c.lower() not in ignored]
             right_cols = [c for c in RIGHT_ORDER if c.lower() not in ignored]
             all_col_names = left_cols + right_cols
@@ -1806,6 +3775,9 @@ def export_to_excel(
                             cell = ws.cell(row=r, column=right_core_col, value="")
                             cell.border = _border()
                             cell.alignment = _center()
+                _write_breakdown_cells(current_row, end_row, 1, left_cols, cs_l, alt)
+                _write_breakdown_cells(current_row, end_row, len(left_cols) + 1,
+                                       right_cols, cs_r, alt)
 
                 # Write per-process data rows for this pair
                 for sub_idx in range(span):
@@ -1815,11 +3787,11 @@ def export_to_excel(
                     entry_r = procs_r[sub_idx] if sub_idx < len(procs_r) else None
 
                     for name in left_cols:
-                        if name != "Core":
+                        if name != "Core" and name not in _BREAKDOWN_COLS:
                             _write_proc_cell(row, col, name, entry_l, alt)
                         col += 1
                     for name in right_cols:
-                        if name != "Core":
+                        if name != "Core" and name not in _BREAKDOWN_COLS:
                             _write_proc_cell(row, col, name,
                                              entry_r if cs_r else None, alt)
                         col += 1
@@ -1831,7 +3803,7 @@ def export_to_excel(
 
         elif stack_procs:
             # Stacked single-column layout with Core cells merged vertically per core.
-            FLAT_ORDER = ["Core", "Usage", "Process", "Parent"]
+            FLAT_ORDER = ["Core", "Usage", *bd_cols, "Process", "Parent"]
             flat_cols  = [c for c in FLAT_ORDER if c.lower() not in ignored]
             core_col_idx = next((i for i, n in enumerate(flat_cols, 1) if n == "Core"), None)
 
@@ -1846,13 +3818,14 @@ def export_to_excel(
 
                 if core_col_idx is not None:
                     _write_core_cell(current_row, end_row, core_col_idx, cs)
+                _write_breakdown_cells(current_row, end_row, 1, flat_cols, cs, alt)
 
                 for sub_idx in range(span):
                     row   = current_row + sub_idx
                     col   = 1
                     entry = procs[sub_idx] if sub_idx < len(procs) else None
                     for name in flat_cols:
-                        if name != "Core":
+                        if name != "Core" and name not in _BREAKDOWN_COLS:
                             _write_proc_cell(row, col, name, entry, alt)
                         col += 1
 
@@ -1863,7 +3836,7 @@ def export_to_excel(
 
         else:
             # Single-column layout for non-HT systems (one row per core).
-            SINGLE_ORDER = ["Core", "Usage", "Process", "Parent"]
+            SINGLE_ORDER = ["Core", "Usage", *bd_cols, "Process", "Parent"]
             col_names = [c for c in SINGLE_ORDER if c.lower() not in ignored]
 
             _set_header_row(ws, 1, [COL_META[c][0] for c in col_names])
@@ -1912,6 +3885,534 @@ def export_to_excel(
 
 
 # ─────────────────────────────────────────────
+# Time-Series Export (--export-cores / --export-threads)
+# ─────────────────────────────────────────────
+_SERIES_KEYS = ("timestamp", "epoch", "iteration")
+CORE_SERIES_FIELDS = _SERIES_KEYS + (
+    "core", "physical_id", "core_within_physical", "label", "usage",
+    *(name for name, _ in BREAKDOWN_FIELDS), "top_proc", "top_parent")
+THREAD_SERIES_FIELDS = _SERIES_KEYS + (
+    "tid", "pid", "name", "parent", "cpu_percent", "last_cpu")
+
+class SeriesWriter:
+    """
+    Incremental writer for the machine-oriented time series. The format
+    follows the file name: *.csv (with a header row) or *.jsonl / *.ndjson
+    (one object per row), either optionally ending in .gz to compress on
+    the fly. Rows are flushed per batch, so an interrupted run keeps what
+    was written; on a write error `error` is set and further rows dropped.
+    """
+
+    def __init__(self, path: str, fields: tuple[str, ...]):
+        base = path[:-3] if path.endswith(".gz") else path
+        if base.endswith(".csv"):
+            self.fmt = "csv"
+        elif base.endswith((".jsonl", ".ndjson")):
+            self.fmt = "jsonl"
+        else:
+            raise ValueError("name it .csv or .jsonl (optionally with .gz)")
+        self.path   = path
+        self.fields = fields
+        self.rows   = 0
+        self.error  = ""
+        if path.endswith(".gz"):
+            self._f = gzip.open(path, "wt", compresslevel=6, newline="")
+        else:
+            self._f = open(path, "w", newline="")
+        if self.fmt == "csv":
+            self._csv = csv.writer(self._f)
+            self._csv.writerow(fields)
+
+    def write(self, rows):
+        if self._f is None:
+            return
+        try:
+            n = 0
+            if self.fmt == "csv":
+                for row in rows:
+                    self._csv.writerow(row)
+                    n += 1
+            else:
+                for row in rows:
+                    self._f.write(json.dumps(dict(zip(self.fields, row)), separators=(",", ":")) + "\n")
+                    n += 1
+            self._f.flush()
+            self.rows += n
+        except OSError as e:
+            self.error = e.strerror or str(e)
+            self.close()
+
+    def close(self):
+        if self._f is not None:
+            try:
+                self._f.close()
+            except OSError as e:
+                self.error = self.error or e.strerror or str(e)
+            self._f = None
+
+def core_series_rows(snap: Snapshot):
+    """One CORE_SERIES_FIELDS row per core of a snapshot."""
+    epoch = round(snap.epoch, 3)
+    for cs in snap.core_stats:
+        yield (snap.timestamp, epoch, snap.iteration, cs.core_id, cs.physical_id,
+               cs.core_within_physical, cs.label, round(cs.usage, 2),
+               *(round(getattr(cs, name), 2) for name, _ in BREAKDOWN_FIELDS),
+               cs.top_proc, cs.top_parent)
+
+def thread_series_rows(snap: Snapshot, samples: list[tuple[TaskInfo, float]]):
+    """One THREAD_SERIES_FIELDS row per (TaskInfo, CPU%) sample taken with the snapshot."""
+    epoch = round(snap.epoch, 3)
+    for t, pct in samples:
+        yield (snap.timestamp, epoch, snap.iteration, t.tid, t.pid, t.name, t.parent_name,
+               round(pct, 2), t.last_cpu)
+
+def open_series(export_cores: Optional[str], export_threads: Optional[str]):
+    """SeriesWriters for the requested streams (None where not requested); exits on a bad path."""
+    writers = []
+    for path, fields in ((export_cores, CORE_SERIES_FIELDS), (export_threads, THREAD_SERIES_FIELDS)):
+        try:
+            writers.append(SeriesWriter(path, fields) if path else None)
+        except (OSError, ValueError) as e:
+            die(f"Cannot write time series {path}: {getattr(e, 'strerror', None) or e}")
+    return writers
+
+def close_series(*writers: Optional[SeriesWriter]):
+    """Close the time-series writers and report what each one wrote."""
+    for w, what in zip(writers, ("Core", "Thread")):
+        if w is None:
+            continue
+        w.close()
+        if w.error:
+            print(f"  {C.RED}✘{C.RESET}  {what} time series stopped after {w.rows} rows ({w.error}): {w.path}\n")
+        else:
+            print(f"  {C.GREEN}✔{C.RESET}  {what} time series with {w.rows} rows written to: {C.CYAN}{w.path}{C.RESET}\n")
+
+# ─────────────────────────────────────────────
+# Offline Replay (--replay)
+# ─────────────────────────────────────────────
+_OFFSET_UNITS = {"s": 1, "m": 60, "h": 3600}
+
+def _fmt_epoch(t: float) -> str:
+    return datetime.fromtimestamp(t).strftime("%Y-%m-%d %H:%M:%S")
+
+def parse_time_bound(text: str, first: float, last: float) -> float:
+    """
+    Turn a --from/--to value into epoch seconds. Accepts an offset from the
+    start of the capture (+90, +15m), from its end (-5m), a time of day on
+    the capture's first day (14:05, 14:05:30), a full "YYYY-MM-DD HH:MM[:SS]"
+    or raw epoch seconds.
+    """
+    text = text.strip()
+    m = re.fullmatch(r"([+-])(\d+(?:\.\d+)?)([smh]?)", text)
+    if m:
+        secs = float(m.group(2)) * _OFFSET_UNITS[m.group(3) or "s"]
+        return first + secs if m.group(1) == "+" else last - secs
+    for fmt in ("%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M", "%Y-%m-%dT%H:%M:%S"):
+        try:
+            return datetime.strptime(text, fmt).timestamp()
+        except ValueError:
+            pass
+    for fmt in ("%H:%M:%S", "%H:%M"):
+        try:
+            t = datetime.strptime(text, fmt).time()
+        except ValueError:
+            continue
+        return datetime.combine(datetime.fromtimestamp(first).date(), t).timestamp()
+    try:
+        return float(text)
+    except ValueError:
+        raise ValueError(f"cannot parse time '{text}'")
+
+def replay_capture(path: str, start: Optional[str] = None, end: Optional[str] = None,
+                   export_html: Optional[str] = None, export_text: Optional[str] = None,
+                   export_excel: Optional[str] = None, ignore_cols: Optional[list[str]] = None,
+                   specify_parents: Optional[list[str]] = None, stack_procs: bool = False,
+                   breakdown: bool = False, html_mode: str = "tables",
+                   excel_mode: str = "auto", export_cores: Optional[str] = None):
+    """
+    Re-render a capture file offline, using the system info and topology
+    recorded in it. Without exports every snapshot in the range is printed
+    as the live view showed it; with exports only the reports are written.
+    Captures hold no per-thread rows, so only the core time series can be
+    exported from one.
+    """
+    try:
+        reader = open_capture(path)
+    except (OSError, ValueError) as e:
+        die(f"Cannot read capture {path}: {getattr(e, 'strerror', None) or e}")
+
+    with reader:
+        span = reader.span()
+        if span is None:
+            die(f"{path} contains no snapshots")
+        first, last = span
+        try:
+            lo = parse_time_bound(start, first, last) if start else None
+            hi = parse_time_bound(end, first, last) if end else None
+        except ValueError as e:
+            die(str(e))
+
+        snapshots = reader.between(lo, hi)
+        count = len(snapshots)
+        if not count:
+            die(f"No snapshots between {start or 'start'} and {end or 'end'} "
+                f"(capture covers {_fmt_epoch(first)} – {_fmt_epoch(last)})")
+
+        sysinfo, topology = reader.sysinfo, reader.topology
+        if sysinfo:
+            print_system_info(sysinfo)
+        print(f"\n  {C.CYAN}Replay{C.RESET} — {C.DIM}{path}: {count} of {len(reader)} snapshots, "
+              f"capture covers {_fmt_epoch(first)} – {_fmt_epoch(last)}{C.RESET}")
+
+        if export_cores:
+            core_series, _ = open_series(export_cores, None)
+            for snap in snapshots:
+                core_series.write(core_series_rows(snap))
+            print()
+            close_series(core_series)
+
+        exporting = export_html or export_text or export_excel or export_cores
+        for snap in ([] if exporting else snapshots):
+            print(f"\n  {C.CYAN}Snapshot {snap.iteration}{C.RESET} — {C.DIM}{snap.timestamp}{C.RESET}")
+            print_topology(topology, snap.core_stats, ignore_cols=ignore_cols,
+                           specify_parents=specify_parents, stack_procs=stack_procs,
+                           breakdown=breakdown)
+            for info in snap.processes:
+                print_process_details_live(info)
+        print()
+
+        if export_html or export_text or export_excel:
+            if not sysinfo:
+                die("Capture has no system info; reports cannot be exported from it")
+            export_snapshots(sysinfo, topology, snapshots.last().core_stats, snapshots,
+                             export_html=export_html, export_text=export_text,
+                             export_excel=export_excel, ignore_cols=ignore_cols,
+                             stack_procs=stack_procs, breakdown=breakdown, html_mode=html_mode,
+                             excel_mode=excel_mode)
+
+# ─────────────────────────────────────────────
+# Agent Mode (--agent / --query)
+# ─────────────────────────────────────────────
+DEFAULT_SOCKET = os.environ.get("TIDYCPU_SOCKET", "/run/tidycpu.sock")
+
+class TidyAgent:
+    """
+    Long-running sampler behind a Unix-socket query API. A background thread
+    refreshes per-core stats every interval_ms from a StatSampler and a
+    persistent TaskCache and keeps history_sec of snapshots in memory, so
+    queries are answered from memory (only `plan` reads /proc, for its PID).
+
+    Protocol: one JSON object per line in each direction.
+      {"cmd": "cores"}                   latest per-core stats and topology
+      {"cmd": "top", "n": 10}            top threads and processes, last interval
+      {"cmd": "plan", "pid": 1234}       rebalance plan for one PID (never applied)
+      {"cmd": "history", "seconds": 60}  per-core usage for that window
+      {"cmd": "info"}                    system info and agent settings
+    Replies carry "ok": true, or "ok": false with an "error" message.
+    """
+
+    def __init__(self, sysinfo: SystemInfo, topology: dict[int, CPUTopology],
+                 interval_ms: int = 1000, history_sec: int = 600,
+                 min_usage: float = 0.1, ignore_procs: Optional[list[str]] = None,
+                 scan_workers: int = 1, scan_pool: str = "thread"):
+        self.sysinfo      = sysinfo
+        self.topology     = topology
+        self.interval_ms  = interval_ms
+        self.history_sec  = history_sec
+        self.min_usage    = min_usage
+        self.ignore_procs = ignore_procs
+        self.history: deque[tuple[float, list[CoreStat]]] = deque(
+            maxlen=max(1, history_sec * 1000 // interval_ms))
+        self.core_stats: list[CoreStat] = []
+        self.tasks:      dict[int, TaskInfo] = {}
+        self.thread_pct: dict[int, float] = {}
+        self.updated = 0.0
+        self._cache   = TaskCache(workers=scan_workers, pool=scan_pool)
+        self._sampler = StatSampler(capacity=max(600, interval_ms // 100 + 10))
+        self._lock    = threading.Lock()
+        self._ready   = threading.Event()
+        self._stop    = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> "TidyAgent":
+        self._sampler.start()
+        self._thread = threading.Thread(target=self._run, name="tidycpu-agent", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self._sampler.stop()
+        self._cache.close()
+
+    def _run(self):
+        prev: Optional[tuple[dict[int, TaskInfo], float]] = None
+        last_error = None
+        next_t = time.monotonic()
+        while not self._stop.is_set():
+            try:
+                prev = self._refresh(prev)
+                last_error = None
+            except Exception as e:
+                # Keep serving the last good data; log each distinct failure once
+                msg = f"{type(e).__name__}: {e}"
+                if msg != last_error:
+                    print(f"  {C.YELLOW}⚠  Agent refresh failed: {msg}{C.RESET}",
+                          file=sys.stderr, flush=True)
+                last_error = msg
+
+            next_t += self.interval_ms / 1000
+            self._stop.wait(max(0.0, next_t - time.monotonic()))
+
+    def _refresh(self, prev: Optional[tuple[dict[int, TaskInfo], float]]
+                 ) -> tuple[dict[int, TaskInfo], float]:
+        """One sampling pass; prev is the (task table, monotonic time) of the last one."""
+        core_stats = get_core_usage(sample_ms=self.interval_ms, topology=self.topology,
+                                    sampler=self._sampler, task_cache=self._cache)
+        now = time.monotonic()
+        tasks = self._cache.table
+        thread_pct: dict[int, float] = {}
+        if prev is not None:
+            # Per-thread CPU over the interval between consecutive refreshes
+            prev_tasks, prev_t = prev
+            elapsed = now - prev_t
+            thread_pct = thread_cpu_percent(prev_tasks, tasks, elapsed)
+            per_core = get_all_procs_per_core(min_usage=self.min_usage,
+                                              ignore_procs=self.ignore_procs,
+                                              tasks=tasks, prev_tasks=prev_tasks,
+                                              elapsed=elapsed)
+            for cs in core_stats:
+                cs.all_procs = per_core.get(cs.core_id, [])
+        with self._lock:
+            self.core_stats = core_stats
+            self.tasks      = tasks
+            self.thread_pct = thread_pct
+            self.updated    = time.time()
+            self.history.append((self.updated, core_stats))
+        self._ready.set()
+        return tasks, now
+
+    # ── Queries ──────────────────────────────────────────────────────────────
+    def handle(self, req: dict) -> dict:
+        self._ready.wait(timeout=self.interval_ms / 1000 + 5)
+        cmd = req.get("cmd")
+        try:
+            if cmd == "cores":
+                return self._q_cores()
+            if cmd == "top":
+                return self._q_top(int(req.get("n", 10)))
+            if cmd == "plan":
+                return self._q_plan(int(req["pid"]))
+            if cmd == "history":
+                return self._q_history(float(req.get("seconds", 60)))
+            if cmd == "info":
+                return self._q_info()
+        except (KeyError, TypeError, ValueError) as e:
+            return {"ok": False, "error": f"bad arguments for '{cmd}': {e}"}
+        return {"ok": False, "error": f"unknown command '{cmd}' (cores, top, plan, history, info)"}
+
+    def _topology_list(self) -> list[dict]:
+        return [asdict(t) for _, t in sorted(self.topology.items())]
+
+    def _q_cores(self) -> dict:
+        with self._lock:
+            return {"ok": True, "time": self.updated,
+                    "topology": self._topology_list(),
+                    "cores": [asdict(cs) for cs in self.core_stats]}
+
+    def _q_top(self, n: int) -> dict:
+        with self._lock:
+            tasks, pct, updated = self.tasks, self.thread_pct, self.updated
+        threads = [
+            {"tid": tid, "pid": tasks[tid].pid, "name": tasks[tid].name,
+             "parent": tasks[tid].parent_name, "cpu_percent": round(p, 1),
+             "last_cpu": tasks[tid].last_cpu}
+            for tid, p in heapq.nlargest(n, pct.items(), key=lambda kv: kv[1])
+        ]
+        per_pid: dict[int, float] = defaultdict(float)
+        for tid, p in pct.items():
+            per_pid[tasks[tid].pid] += p
+        processes = [
+            {"pid": pid, "name": tasks[pid].parent_name if pid in tasks else "",
+             "cpu_percent": round(p, 1)}
+            for pid, p in heapq.nlargest(n, per_pid.items(), key=lambda kv: kv[1])
+        ]
+        return {"ok": True, "time": updated, "interval_ms": self.interval_ms,
+                "threads": threads, "processes": processes}
+
+    def _q_plan(self, pid: int) -> dict:
+        info = _fetch_process_info(pid, len(self.topology))
+        if info is None:
+            return {"ok": False, "error": f"PID {pid} not found"}
+        with self._lock:
+            core_stats = self.core_stats
+            interval = sum(p for tid, p in self.thread_pct.items()
+                           if self.tasks[tid].pid == pid)
+        if self.thread_pct:
+            info.cpu_percent = round(interval, 1)   # last interval rather than lifetime
+        actions = build_rebalance_plan(core_stats, [info])
+        return {"ok": True, "pid": pid, "name": info.name, "cpu_percent": info.cpu_percent,
+                "current_cores": info.current_cores,
+                "actions": [asdict(a) for a in actions]}
+
+    def _q_history(self, seconds: float) -> dict:
+        cutoff = time.time() - seconds
+        with self._lock:
+            window = [(ts, stats) for ts, stats in self.history if ts >= cutoff]
+        core_ids = [cs.core_id for cs in window[-1][1]] if window else []
+        return {"ok": True, "core_ids": core_ids,
+                "samples": [{"time": ts, "usage": [cs.usage for cs in stats]}
+                            for ts, stats in window]}
+
+    def _q_info(self) -> dict:
+        with self._lock:
+            samples = len(self.history)
+        return {"ok": True, "sysinfo": asdict(self.sysinfo), "topology": self._topology_list(),
+                "interval_ms": self.interval_ms, "history_sec": self.history_sec,
+                "samples": samples, "pid": os.getpid()}
+
+class _AgentHandler(socketserver.StreamRequestHandler):
+    """One JSON request per line; replies in order on the same connection."""
+
+    def handle(self):
+        for line in self.rfile:
+            if not line.strip():
+                continue
+            try:
+                req = json.loads(line)
+                resp = self.server.agent.handle(req) if isinstance(req, dict) else \
+                    {"ok": False, "error": "request must be a JSON object"}
+            except ValueError as e:
+                resp = {"ok": False, "error": f"invalid JSON: {e}"}
+            self.wfile.write(json.dumps(resp).encode() + b"\n")
+
+class _AgentServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+def run_agent(agent: TidyAgent, socket_path: str):
+    """Serve agent queries on socket_path until interrupted or terminated."""
+    try:
+        st = os.lstat(socket_path)
+    except FileNotFoundError:
+        st = None
+    except OSError as e:
+        die(f"Cannot use {socket_path}: {e.strerror or e}")
+    if st is not None:
+        if not stat.S_ISSOCK(st.st_mode):
+            die(f"{socket_path} exists and is not a socket; refusing to replace it")
+        try:
+            agent_query(socket_path, {"cmd": "info"}, timeout=1.0)
+            die(f"An agent is already listening on {socket_path}")
+        except (OSError, ValueError):
+            os.unlink(socket_path)   # stale socket from an agent that died
+
+    # Bind under a restrictive umask so the socket is never world-accessible,
+    # not even between bind() and a later chmod()
+    old_umask = os.umask(0o117)
+    try:
+        server = _AgentServer(socket_path, _AgentHandler)
+    finally:
+        os.umask(old_umask)
+    server.agent = agent
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    agent.start()
+    print(f"  {C.GREEN}✔{C.RESET}  Agent sampling every {agent.interval_ms} ms, "
+          f"keeping {agent.history_sec}s of history.")
+    print(f"  {C.GREEN}✔{C.RESET}  Listening on {C.CYAN}{socket_path}{C.RESET}  "
+          f"{C.DIM}(query with: tidycpu --query cores){C.RESET}\n")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        agent.stop()
+        try:
+            os.unlink(socket_path)
+        except FileNotFoundError:
+            pass
+        print(f"\n  {C.YELLOW}Agent stopped.{C.RESET}\n")
+
+def agent_query(socket_path: str, req: dict, timeout: float = 5.0) -> dict:
+    """Send one request to a running agent and return its reply. Raises OSError."""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+        s.settimeout(timeout)
+        s.connect(socket_path)
+        s.sendall(json.dumps(req).encode() + b"\n")
+        buf = b""
+        while not buf.endswith(b"\n"):
+            chunk = s.recv(65536)
+            if not chunk:
+                break
+            buf += chunk
+    return json.loads(buf)
+
+def parse_query(text: str) -> dict:
+    """'cores' | 'top [N]' | 'plan PID' | 'history [SECONDS]' | 'info' → request dict."""
+    parts = text.split()
+    if not parts:
+        die("Empty --query. Use: cores, top [N], plan PID, history [SECONDS], info")
+    cmd, rest = parts[0], parts[1:]
+    try:
+        if cmd == "top":
+            return {"cmd": "top", "n": int(rest[0]) if rest else 10}
+        if cmd == "plan":
+            return {"cmd": "plan", "pid": int(rest[0])}
+        if cmd == "history":
+            return {"cmd": "history", "seconds": float(rest[0]) if rest else 60}
+    except (IndexError, ValueError):
+        die(f"Bad --query '{text}'. Use: cores, top [N], plan PID, history [SECONDS], info")
+    return {"cmd": cmd}
+
+def print_query_result(req: dict, resp: dict, ignore_cols: Optional[list[str]] = None,
+                       specify_parents: Optional[list[str]] = None,
+                       stack_procs: bool = False, breakdown: bool = False):
+    """Render an agent reply the way the equivalent one-shot mode would."""
+    cmd = req["cmd"]
+    if cmd == "cores":
+        topology = {t["logical_id"]: CPUTopology(**t) for t in resp["topology"]}
+        core_stats = []
+        for d in resp["cores"]:
+            d["all_procs"] = [tuple(p) for p in d["all_procs"]]
+            core_stats.append(CoreStat(**d))
+        print_topology(topology, core_stats, ignore_cols=ignore_cols,
+                       specify_parents=specify_parents, stack_procs=stack_procs,
+                       breakdown=breakdown)
+    elif cmd == "top":
+        print(f"\n{C.BOLD}  TOP THREADS{C.RESET}  {C.DIM}(last {resp['interval_ms']} ms){C.RESET}")
+        print(f"  {'TID':>8}  {'PID':>8}  {'Thread':<16} {'Process':<16} {'CPU%':>6}  {'Last':>4}")
+        for t in resp["threads"]:
+            print(f"  {t['tid']:>8}  {t['pid']:>8}  {t['name']:<16} {t['parent']:<16} "
+                  f"{C.YELLOW}{t['cpu_percent']:>5.1f}%{C.RESET}  {t['last_cpu']:>4}")
+        print(f"\n{C.BOLD}  TOP PROCESSES{C.RESET}")
+        print(f"  {'PID':>8}  {'Process':<16} {'CPU%':>6}")
+        for p in resp["processes"]:
+            print(f"  {p['pid']:>8}  {p['name']:<16} {C.YELLOW}{p['cpu_percent']:>5.1f}%{C.RESET}")
+        print()
+    elif cmd == "plan":
+        print(f"\n  {C.CYAN}PID {resp['pid']}{C.RESET}  {resp['name']}  "
+              f"{C.YELLOW}{resp['cpu_percent']:.1f}%{C.RESET}  "
+              f"cores {cores_to_cpulist(resp['current_cores'])}")
+        print_rebalance_plan([RebalanceAction(**a) for a in resp["actions"]])
+        print()
+    elif cmd == "history":
+        print(f"\n{C.BOLD}  HISTORY{C.RESET}  {C.DIM}({len(resp['samples'])} samples){C.RESET}")
+        print(f"  {'Time':<8}  {'Avg':>6}  {'Max':>6}  Hottest")
+        for s in resp["samples"]:
+            usage = s["usage"]
+            if not usage:
+                continue
+            peak = max(usage)
+            clr = C.RED if peak >= 80 else (C.YELLOW if peak >= 40 else C.GREEN)
+            hottest = resp["core_ids"][usage.index(peak)] if len(resp["core_ids"]) == len(usage) else "?"
+            print(f"  {datetime.fromtimestamp(s['time']).strftime('%H:%M:%S'):<8}  "
+                  f"{sum(usage) / len(usage):>5.1f}%  {clr}{peak:>5.1f}%{C.RESET}  CPU{hottest}")
+        print()
+    else:
+        print(json.dumps(resp, indent=2))
+
 def main():
     parser = argparse.ArgumentParser(
         description="TidyCPU — CPU Affinity Optimization Utility",
@@ -1920,6 +4421,7 @@ def main():
 Examples:
   sudo python3 tidycpu.py                          # View CPU topology only
   sudo python3 tidycpu.py --threads                # Show processes and rebalancing
+  sudo python3 tidycpu.py --threads --top 20       # Consider the top 20 CPU consumers
   sudo python3 tidycpu.py --check-pid 1234         # Check specific process affinity
   sudo python3 tidycpu.py --live                   # Live monitor (5 seconds)
   sudo python3 tidycpu.py --live --duration 10     # Live monitor (10 seconds)
@@ -1927,15 +4429,32 @@ Examples:
   sudo python3 tidycpu.py --pid nginx              # Monitor process by name
   sudo python3 tidycpu.py --pid "nginx|php-fpm"    # Monitor multiple processes
   sudo python3 tidycpu.py --pid "1234|nginx|5678"  # Mix of PIDs and names
+  sudo python3 tidycpu.py --pid "php*|cmd:java.*Kafka"  # Prefix and command-line patterns
+  sudo python3 tidycpu.py --pid "cgroup:nginx.service"  # Every process in a cgroup
   sudo python3 tidycpu.py --cpu-freq               # Include CPU frequency info
   sudo python3 tidycpu.py --export-html report.html  # Export to HTML
   sudo python3 tidycpu.py --export-excel report.xlsx # Export to Excel (requires openpyxl)
+  sudo python3 tidycpu.py --live -d 600 --export-html r.html --html-mode data  # Compact interactive report
+  sudo python3 tidycpu.py --live -d 3600 --export-cores cores.csv.gz --export-threads threads.jsonl.gz  # Time series
   sudo python3 tidycpu.py --live --ignore-col Bar    # Hide Bar column in live view
   sudo python3 tidycpu.py --live --specify nginx,php-fpm  # Highlight rows for these parents
   sudo python3 tidycpu.py --stack-procs              # Stack all active processes per core row
   sudo python3 tidycpu.py --stack-procs --all        # Include even idle processes in stack
   sudo python3 tidycpu.py --stack-procs --min-usage 0.5  # Only stack processes using >= 0.5% CPU
   sudo python3 tidycpu.py --stack-procs --ignore-process kworker,ksoftirqd  # Exclude kernel threads
+  sudo python3 tidycpu.py --check-pid 1234 --sampler  # Sample /proc/stat in the background
+  sudo python3 tidycpu.py --live --breakdown         # Add user/sys/iowait/irq/softirq/steal columns
+  sudo python3 tidycpu.py --live --stack-procs --scan-workers 8  # Parallel /proc scan
+  python3 tidycpu.py --proc-root fixture/proc --sys-root fixture/sys  # Synthetic tree, no root
+  sudo python3 tidycpu.py --live --stack-procs --profile  # Per-stage timings each refresh
+  sudo python3 tidycpu.py --live --stack-procs --overhead-budget 2  # Stay under 2% of one core
+  sudo python3 tidycpu.py --live -d 3600 --stack-procs --capture run.jsonl  # Long capture to disk
+  sudo python3 tidycpu.py --live -d 3600 --stack-procs --capture run.tcap   # Compact binary capture
+  python3 tidycpu.py --replay run.tcap --from 14:05 --to +10m --stack-procs  # Re-render offline
+  python3 tidycpu.py --replay run.jsonl --ignore-col Bar --export-html report.html  # Report from a capture
+  sudo python3 tidycpu.py --agent                    # Sample continuously, serve queries
+  sudo python3 tidycpu.py --query cores --stack-procs  # Ask the agent (answers in ms)
+  sudo python3 tidycpu.py --query "plan 1234"        # Rebalance plan for one PID
         """
     )
     parser.add_argument("--live", "-l", action="store_true",
@@ -1943,19 +4462,35 @@ Examples:
     parser.add_argument("--duration", "-d", type=int, default=5,
         help="Duration for live mode in seconds (default: 5)")
     parser.add_argument("--pid", "-p", type=str,
-        help="PIDs/names to monitor, pipe-separated (e.g. nginx|php-fpm|1234)")
+        help="PIDs/names to monitor, pipe-separated (e.g. nginx|php-fpm|1234); "
+             "also php* (prefix), re:PAT, cmd:PAT, cgroup:PAT")
     parser.add_argument("--threads", "-t", action="store_true",
         help="Show thread information for processes")
+    parser.add_argument("--top", type=int, default=5, metavar="N",
+        help="Number of top CPU consumers to consider with --threads and exports (default: 5)")
     parser.add_argument("--cpu-freq", "-f", action="store_true",
         help="Show CPU frequency information (min/max/current)")
     parser.add_argument("--check-pid", type=int, metavar="PID",
         help="Check affinity and CPU usage for a specific process ID")
     parser.add_argument("--export-html", type=str, metavar="FILE",
         help="Export report to HTML file (e.g., report.html)")
+    parser.add_argument("--html-mode", choices=["tables", "data"], default="tables",
+        help="HTML report layout: 'tables' writes a table per snapshot; 'data' embeds the "
+             "snapshots once as compact JSON with a heatmap and sparklines rendered in the browser")
     parser.add_argument("--export-text", type=str, metavar="FILE",
         help="Export report to text file (e.g., report.txt)")
     parser.add_argument("--export-excel", type=str, metavar="FILE",
         help="Export report to Excel file (e.g., report.xlsx)  [requires openpyxl]")
+    parser.add_argument("--excel-mode", choices=["auto", "sheets", "stream"], default="auto",
+        help="Excel layout: 'sheets' writes a formatted sheet per snapshot; 'stream' writes one "
+             "long Snapshots sheet in openpyxl write-only mode; 'auto' (default) streams above "
+             f"{EXCEL_SHEETS_MAX} snapshots")
+    parser.add_argument("--export-cores", metavar="FILE",
+        help="Stream one row per (timestamp, core) with every counter and label to FILE "
+             "(.csv or .jsonl, add .gz to compress)")
+    parser.add_argument("--export-threads", metavar="FILE",
+        help="Stream one row per (timestamp, thread) with CPU%%, last CPU and parent to FILE "
+             "(.csv or .jsonl, add .gz to compress; --min-usage/--all/--ignore-process apply)")
     parser.add_argument("--ignore-col", type=lambda s: [c.strip() for c in s.split(",")],
         default=[], metavar="COLS",
         help="Comma-separated columns to hide (e.g. Bar,Usage)")
@@ -1971,8 +4506,88 @@ Examples:
     parser.add_argument("--ignore-process", type=lambda s: [p.strip() for p in s.split(",")],
         default=None, metavar="NAMES",
         help="Comma-separated process name prefixes to exclude from stacked view (e.g. kworker,ksoftirqd)")
+    parser.add_argument("--breakdown", action="store_true",
+        help="Show per-core user/system/iowait/irq/softirq/steal columns (hide some with --ignore-col)")
+    parser.add_argument("--scan-workers", type=int, default=1, metavar="N",
+        help="Scan /proc with N parallel workers (default: 1, serial); helps on hosts with tens of thousands of threads")
+    parser.add_argument("--scan-pool", choices=["thread", "process"], default="thread",
+        help="Worker type for --scan-workers (default: thread)")
+    parser.add_argument("--sampler", action="store_true",
+        help="Sample /proc/stat continuously in a background thread so usage snapshots don't block")
+    parser.add_argument("--capture", metavar="FILE",
+        help="Live mode: stream every snapshot to FILE as it is taken "
+             "(JSON Lines, or the compact binary format if FILE ends in .tcap)")
+    parser.add_argument("--replay", metavar="FILE",
+        help="Re-render a --capture file offline (no root needed): prints the snapshots, "
+             "or writes the --export-* reports from them")
+    parser.add_argument("--from", dest="replay_from", metavar="TIME",
+        help="Replay: first snapshot to include (+90 / +15m from the start, --from=-5m from the end, "
+             "HH:MM[:SS], 'YYYY-MM-DD HH:MM[:SS]' or epoch seconds)")
+    parser.add_argument("--to", dest="replay_to", metavar="TIME",
+        help="Replay: last snapshot to include (same formats as --from)")
+    parser.add_argument("--agent", action="store_true",
+        help="Run as a long-lived agent: sample continuously and answer --query requests on --socket")
+    parser.add_argument("--query", metavar="QUERY",
+        help="Ask a running agent: cores | top [N] | plan PID | history [SECONDS] | info")
+    parser.add_argument("--socket", default=DEFAULT_SOCKET, metavar="PATH",
+        help=f"Agent Unix socket (default: {DEFAULT_SOCKET}, env: TIDYCPU_SOCKET)")
+    parser.add_argument("--agent-interval", type=int, default=1000, metavar="MS",
+        help="Agent refresh interval in ms (default: 1000)")
+    parser.add_argument("--agent-history", type=int, default=600, metavar="SEC",
+        help="Seconds of per-core history the agent keeps (default: 600)")
+    parser.add_argument("--json", action="store_true",
+        help="With --query, print the agent's raw JSON reply")
+    parser.add_argument("--overhead-budget", type=float, metavar="PCT",
+        help="Live mode: keep TidyCPU's own CPU use under PCT%% of one core (e.g. 2) by "
+             "thinning stacked scans and lengthening the interval")
+    parser.add_argument("--profile", action="store_true",
+        help="Time each stage (scan, sampling window, render, export) and count files opened "
+             "and processes spawned; prints a breakdown per iteration and a summary")
+    parser.add_argument("--proc-root", metavar="DIR",
+        help="Read procfs from DIR instead of /proc (env: TIDYCPU_PROC_ROOT); "
+             "a synthetic tree needs no root and affinity changes are refused")
+    parser.add_argument("--sys-root", metavar="DIR",
+        help="Read sysfs from DIR instead of /sys (env: TIDYCPU_SYS_ROOT)")
 
     args = parser.parse_args()
+    if args.top < 1:
+        die(f"--top must be at least 1, got {args.top}")
+    if args.overhead_budget is not None and args.overhead_budget <= 0:
+        die(f"--overhead-budget must be a positive percentage, got {args.overhead_budget:g}")
+    set_fs_roots(args.proc_root, args.sys_root)
+    if args.profile:
+        enable_profiling()
+
+    # ── Agent client: answer from a running agent, no root or sampling needed ──
+    if args.query:
+        req = parse_query(args.query)
+        try:
+            resp = agent_query(args.socket, req)
+        except (OSError, ValueError) as e:
+            die(f"Cannot reach the agent on {args.socket}: {getattr(e, 'strerror', None) or e}\n"
+                f"  {C.YELLOW}Start one with: sudo python3 tidycpu.py --agent{C.RESET}")
+        if args.json:
+            print(json.dumps(resp, indent=2))
+        elif not resp.get("ok"):
+            die(resp.get("error", "agent error"))
+        else:
+            print_query_result(req, resp, ignore_cols=args.ignore_col,
+                               specify_parents=args.specify,
+                               stack_procs=args.stack_procs, breakdown=args.breakdown)
+        return
+
+    # ── Replay: render a capture from disk, no root or /proc access needed ──
+    if args.replay:
+        if args.export_threads:
+            die("--export-threads needs live sampling; captures do not record per-thread rows")
+        print(BANNER)
+        replay_capture(args.replay, start=args.replay_from, end=args.replay_to,
+                       export_html=args.export_html, export_text=args.export_text,
+                       export_excel=args.export_excel, ignore_cols=args.ignore_col,
+                       specify_parents=args.specify, stack_procs=args.stack_procs,
+                       breakdown=args.breakdown, html_mode=args.html_mode,
+                       excel_mode=args.excel_mode, export_cores=args.export_cores)
+        return
 
     # Resolve effective min_usage for --stack-procs:
     #   --all forces 0.0 (show every process, even idle)
@@ -1988,60 +4603,62 @@ Examples:
     print(BANNER)
 
     check_root()
-    print(f"  {C.GREEN}✔{C.RESET}  Running as root.\n")
+    if is_live_proc():
+        print(f"  {C.GREEN}✔{C.RESET}  Running as root.\n")
+    else:
+        print(f"  {C.YELLOW}○{C.RESET}  Reading {C.CYAN}{PROC_ROOT}{C.RESET} and {C.CYAN}{SYS_ROOT}{C.RESET} (synthetic tree, read-only).\n")
+
+    # Start sampling first so the usage window fills while we gather
+    # system info, topology and process details.
+    sampler = StatSampler().start() if args.sampler and not args.agent else None
 
     sysinfo = get_system_info(show_cpu_freq=args.cpu_freq)
     print_system_info(sysinfo)
 
     topology = get_cpu_topology()
-    num_cores = len(topology)
+
+    # ── Agent mode ───────────────────────────────────────────────────────────
+    if args.agent:
+        agent = TidyAgent(sysinfo, topology,
+                          interval_ms=max(100, args.agent_interval),
+                          history_sec=args.agent_history,
+                          min_usage=effective_min_usage,
+                          ignore_procs=args.ignore_process,
+                          scan_workers=args.scan_workers,
+                          scan_pool=args.scan_pool)
+        run_agent(agent, args.socket)
+        return
 
     # Resolve --pid (pipe-separated names/PIDs) early so all branches can use it
     resolved_pids: list[int] = []
+    pid_index = PidIndex()
     if args.pid:
-        resolved_pids = resolve_pids(args.pid)
+        resolved_pids = resolve_pids(args.pid, pid_index.refresh())
 
     # ── Check specific PID mode ──────────────────────────────────────────────
     if args.check_pid:
         pid = args.check_pid
         print(f"\n  {C.CYAN}Checking PID {pid}{C.RESET}\n")
         
-        rc, out, _ = run(["ps", "-p", str(pid), "-o", "pid,pcpu,comm", "--no-headers"])
-        if rc != 0:
+        info = read_process_cpu(pid)
+        if info is None:
             print(f"  {C.RED}✘ PID {pid} not found{C.RESET}\n")
             sys.exit(1)
         
-        parts = out.strip().split(None, 2)
-        if len(parts) < 3:
-            print(f"  {C.RED}✘ Unable to read process info{C.RESET}\n")
-            sys.exit(1)
+        name, cpu_percent = info
         
-        try:
-            pid_val = int(parts[0])
-            cpu_percent = float(parts[1])
-            name = parts[2].strip()
-        except ValueError:
-            print(f"  {C.RED}✘ Invalid process data{C.RESET}\n")
-            sys.exit(1)
-        
-        rc2, out2, _ = run(["taskset", "-p", str(pid_val)])
-        if rc2 != 0:
+        current_cores = get_affinity(pid)
+        if current_cores is None:
             print(f"  {C.RED}✘ Unable to read affinity{C.RESET}\n")
             sys.exit(1)
         
-        m = re.search(r"current affinity mask:\s*([0-9a-fA-F,]+)", out2)
-        if not m:
-            print(f"  {C.RED}✘ Unable to parse affinity mask{C.RESET}\n")
-            sys.exit(1)
-        
-        current_cores = mask_to_cores(m.group(1), num_cores)
-        core_stats = get_core_usage(sample_ms=500, topology=topology)
+        core_stats = get_core_usage(sample_ms=500, topology=topology, sampler=sampler)
         stats_map = {cs.core_id: cs for cs in core_stats}
         
         print(f"{C.BOLD}{'─'*78}{C.RESET}")
         print(f"{C.BOLD}  PROCESS DETAILS{C.RESET}")
         print(f"{C.BOLD}{'─'*78}{C.RESET}")
-        print(f"  {C.CYAN}PID:{C.RESET}      {pid_val}")
+        print(f"  {C.CYAN}PID:{C.RESET}      {pid}")
         print(f"  {C.CYAN}Process:{C.RESET}  {name}")
         print(f"  {C.CYAN}CPU:%{C.RESET}     {C.YELLOW}{cpu_percent:.1f}%{C.RESET}")
         
@@ -2060,16 +4677,17 @@ Examples:
         else:
             print(f"  {C.DIM}Process can run on any core (no affinity set){C.RESET}")
         
-        threads = get_threads_for_pid(pid_val, num_cores)
+        threads = get_threads_for_pid(pid)
         if threads:
             print(f"\n{C.BOLD}  THREADS ({len(threads)}){C.RESET}")
             print(f"{C.BOLD}{'─'*78}{C.RESET}")
-            print(f"  {'TID':>7}  {'Name':<24}  {'CPU%':>6}  Cores")
-            print(f"  {'───':>7}  {'────────────────────────':<24}  {'─────':>6}  ─────")
+            print(f"  {'TID':>7}  {'Name':<24}  {'CPU%':>6}  {'S':>1}  {'Last':>4}  {'Prio':>4}  Cores")
+            print(f"  {'───':>7}  {'────────────────────────':<24}  {'─────':>6}  {'─':>1}  {'────':>4}  {'────':>4}  ─────")
             
             for t in threads[:15]:
                 t_cores_str = ",".join(map(str, t.current_cores)) if t.current_cores else "all"
-                print(f"  {t.tid:>7}  {t.name:<24}  {C.YELLOW}{t.cpu_percent:>5.1f}%{C.RESET}  {t_cores_str}")
+                print(f"  {t.tid:>7}  {t.name:<24}  {C.YELLOW}{t.cpu_percent:>5.1f}%{C.RESET}  "
+                      f"{t.state:>1}  {t.last_cpu:>4}  {t.priority:>4}  {t_cores_str}")
             
             if len(threads) > 15:
                 print(f"  {C.DIM}... {len(threads) - 15} more threads{C.RESET}")
@@ -2095,6 +4713,18 @@ Examples:
                 stack_procs=args.stack_procs,
                 min_usage=effective_min_usage,
                 ignore_procs=args.ignore_process,
+                sampler=sampler,
+                breakdown=args.breakdown,
+                pid_spec=args.pid,
+                pid_index=pid_index,
+                scan_workers=args.scan_workers,
+                scan_pool=args.scan_pool,
+                overhead_budget=args.overhead_budget,
+                capture=args.capture,
+                html_mode=args.html_mode,
+                excel_mode=args.excel_mode,
+                export_cores=args.export_cores,
+                export_threads=args.export_threads,
             )
         except KeyboardInterrupt:
             print(f"\n\n  {C.YELLOW}Monitoring interrupted.{C.RESET}\n")
@@ -2102,55 +4732,83 @@ Examples:
 
     # ── Standard rebalance mode ──────────────────────────────────────────────
     print(f"\n  {C.CYAN}○{C.RESET}  Sampling core usage (500 ms) …", end="", flush=True)
-    core_stats = get_core_usage(sample_ms=500, topology=topology,
+    task_cache = TaskCache(workers=args.scan_workers, pool=args.scan_pool)
+    core_series, thread_series = open_series(args.export_cores, args.export_threads)
+    samples = [] if thread_series is not None else None
+    exporting = args.export_html or args.export_text or args.export_excel
+    # Top processes are ranked from the same task tables as the core view
+    window = {} if args.threads or exporting else None
+    core_stats = get_core_usage(sample_ms=500, topology=topology, task_cache=task_cache,
                                 stack_procs=args.stack_procs,
                                 min_usage=effective_min_usage,
-                                ignore_procs=args.ignore_process)
+                                ignore_procs=args.ignore_process,
+                                sampler=sampler, thread_samples=samples,
+                                task_window=window)
+    taken = round(time.time(), 3)
     print(f"\r  {C.GREEN}✔{C.RESET}  Core telemetry collected.          ")
 
     print_topology(topology, core_stats,
                    ignore_cols=args.ignore_col,
                    specify_parents=args.specify,
-                   stack_procs=args.stack_procs)
+                   stack_procs=args.stack_procs,
+                   breakdown=args.breakdown)
 
     processes = []
 
     if args.threads:
         print(f"\n  {C.CYAN}○{C.RESET}  Identifying top CPU consumers …", end="", flush=True)
-        processes = get_top_processes(n=5, num_cores=num_cores, with_threads=True)
+        with profile_stage("processes"):
+            processes = get_top_processes(n=args.top, with_threads=True,
+                                          **window)
         print(f"\r  {C.GREEN}✔{C.RESET}  Process snapshot ready.            ")
+    elif exporting:
+        with profile_stage("processes"):
+            processes = get_top_processes(n=args.top, with_threads=False,
+                                          **window)
 
     if args.export_html:
         try:
-            if not processes:
-                processes = get_top_processes(n=5, num_cores=num_cores, with_threads=False)
             filename = export_to_html(sysinfo, topology, core_stats, processes, args.export_html,
-                                      ignore_cols=args.ignore_col)
+                                      ignore_cols=args.ignore_col, breakdown=args.breakdown,
+                                      html_mode=args.html_mode)
             print(f"\n  {C.GREEN}✔{C.RESET}  HTML report exported to: {C.CYAN}{filename}{C.RESET}")
         except Exception as e:
             print(f"\n  {C.RED}✘{C.RESET}  HTML export failed: {e}")
 
     if args.export_text:
         try:
-            if not processes:
-                processes = get_top_processes(n=5, num_cores=num_cores, with_threads=False)
             filename = export_to_text(sysinfo, topology, core_stats, processes, args.export_text,
-                                      ignore_cols=args.ignore_col)
+                                      ignore_cols=args.ignore_col, breakdown=args.breakdown)
             print(f"\n  {C.GREEN}✔{C.RESET}  Text report exported to: {C.CYAN}{filename}{C.RESET}")
         except Exception as e:
             print(f"\n  {C.RED}✘{C.RESET}  Text export failed: {e}")
 
     if args.export_excel:
         try:
-            if not processes:
-                processes = get_top_processes(n=5, num_cores=num_cores, with_threads=False)
             filename = export_to_excel(sysinfo, topology, core_stats, processes, args.export_excel,
                                        ignore_cols=args.ignore_col,
-                                       stack_procs=args.stack_procs)
+                                       stack_procs=args.stack_procs,
+                                       breakdown=args.breakdown,
+                                       excel_mode=args.excel_mode)
             print(f"\n  {C.GREEN}✔{C.RESET}  Excel report exported to: {C.CYAN}{filename}{C.RESET}")
         except Exception as e:
             print(f"\n  {C.RED}✘{C.RESET}  Excel export failed: {e}")
 
+    if core_series is not None or thread_series is not None:
+        snap = Snapshot(timestamp=datetime.fromtimestamp(taken).strftime("%Y-%m-%d %H:%M:%S"),
+                        iteration=1, core_stats=core_stats, processes=[], epoch=taken)
+        if core_series is not None:
+            core_series.write(core_series_rows(snap))
+        if thread_series is not None:
+            thread_series.write(thread_series_rows(snap, samples))
+        print()
+        close_series(core_series, thread_series)
+
+    task_cache.close()
+
+    if _PROFILER is not None:
+        print_profile_summary(_PROFILER)
+
     if args.threads:
         actions = build_rebalance_plan(core_stats, processes)
         print_rebalance_plan(actions)